@@ -1,23 +1,50 @@
 from http.client import responses
+from typing import Dict, Optional
 
 from fastapi import Request, status
 from fastapi.exceptions import RequestValidationError, ResponseValidationError
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 from starlette.exceptions import HTTPException as StarletteHTTPException
 
 from api.config.schemas import ErrorMSG
 
 
 class Error_DB(Exception):
-    def __init__(self, message: str, code: int = 400):
+    def __init__(
+        self, message: str, code: int = 400, headers: Optional[Dict[str, str]] = None
+    ):
         self.message = message
         self.code = code
+        self.headers = headers
         super().__init__(message)
 
 
+class NotModified(StarletteHTTPException):
+    """
+    У клиента актуальная версия ответа с этим ETag.
+
+    Наследует HTTPException, чтобы зависимости с сессией БД пропускали
+    его без оборачивания в Error_DB.
+    """
+
+    def __init__(self, etag: str):
+        self.etag = etag
+        super().__init__(
+            status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag}
+        )
+
+
+async def not_modified_handler(request: Request, exc: NotModified) -> Response:
+    return Response(
+        status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": exc.etag}
+    )
+
+
 async def custom_exception_handler(request: Request, exc: Error_DB) -> JSONResponse:
     error_schema = ErrorMSG(error_type=responses[exc.code], error_message=exc.message)
-    return JSONResponse(status_code=exc.code, content=error_schema.model_dump())
+    return JSONResponse(
+        status_code=exc.code, content=error_schema.model_dump(), headers=exc.headers
+    )
 
 
 async def validation_exception_handler(
@@ -48,4 +75,8 @@ async def all_http_exception_handler(
     error_schema = ErrorMSG(
         error_type=responses[exc.status_code], error_message=exc.detail
     )
-    return JSONResponse(status_code=exc.status_code, content=error_schema.model_dump())
+    return JSONResponse(
+        status_code=exc.status_code,
+        content=error_schema.model_dump(),
+        headers=getattr(exc, "headers", None),
+    )
@@ -1,6 +1,8 @@
 import random
+from itertools import accumulate
 from random import sample
 from string import digits
+from typing import Dict, List
 
 first_name_list = ["Vasya", "John", "Petya", "Maxim", "Anton"]
 
@@ -15,3 +17,118 @@ class TestUser:
 
     def __str__(self) -> str:
         return f"name : {self.name}, api-key : {self.api_key}, "
+
+
+class SocialGraph:
+    """
+    Синтетический набор данных социальной сети для нагрузочных тестов.
+
+    Популярность пользователей распределена по закону Ципфа: немногие
+    авторы собирают большую часть подписчиков, лайков и твитов. Все id
+    назначаются последовательно с 1, счётчики и признак рассылки твитов
+    посчитаны заранее, так что данные можно загружать без пересчёта.
+    """
+
+    def __init__(self) -> None:
+        self.users: List[Dict] = []
+        self.follows: List[Dict] = []
+        self.tweets: List[Dict] = []
+        self.likes: List[Dict] = []
+        self.media: List[Dict] = []
+
+
+def bench_api_key(user_id: int) -> str:
+    """API-ключ пользователя синтетического набора"""
+    return f"bench_{user_id}"
+
+
+def zipf_cum_weights(count: int, alpha: float) -> List[float]:
+    """Накопленные веса рангов 1..count для random.choices"""
+    return list(accumulate(1 / rank**alpha for rank in range(1, count + 1)))
+
+
+def generate_social_graph(
+    users: int,
+    avg_following: int,
+    tweets: int,
+    likes: int,
+    media: int,
+    alpha: float = 1.1,
+    seed: int = 0,
+    fanout_threshold: int = 10000,
+) -> SocialGraph:
+    """Воспроизводимый при одинаковом seed граф подписок, твитов и лайков"""
+    rng = random.Random(seed)
+    graph = SocialGraph()
+    user_ids = list(range(1, users + 1))
+    # Ранг популярности не совпадает с id, чтобы популярные авторы
+    # не были сосредоточены в начале таблицы
+    ranked = user_ids[:]
+    rng.shuffle(ranked)
+    popularity = zipf_cum_weights(users, alpha)
+
+    followers_count = [0] * (users + 1)
+    following_count = [0] * (users + 1)
+    for follower_id in user_ids:
+        # Число подписок тоже с тяжёлым хвостом, среднее около avg_following
+        wanted = int(avg_following / 2 * rng.paretovariate(2))
+        wanted = min(max(wanted, 1), users - 1)
+        targets = set(rng.choices(ranked, cum_weights=popularity, k=wanted))
+        targets.discard(follower_id)
+        for following_id in targets:
+            graph.follows.append(
+                {"follower_id": follower_id, "following_id": following_id}
+            )
+            followers_count[following_id] += 1
+        following_count[follower_id] = len(targets)
+
+    for user_id in user_ids:
+        graph.users.append(
+            {
+                "id": user_id,
+                "name": f"{rng.choice(first_name_list)}_{user_id}",
+                "api_key": bench_api_key(user_id),
+                "followers_count": followers_count[user_id],
+                "following_count": following_count[user_id],
+            }
+        )
+
+    authors = rng.choices(ranked, cum_weights=popularity, k=tweets)
+    likes_count = [0] * (tweets + 1)
+    for tweet_id, author_id in enumerate(authors, start=1):
+        graph.tweets.append(
+            {
+                "id": tweet_id,
+                "author_id": author_id,
+                "content": f"Твит {tweet_id} " + "".join(sample(digits, 10)),
+                "fanned_out": followers_count[author_id] <= fanout_threshold,
+            }
+        )
+
+    # Твиты популярных авторов получают больше лайков
+    author_rank = {user_id: rank for rank, user_id in enumerate(ranked, start=1)}
+    tweet_weights = list(
+        accumulate(1 / author_rank[author] ** alpha for author in authors)
+    )
+    seen = set()
+    for tweet_id in rng.choices(
+        range(1, tweets + 1), cum_weights=tweet_weights, k=likes
+    ):
+        user_id = rng.randint(1, users)
+        if (user_id, tweet_id) in seen:
+            continue
+        seen.add((user_id, tweet_id))
+        graph.likes.append({"user_id": user_id, "tweet_id": tweet_id})
+        likes_count[tweet_id] += 1
+    for tweet in graph.tweets:
+        tweet["likes_count"] = likes_count[tweet["id"]]
+
+    for media_id in range(1, media + 1):
+        graph.media.append(
+            {
+                "id": media_id,
+                "link": f"bench_{media_id}.jpg",
+                "tweet_id": rng.randint(1, tweets),
+            }
+        )
+    return graph
@@ -0,0 +1,133 @@
+import atexit
+import json
+import logging
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional
+
+APP_LOGGER = "TWITTER-BACKEND"
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+# Стандартные атрибуты LogRecord, всё остальное пришло через extra=
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+_listener: Optional[QueueListener] = None
+
+
+class JSONFormatter(logging.Formatter):
+    """Одна запись журнала - одна строка JSON"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Пропускает долю записей уровня ниже WARNING.
+
+    Доля задаётся для имени логгера и распространяется на дочерние логгеры,
+    побеждает самое длинное совпавшее имя. Предупреждения и ошибки
+    проходят всегда.
+    """
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.rates = sorted(rates.items(), key=lambda item: -len(item[0]))
+
+    def rate_for(self, name: str) -> float:
+        for prefix, rate in self.rates:
+            if name == prefix or name.startswith(prefix + "."):
+                return rate
+        return 1.0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.rate_for(record.name)
+        return rate >= 1.0 or random.random() < rate
+
+
+class LocalQueueHandler(QueueHandler):
+    """
+    Кладёт запись в очередь без форматирования.
+
+    Очередь читает поток того же процесса, поэтому подготовка записи
+    (подстановка аргументов, форматирование исключения) выполняется
+    в потоке слушателя, а не в цикле событий.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Дочерний логгер приложения, например для отдельной доли сэмплирования"""
+    return logging.getLogger(f"{APP_LOGGER}.{name}")
+
+
+def setup_logging(
+    level: str = "INFO",
+    fmt: str = "json",
+    sampling: Optional[Dict[str, float]] = None,
+    sql_echo: bool = False,
+) -> logging.Logger:
+    """
+    Настройка журналирования через очередь.
+
+    Обработчик корневого логгера только кладёт записи в очередь, вывод
+    в поток выполняет QueueListener в отдельном потоке. Запросы SQL
+    пишутся через тот же конвейер, если включён sql_echo.
+    """
+    global _listener
+
+    stream = logging.StreamHandler(sys.stderr)
+    stream.setFormatter(
+        JSONFormatter() if fmt == "json" else logging.Formatter(TEXT_FORMAT)
+    )
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    handler = LocalQueueHandler(log_queue)
+    handler.addFilter(SamplingFilter(sampling or {}))
+
+    root = logging.getLogger()
+    for old in [h for h in root.handlers if isinstance(h, LocalQueueHandler)]:
+        root.removeHandler(old)
+    root.addHandler(handler)
+
+    if _listener is not None:
+        _listener.stop()
+    _listener = QueueListener(log_queue, stream, respect_handler_level=True)
+    _listener.start()
+
+    logging.getLogger("sqlalchemy.engine").setLevel(
+        logging.INFO if sql_echo else logging.WARNING
+    )
+
+    logger = logging.getLogger(APP_LOGGER)
+    logger.setLevel(level)
+    return logger
+
+
+def stop_logging() -> None:
+    """Дописывает оставшиеся в очереди записи и останавливает поток вывода"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(stop_logging)
@@ -1,10 +1,29 @@
-from typing import List
+from typing import List, Optional
 
-from sqlalchemy import TIMESTAMP, Column, ForeignKey, Integer, String, Table, func
+from sqlalchemy import (
+    JSON,
+    TIMESTAMP,
+    BigInteger,
+    Column,
+    Computed,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+    Table,
+    false,
+    func,
+    text,
+)
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from api.database.database import Base, uniq_str_an
 
+# Конфигурация полнотекстового поиска: русская морфология, латиница
+# стеммируется по-английски. Та же конфигурация в миграции 0004 и запросах
+SEARCH_CONFIG = "russian"
+
 follower_tbl = Table(
     "followers_tbl",
     Base.metadata,
@@ -17,6 +36,8 @@ follower_tbl = Table(
         server_default=func.now(),
         onupdate=func.now(),
     ),
+    # Первичный ключ начинается с follower_id, подписчиков ищем по этому индексу
+    Index("ix_followers_tbl_following_id_follower_id", "following_id", "follower_id"),
 )
 
 
@@ -24,13 +45,17 @@ class User(Base):
     name: Mapped[str] = mapped_column(nullable=False, index=True)
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True, index=True)
     api_key: Mapped[uniq_str_an]
+    followers_count: Mapped[int] = mapped_column(default=0, server_default="0")
+    following_count: Mapped[int] = mapped_column(default=0, server_default="0")
+    # Версия ленты: меняется при подписках и удалении твитов из ленты
+    feed_version: Mapped[int] = mapped_column(default=0, server_default="0")
     followers: Mapped[list["User"]] = relationship(
         "User",
         secondary=follower_tbl,
         primaryjoin=(follower_tbl.c.following_id == id),
         secondaryjoin=(follower_tbl.c.follower_id == id),
         back_populates="following",
-        lazy="selectin",
+        lazy="raise",
     )
     following: Mapped[list["User"]] = relationship(
         "User",
@@ -38,7 +63,7 @@ class User(Base):
         primaryjoin=(follower_tbl.c.follower_id == id),
         secondaryjoin=(follower_tbl.c.following_id == id),
         back_populates="followers",
-        lazy="selectin",
+        lazy="raise",
     )
     likes = relationship(
         "Like", back_populates="users_lk", cascade="all, delete-orphan"
@@ -54,6 +79,17 @@ class Tweet(Base):
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True, index=True)
     author_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
     content: Mapped[str] = mapped_column(String(2500))
+    # False - твит не разложен по home_timeline (автор с большим числом
+    # подписчиков или твит создан до появления ленты) и подмешивается при чтении
+    fanned_out: Mapped[bool] = mapped_column(default=False, server_default=false())
+    # Денормализованный счётчик лайков, сверяется с likes фоновой задачей
+    likes_count: Mapped[int] = mapped_column(default=0, server_default="0")
+    # Вычисляется БД из content, для поиска по индексу GIN
+    search_vector: Mapped[str] = mapped_column(
+        TSVECTOR,
+        Computed(f"to_tsvector('{SEARCH_CONFIG}', content)", persisted=True),
+        deferred=True,
+    )
     attachments: Mapped[List["Media"]] = relationship(
         backref="tweets", cascade="all, delete-orphan"
     )
@@ -64,6 +100,18 @@ class Tweet(Base):
         "User", back_populates="tweets", lazy="selectin", innerjoin=True
     )
 
+    __table_args__ = (
+        Index("ix_tweets_author_id_id", "author_id", "id"),
+        Index("ix_tweets_author_id_likes_count", "author_id", "likes_count"),
+        Index(
+            "ix_tweets_author_id_id_not_fanned_out",
+            "author_id",
+            "id",
+            postgresql_where=text("NOT fanned_out"),
+        ),
+        Index("ix_tweets_search_vector", "search_vector", postgresql_using="gin"),
+    )
+
 
 class Like(Base):
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True, index=True)
@@ -74,8 +122,43 @@ class Like(Base):
         "User", back_populates="likes", lazy="joined"
     )
 
+    __table_args__ = (
+        Index("uq_likes_tweet_id_user_id", "tweet_id", "user_id", unique=True),
+    )
+
 
 class Media(Base):
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True, index=True)
     link: Mapped[str]
     tweet_id: Mapped[int] = mapped_column(ForeignKey("tweets.id"), nullable=True)
+    # Заполняется в режиме адресации по содержимому, NULL у старых файлов
+    sha256: Mapped[Optional[str]] = mapped_column(
+        String(64), ForeignKey("media_blobs.sha256"), nullable=True, index=True
+    )
+    width: Mapped[Optional[int]]
+    height: Mapped[Optional[int]]
+    # {"thumb": {"link": ..., "width": ..., "height": ...}, ...}
+    variants: Mapped[Optional[dict]] = mapped_column(
+        JSON(none_as_null=True), nullable=True
+    )
+
+
+class MediaBlob(Base):
+    __tablename__ = "media_blobs"
+
+    sha256: Mapped[str] = mapped_column(String(64), primary_key=True)
+    link: Mapped[str]
+    size: Mapped[int] = mapped_column(BigInteger)
+    # Число записей medias, ссылающихся на файл
+    ref_count: Mapped[int] = mapped_column(default=1, server_default="1")
+
+
+class HomeTimeline(Base):
+    __tablename__ = "home_timeline"
+
+    user_id: Mapped[int] = mapped_column(
+        ForeignKey("users.id", ondelete="CASCADE"), primary_key=True
+    )
+    tweet_id: Mapped[int] = mapped_column(
+        ForeignKey("tweets.id", ondelete="CASCADE"), primary_key=True, index=True
+    )
@@ -0,0 +1,60 @@
+from functools import lru_cache
+from typing import Any, Optional, Type, Union
+
+from fastapi.responses import JSONResponse, Response
+from pydantic import BaseModel, TypeAdapter
+
+from api.config.config import settings
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson необязателен
+    orjson = None
+
+
+class ORJSONResponse(JSONResponse):
+    """JSON-ответ, сериализуемый через orjson"""
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content)
+
+
+@lru_cache(maxsize=None)
+def get_adapter(model: Type[BaseModel]) -> TypeAdapter:
+    """Скомпилированный один раз сериализатор схемы ответа"""
+    return TypeAdapter(model)
+
+
+def fast_response(
+    model: Type[BaseModel], content: Any, response: Optional[Response] = None
+) -> Union[Any, Response]:
+    """
+    Быстрый ответ для эндпоинтов, которые собирают данные сами.
+
+    При выключенном FAST_JSON содержимое возвращается как есть, и FastAPI
+    валидирует его по response_model. При включённом готовый Response
+    минует эту валидацию, а схема OpenAPI по-прежнему строится
+    из response_model маршрута. Словари ленты и профилей уже имеют форму
+    схемы, поэтому с orjson они сериализуются напрямую; без orjson
+    выполняется одна проверка и сериализация в JSON средствами pydantic-core.
+
+    response - Response, внедрённый FastAPI в маршрут: заголовки, которые
+    в него записали зависимости (например, ETag), переносятся в готовый ответ.
+    """
+    if not settings.FAST_JSON:
+        return content
+    headers = None
+    if response is not None:
+        headers = {
+            name: value
+            for name, value in response.headers.items()
+            if name != "content-length"
+        }
+    if orjson is not None:
+        return ORJSONResponse(content, headers=headers)
+    adapter = get_adapter(model)
+    return Response(
+        adapter.dump_json(adapter.validate_python(content)),
+        media_type="application/json",
+        headers=headers,
+    )
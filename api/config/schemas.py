@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple
 
 from pydantic import BaseModel, ConfigDict, PrivateAttr
 
@@ -14,8 +14,8 @@ class Follow(BaseModel):
 class UserSCH(BaseModel):
     id: int
     name: str
-    followers: Optional[List[Follow]] = None
-    following: Optional[List[Follow]] = None
+    followers_count: int = 0
+    following_count: int = 0
     _api_key: str = PrivateAttr()
     _created_at: datetime = PrivateAttr()
     _updated_at: datetime = PrivateAttr()
@@ -23,9 +23,54 @@ class UserSCH(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
 
+class ProfileSCH(UserSCH):
+    is_following: bool = False
+    # Первые подписчики и подписки для клиентов, которые читают списки
+    # вместо счётчиков; не больше PROFILE_FOLLOW_PREVIEW каждого
+    followers: List[Follow] = []
+    following: List[Follow] = []
+
+
+class AuthUser(BaseModel):
+    id: int
+    name: str
+    following_ids: Tuple[int, ...] = ()
+
+    model_config = ConfigDict(frozen=True)
+
+
 class GetUser(BaseModel):
     result: bool
-    user: UserSCH
+    user: ProfileSCH
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class GetFollows(BaseModel):
+    result: bool
+    users: List[Follow]
+    next_cursor: Optional[str] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class GetUsers(BaseModel):
+    result: bool
+    users: List[UserSCH]
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class BatchIds(BaseModel):
+    ids: List[int]
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class BatchResult(BaseModel):
+    result: bool = True
+    applied: List[int]
+    not_found: List[int]
 
     model_config = ConfigDict(from_attributes=True)
 
@@ -71,6 +116,23 @@ class Media(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
 
+class MediaVariant(BaseModel):
+    link: str
+    width: int
+    height: int
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class Attachment(BaseModel):
+    link: str
+    width: Optional[int] = None
+    height: Optional[int] = None
+    variants: Optional[Dict[str, MediaVariant]] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
+
 class TweetAuthor(BaseModel):
     id: int
     name: str
@@ -83,6 +145,7 @@ class Tweets(BaseModel):
     content: str
     author: TweetAuthor
     attachments: Optional[List] = None
+    attachment_variants: Optional[List[Attachment]] = None
     likes: Optional[List[Likes]] = None
 
     model_config = ConfigDict(from_attributes=True)
@@ -91,6 +154,20 @@ class Tweets(BaseModel):
 class GetTweet(BaseModel):
     result: bool
     tweets: List[Tweets]
+    next_cursor: Optional[str] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class SearchTweet(Tweets):
+    # Фрагмент текста с совпадениями в <b>, остальной текст экранирован
+    highlight: Optional[str] = None
+
+
+class SearchResult(BaseModel):
+    result: bool
+    tweets: List[SearchTweet]
+    next_cursor: Optional[str] = None
 
     model_config = ConfigDict(from_attributes=True)
 
@@ -1,7 +1,12 @@
+import asyncio
+import math
 from datetime import datetime
-from typing import Annotated, AsyncGenerator
+from typing import Annotated, AsyncGenerator, Optional
 
+from fastapi import Request, Response
 from sqlalchemy import func
+from sqlalchemy.exc import DBAPIError, IntegrityError
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 from sqlalchemy.ext.asyncio import (
     AsyncAttrs,
     AsyncSession,
@@ -9,15 +14,22 @@ from sqlalchemy.ext.asyncio import (
     create_async_engine,
 )
 from sqlalchemy.orm import DeclarativeBase, Mapped, declared_attr, mapped_column
+from starlette.exceptions import HTTPException
 
-from api.config.config import settings
+from api.config.config import logger, settings
 from api.config.exceptions import Error_DB
+from api.database.replicas import WRITE_MARKER_COOKIE, ReplicaRouter
 
 DATABASE_URL = settings.get_db_url()
 
-# Создаем асинхронный движок для работы с базой данных
+# Создаем асинхронный движок для работы с базой данных. SQL пишется в журнал
+# через общую очередь логирования, если включён DB_ECHO
 engine = create_async_engine(
-    DATABASE_URL, echo=True, pool_pre_ping=True, pool_size=10, max_overflow=20
+    DATABASE_URL,
+    pool_pre_ping=True,
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_timeout=settings.DB_POOL_TIMEOUT,
 )
 
 # Создаем фабрику сессий для взаимодействия с базой данных
@@ -29,13 +41,60 @@ async_session_maker = async_sessionmaker(
     autoflush=False,
 )
 
+# Реплики для запросов только на чтение, без DB_REPLICA_URLS всё читается
+# с основной БД
+replicas = ReplicaRouter(
+    settings.DB_REPLICA_URLS,
+    retry_after=settings.DB_REPLICA_RETRY_AFTER,
+    write_window=settings.READ_YOUR_WRITES_WINDOW,
+    pool_pre_ping=True,
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_timeout=settings.DB_POOL_TIMEOUT,
+    connect_args={"timeout": settings.DB_REPLICA_CONNECT_TIMEOUT},
+)
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+# SQLSTATE нарушения внешнего ключа в PostgreSQL
+FOREIGN_KEY_VIOLATION = "23503"
+
+
+def is_foreign_key_violation(error: IntegrityError) -> bool:
+    """Ссылка на несуществующую строку, а не конфликт уникальности"""
+    return getattr(error.orig, "sqlstate", None) == FOREIGN_KEY_VIOLATION
 
-async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
+
+async def get_async_session(
+    request: Request, response: Response
+) -> AsyncGenerator[AsyncSession, None]:
     """Создает асинхронную сессию для работы с базой данных"""
+    if replicas and request.method not in SAFE_METHODS:
+        # Заголовки ответа собираются до выхода из зависимости, поэтому
+        # отметка ставится заранее; при ошибке ответ её не содержит
+        response.set_cookie(
+            WRITE_MARKER_COOKIE,
+            replicas.write_marker(),
+            max_age=math.ceil(replicas.write_window),
+            httponly=True,
+            samesite="lax",
+        )
     session = async_session_maker()
     try:
         yield session
         await session.commit()
+    except HTTPException:
+        # Ошибки обработчиков уже содержат нужный код ответа
+        await session.rollback()
+        raise
+    except PoolTimeoutError as e:
+        await session.rollback()
+        logger.error("Нет свободных соединений с БД: %s", e)
+        raise Error_DB(
+            message="База данных перегружена, повторите запрос позже",
+            code=503,
+            headers={"Retry-After": "1"},
+        )
     except Exception as e:
         await session.rollback()
         raise Error_DB(message=f"Database error: {str(e)}", code=400)
@@ -43,6 +102,37 @@ async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
         await session.close()
 
 
+async def open_read_session(write_marker: Optional[str]) -> AsyncSession:
+    """
+    Сессия на исправной реплике или на основной БД.
+
+    Основная БД используется без реплик, когда все реплики недоступны и
+    когда отметка write_marker показывает недавнюю запись клиента.
+    """
+    if not replicas or replicas.wrote_recently(write_marker):
+        return async_session_maker()
+    for replica in replicas.candidates():
+        session = async_session_maker(bind=replica.engine)
+        try:
+            await session.connection()
+        except (OSError, DBAPIError, asyncio.TimeoutError) as e:
+            await session.close()
+            replicas.mark_down(replica, e)
+            continue
+        return session
+    logger.warning("Нет доступных реплик, чтение с основной БД")
+    return async_session_maker()
+
+
+async def get_read_session(request: Request) -> AsyncGenerator[AsyncSession, None]:
+    """Асинхронная сессия для запросов только на чтение"""
+    session = await open_read_session(request.cookies.get(WRITE_MARKER_COOKIE))
+    try:
+        yield session
+    finally:
+        await session.close()
+
+
 # Базовый класс для всех моделей
 class Base(AsyncAttrs, DeclarativeBase):
     __abstract__ = (
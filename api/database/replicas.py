@@ -0,0 +1,87 @@
+import time
+from typing import List, Optional, Sequence
+
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+from api.config.config import logger
+
+# Cookie с отметкой о недавней записи: клиент возвращает её в любой воркер
+WRITE_MARKER_COOKIE = "recent_write"
+
+
+class Replica:
+    def __init__(self, url: str, engine: AsyncEngine):
+        self.url = url
+        self.engine = engine
+        # Время monotonic, до которого реплика считается недоступной
+        self.down_until = 0.0
+
+    @property
+    def healthy(self) -> bool:
+        return self.down_until <= time.monotonic()
+
+
+class ReplicaRouter:
+    """
+    Выбор реплики для запросов только на чтение.
+
+    Реплики выбираются по кругу. Реплика, к которой не удалось
+    подключиться, исключается на retry_after секунд. Пользователь, недавно
+    выполнивший запись, читает с основной БД в течение окна write_window,
+    чтобы видеть свои изменения несмотря на отставание реплик. Отметка о
+    записи - время окончания окна, её хранит клиент в cookie, поэтому она
+    действует в любом воркере.
+    """
+
+    def __init__(
+        self,
+        urls: Sequence[str],
+        retry_after: float,
+        write_window: float,
+        **engine_options,
+    ):
+        self.replicas: List[Replica] = [
+            Replica(url, create_async_engine(url, **engine_options)) for url in urls
+        ]
+        self.retry_after = retry_after
+        self.write_window = write_window
+        self._next = 0
+
+    def __bool__(self) -> bool:
+        return bool(self.replicas)
+
+    def candidates(self) -> List[Replica]:
+        """Исправные реплики, начиная со следующей по кругу"""
+        count = len(self.replicas)
+        start = self._next
+        self._next = (self._next + 1) % count if count else 0
+        ordered = self.replicas[start:] + self.replicas[:start]
+        return [replica for replica in ordered if replica.healthy]
+
+    def mark_down(self, replica: Replica, error: BaseException) -> None:
+        replica.down_until = time.monotonic() + self.retry_after
+        logger.warning(
+            "Реплика %s недоступна, исключена на %s с: %s",
+            replica.engine.url.render_as_string(hide_password=True),
+            self.retry_after,
+            error,
+        )
+
+    def write_marker(self) -> str:
+        """Отметка о записи: время окончания окна чтения с основной БД"""
+        return str(time.time() + self.write_window)
+
+    def wrote_recently(self, marker: Optional[str]) -> bool:
+        """Отметка marker ещё действует; окно не длиннее write_window"""
+        if marker is None:
+            return False
+        try:
+            deadline = float(marker)
+        except ValueError:
+            return False
+        now = time.time()
+        return now < deadline <= now + self.write_window
+
+    async def dispose(self) -> None:
+        for replica in self.replicas:
+            await replica.engine.dispose()
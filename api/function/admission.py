@@ -0,0 +1,215 @@
+"""
+Ограничение числа одновременно обрабатываемых запросов перед пулом БД.
+
+Запросы делятся на классы (чтение, запись, загрузка медиа), у каждого
+класса свой лимит параллельных запросов и ограниченная очередь ожидания.
+Допущенный запрос держит не больше одного соединения одновременно:
+проверка API-ключа возвращает своё соединение в пул до сессии чтения.
+Поэтому сумма лимитов не должна превышать DB_POOL_SIZE + DB_MAX_OVERFLOW,
+тогда допущенные запросы не ждут соединение внутри SQLAlchemy. Запрос, который не дождётся места
+за ADMISSION_MAX_WAIT секунд, отклоняется сразу с 503 и Retry-After,
+не занимая очередь.
+"""
+
+import asyncio
+import math
+import time
+from typing import Dict, Optional
+
+from starlette.routing import Match
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from api.config.config import logger, settings
+from api.config.schemas import ErrorMSG
+from api.function.metrics import Counter, Histogram, UpDownGauge, registry
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+# Долгие соединения без обращения к БД после подключения
+UNLIMITED_PATHS = ("/api/tweets/stream",)
+# Вес новой длительности в скользящем среднем времени обслуживания
+SERVICE_TIME_WEIGHT = 0.1
+
+ADMISSION_IN_FLIGHT = registry.register(
+    UpDownGauge(
+        "admission_in_flight",
+        "Допущенные запросы в обработке по классу",
+        labels=("route_class",),
+    )
+)
+ADMISSION_QUEUE_DEPTH = registry.register(
+    UpDownGauge(
+        "admission_queue_depth",
+        "Запросы, ожидающие допуска, по классу",
+        labels=("route_class",),
+    )
+)
+ADMISSION_SHED = registry.register(
+    Counter(
+        "admission_shed_total",
+        "Отклонённые с 503 запросы по классу и причине",
+        labels=("route_class", "reason"),
+    )
+)
+ADMISSION_WAIT = registry.register(
+    Histogram(
+        "admission_wait_seconds",
+        "Время ожидания допуска",
+        labels=("route_class",),
+    )
+)
+
+
+class AdmissionLimiter:
+    """Лимит параллельных запросов одного класса с ограниченной очередью"""
+
+    def __init__(self, name: str, limit: int, queue_size: int, max_wait: float):
+        self.name = name
+        self.limit = limit
+        self.queue_size = queue_size
+        self.max_wait = max_wait
+        self.waiting = 0
+        # Скользящее среднее времени обработки допущенного запроса
+        self.service_time = 0.0
+        self._semaphore = asyncio.Semaphore(limit)
+
+    def expected_wait(self) -> float:
+        """Оценка ожидания для нового запроса: очередь делится на limit слотов"""
+        return (self.waiting + 1) / self.limit * self.service_time
+
+    def retry_after(self) -> int:
+        return max(1, math.ceil(self.expected_wait()))
+
+    async def acquire(self) -> Optional[str]:
+        """Допуск запроса; при отказе возвращается причина"""
+        if not self._semaphore.locked():
+            await self._semaphore.acquire()
+            ADMISSION_WAIT.observe(0, self.name)
+            return None
+        if self.waiting >= self.queue_size:
+            return "queue_full"
+        # Запрос всё равно не дождётся места, ожидание только удлинит очередь
+        if self.expected_wait() > self.max_wait:
+            return "deadline"
+
+        self.waiting += 1
+        ADMISSION_QUEUE_DEPTH.inc(self.name)
+        start = time.perf_counter()
+        try:
+            async with asyncio.timeout(self.max_wait):
+                await self._semaphore.acquire()
+        except TimeoutError:
+            return "timeout"
+        finally:
+            self.waiting -= 1
+            ADMISSION_QUEUE_DEPTH.dec(self.name)
+        ADMISSION_WAIT.observe(time.perf_counter() - start, self.name)
+        return None
+
+    def release(self, elapsed: float) -> None:
+        self._semaphore.release()
+        self.service_time += SERVICE_TIME_WEIGHT * (elapsed - self.service_time)
+
+
+def route_class(scope: Scope) -> Optional[str]:
+    """Класс запроса; None - запрос без обращения к БД, не ограничивается"""
+    path = scope["path"]
+    if not path.startswith("/api/") or path in UNLIMITED_PATHS:
+        return None
+    if path.startswith("/api/medias"):
+        return "media"
+    return "read" if scope["method"] in SAFE_METHODS else "write"
+
+
+def build_limiters() -> Dict[str, AdmissionLimiter]:
+    capacity = settings.DB_POOL_SIZE + settings.DB_MAX_OVERFLOW
+    if sum(settings.ADMISSION_LIMITS.values()) > capacity:
+        logger.warning(
+            "Сумма ADMISSION_LIMITS %s больше пула соединений %s: допущенные "
+            "запросы будут ждать соединение внутри пула",
+            settings.ADMISSION_LIMITS,
+            capacity,
+        )
+    return {
+        name: AdmissionLimiter(
+            name,
+            limit=limit,
+            queue_size=settings.ADMISSION_QUEUE_SIZE,
+            max_wait=settings.ADMISSION_MAX_WAIT,
+        )
+        for name, limit in settings.ADMISSION_LIMITS.items()
+    }
+
+
+class AdmissionMiddleware:
+    """ASGI-мидлварь допуска запросов по классам с отказом 503"""
+
+    def __init__(
+        self, app: ASGIApp, limiters: Optional[Dict[str, AdmissionLimiter]] = None
+    ):
+        self.app = app
+        self.limiters = build_limiters() if limiters is None else limiters
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        limiter: Optional[AdmissionLimiter] = None
+        if scope["type"] == "http":
+            limiter = self.limiters.get(route_class(scope))
+        if limiter is None:
+            await self.app(scope, receive, send)
+            return
+
+        reason = await limiter.acquire()
+        if reason is not None:
+            ADMISSION_SHED.inc(limiter.name, reason)
+            logger.warning(
+                "Запрос %s %s отклонён: класс %s, причина %s",
+                scope["method"],
+                scope["path"],
+                limiter.name,
+                reason,
+            )
+            self.match_route(scope)
+            await self.reject(send, limiter.retry_after())
+            return
+
+        ADMISSION_IN_FLIGHT.inc(limiter.name)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            ADMISSION_IN_FLIGHT.dec(limiter.name)
+            limiter.release(time.perf_counter() - start)
+
+    @staticmethod
+    def match_route(scope: Scope) -> None:
+        """
+        Маршрут отклонённого запроса для метки route в метриках: до
+        роутера, который сам записывает scope["route"], запрос не дошёл.
+        """
+        partial = None
+        for route in getattr(scope.get("app"), "routes", ()):
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                scope["route"] = route
+                return
+            if match == Match.PARTIAL and partial is None:
+                partial = route
+        if partial is not None:
+            scope["route"] = partial
+
+    @staticmethod
+    async def reject(send: Send, retry_after: int) -> None:
+        body = ErrorMSG(
+            error_type="Service Unavailable",
+            error_message="Сервер перегружен, повторите запрос позже",
+        ).model_dump_json()
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 503,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"retry-after", str(retry_after).encode()),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": body.encode()})
@@ -0,0 +1,54 @@
+from typing import Dict, Iterable, List, Sequence
+
+from fastapi import HTTPException, Query, status
+
+from api.config.config import logger, settings
+
+
+def check_batch(ids: Iterable[int]) -> List[int]:
+    """Id пачки без повторов в исходном порядке с проверкой размера"""
+    unique = list(dict.fromkeys(ids))
+    if not unique:
+        logger.error("Пустая пачка id")
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Не передано ни одного id"
+        )
+    if len(unique) > settings.BATCH_MAX_SIZE:
+        logger.error("Пачка из %s id больше допустимой", len(unique))
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Можно передать не больше {settings.BATCH_MAX_SIZE} id",
+        )
+    return unique
+
+
+def parse_ids(ids: List[str] = Query(default=[])) -> List[int]:
+    """Id из параметра ids: ?ids=1,2,3 или ?ids=1&ids=2"""
+    try:
+        parsed = [int(part) for value in ids for part in value.split(",") if part]
+    except ValueError:
+        logger.error("Некорректный список id: %s", ids)
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Некорректный список id"
+        )
+    return check_batch(parsed)
+
+
+def batch_result(ids: Sequence[int], rows: Iterable) -> Dict:
+    """
+    Итог пакетной операции по строкам (id, applied).
+
+    applied - id, для которых операция что-то изменила, not_found - id,
+    которых нет в БД.
+    """
+    found = set()
+    applied = set()
+    for row in rows:
+        found.add(row.id)
+        if row.applied:
+            applied.add(row.id)
+    return {
+        "result": True,
+        "applied": [item for item in ids if item in applied],
+        "not_found": [item for item in ids if item not in found],
+    }
@@ -0,0 +1,92 @@
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+
+class TTLCache:
+    """LRU-кэш в памяти процесса с ограничением размера и временем жизни записей"""
+
+    def __init__(self, maxsize: int, ttl: float) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        item = self._data.get(key)
+        if item is None:
+            self.misses += 1
+            return None
+        expires_at, value = item
+        if expires_at < time.monotonic():
+            self._discard(key, value)
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """Запись со сроком жизни ttl, по умолчанию - общим для кэша"""
+        if self.maxsize <= 0:
+            return
+        old = self._data.pop(key, None)
+        if old is not None:
+            self._discard(key, old[1])
+        expires_in = self.ttl if ttl is None else ttl
+        self._data[key] = (time.monotonic() + expires_in, value)
+        while len(self._data) > self.maxsize:
+            oldest_key, (_, oldest_value) = self._data.popitem(last=False)
+            self._discard(oldest_key, oldest_value)
+            self.evictions += 1
+
+    def pop(self, key: Hashable) -> None:
+        item = self._data.pop(key, None)
+        if item is not None:
+            self._discard(key, item[1])
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "size": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+    def _discard(self, key: Hashable, value: Any) -> None:
+        """Хук для наследников: запись удалена из кэша"""
+        self._data.pop(key, None)
+
+
+class AuthCache(TTLCache):
+    """Кэш api-ключ -> запись пользователя с инвалидацией по id пользователя"""
+
+    def __init__(self, maxsize: int, ttl: float) -> None:
+        super().__init__(maxsize=maxsize, ttl=ttl)
+        self._keys_by_user: Dict[int, set] = {}
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        super().set(key, value, ttl)
+        if key in self._data:
+            self._keys_by_user.setdefault(value.id, set()).add(key)
+
+    def invalidate_user(self, user_id: int) -> None:
+        for key in self._keys_by_user.pop(user_id, set()):
+            self.pop(key)
+
+    def clear(self) -> None:
+        super().clear()
+        self._keys_by_user.clear()
+
+    def _discard(self, key: Hashable, value: Any) -> None:
+        super()._discard(key, value)
+        keys = self._keys_by_user.get(value.id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_user[value.id]
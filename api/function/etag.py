@@ -0,0 +1,41 @@
+"""
+Условные GET-запросы: ETag и If-None-Match.
+
+ETag строится из дешёвого отпечатка версии данных (версий кэша ленты или
+версии и старших id ленты в БД, updated_at профиля), поэтому совпадение
+проверяется до основного запроса.
+"""
+
+import hashlib
+from typing import Any
+
+from fastapi import Request
+
+from api.config.exceptions import NotModified
+
+
+def make_etag(*parts: Any) -> str:
+    """Слабый ETag из частей отпечатка"""
+    digest = hashlib.blake2b(
+        "|".join("" if part is None else str(part) for part in parts).encode(),
+        digest_size=12,
+    ).hexdigest()
+    return f'W/"{digest}"'
+
+
+def etag_matches(header: str, etag: str) -> bool:
+    """Сравнение со списком If-None-Match по слабому сравнению (RFC 9110)"""
+    if header.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(
+        candidate.strip().removeprefix("W/") == opaque
+        for candidate in header.split(",")
+    )
+
+
+def check_not_modified(request: Request, etag: str) -> None:
+    """304 Not Modified, если у клиента уже есть эта версия ответа"""
+    header = request.headers.get("if-none-match")
+    if header and etag_matches(header, etag):
+        raise NotModified(etag)
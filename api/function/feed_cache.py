@@ -0,0 +1,323 @@
+"""
+Кэш страниц ленты с инвалидацией по версиям.
+
+Страница ленты зависит от подписок пользователя и от твитов (и лайков на
+них) авторов, на которых он подписан. Для каждого пользователя хранится
+версия user, для каждого автора - версия author; записи увеличивают их
+после фиксации транзакции. Отпечаток страницы - версия пользователя и
+версии всех авторов его ленты, поэтому любая запись, влияющая на ленту,
+даёт новый отпечаток.
+
+Подписка и отписка увеличивают версию подписчика, и только она решает,
+актуален ли запомненный воркером список авторов: при новой версии список
+перечитывается из основной БД, а не берётся из кэша авторизации, который
+в другом воркере мог не узнать о подписке.
+
+Запись кэша с устаревшим отпечатком, но с прежней версией пользователя
+(изменились только чужие твиты или лайки), отдаётся в течение
+FEED_CACHE_STALE_TTL, пока одно фоновое обновление строит новую страницу.
+После собственной записи пользователь сразу получает свежую страницу.
+"""
+
+import asyncio
+import hashlib
+import json
+import time
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from api.config.config import logger, settings
+from api.config.models import follower_tbl
+from api.config.schemas import AuthUser
+from api.database.database import async_session_maker, open_read_session
+from api.function.cache import TTLCache
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson необязателен
+    orjson = None
+
+# Загрузка страницы из БД; None - использовать сессию текущего запроса
+FeedLoader = Callable[[Optional[AsyncSession]], Awaitable[Dict]]
+# Загрузка id авторов, на которых подписан пользователь
+FollowingLoader = Callable[[int], Awaitable[Iterable[int]]]
+
+
+def dumps(value: Dict) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, ensure_ascii=False).encode()
+
+
+def loads(value: bytes) -> Dict:
+    return orjson.loads(value) if orjson is not None else json.loads(value)
+
+
+class CacheBackend:
+    """Хранилище записей и версий кэша"""
+
+    async def get(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    async def set(self, key: str, value: bytes, ttl: float) -> None:
+        raise NotImplementedError
+
+    async def get_versions(self, keys: List[str]) -> List[int]:
+        """Текущие версии ключей, отсутствующая версия - 0"""
+        raise NotImplementedError
+
+    async def bump(self, keys: List[str]) -> None:
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        pass
+
+
+class MemoryBackend(CacheBackend):
+    """Кэш в памяти процесса: версии видны только внутри одного воркера"""
+
+    def __init__(self, maxsize: int):
+        self._entries = TTLCache(maxsize=maxsize, ttl=0)
+        self._versions: Dict[str, int] = {}
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return self._entries.get(key)
+
+    async def set(self, key: str, value: bytes, ttl: float) -> None:
+        self._entries.set(key, value, ttl=ttl)
+
+    async def get_versions(self, keys: List[str]) -> List[int]:
+        return [self._versions.get(key, 0) for key in keys]
+
+    async def bump(self, keys: List[str]) -> None:
+        for key in keys:
+            self._versions[key] = self._versions.get(key, 0) + 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._versions.clear()
+
+
+class RedisBackend(CacheBackend):
+    """
+    Кэш в Redis (или совместимом сервере) через клиент redis.asyncio.
+
+    Клиент держит пул соединений; версии хранятся без срока жизни, чтобы
+    счётчик не начинался заново после вытеснения.
+    """
+
+    def __init__(self, url: str, timeout: float = 1.0):
+        self.client = Redis.from_url(
+            url, socket_timeout=timeout, socket_connect_timeout=timeout
+        )
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self.client.get(key)
+
+    async def set(self, key: str, value: bytes, ttl: float) -> None:
+        await self.client.set(key, value, px=int(ttl * 1000))
+
+    async def get_versions(self, keys: List[str]) -> List[int]:
+        values = await self.client.mget(keys)
+        return [int(value) if value is not None else 0 for value in values]
+
+    async def bump(self, keys: List[str]) -> None:
+        # Все INCR уходят одним пакетом без транзакции
+        async with self.client.pipeline(transaction=False) as pipe:
+            for key in keys:
+                pipe.incr(key)
+            await pipe.execute()
+
+    async def close(self) -> None:
+        await self.client.aclose()
+
+
+async def following_from_primary(user_id: int) -> List[int]:
+    """Подписки пользователя с основной БД: реплика могла ещё не получить подписку"""
+    async with async_session_maker() as session:
+        result = await session.scalars(
+            select(follower_tbl.c.following_id).where(
+                follower_tbl.c.follower_id == user_id
+            )
+        )
+        return list(result.all())
+
+
+def user_version_key(user_id: int) -> str:
+    return f"feed:v:user:{user_id}"
+
+
+def author_version_key(author_id: int) -> str:
+    return f"feed:v:author:{author_id}"
+
+
+class FeedCache:
+    """Кэш страниц ленты поверх хранилища CacheBackend"""
+
+    def __init__(
+        self,
+        backend: Optional[CacheBackend],
+        ttl: float,
+        stale_ttl: float,
+        load_following: Optional[FollowingLoader] = None,
+        authors_size: int = 10000,
+    ):
+        self.backend = backend
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.load_following = load_following or following_from_primary
+        # Обновления, выполняемые в этом воркере, по ключу страницы
+        self._refreshing: Dict[str, asyncio.Task] = {}
+        # Авторы ленты пользователя и версия пользователя, при которой
+        # они прочитаны из БД
+        self._authors = TTLCache(maxsize=authors_size, ttl=ttl + stale_ttl)
+
+    async def fingerprint(self, user: AuthUser) -> Tuple[int, str]:
+        """Версия пользователя и отпечаток версий всех авторов его ленты"""
+        known = self._authors.get(user.id)
+        authors = known[1] if known is not None else [user.id]
+        versions = await self.backend.get_versions(
+            [user_version_key(user.id)] + [author_version_key(a) for a in authors]
+        )
+        if known is None or known[0] != versions[0]:
+            # Подписки менялись: версии читаются заново для списка из БД
+            authors = sorted({user.id, *await self.load_following(user.id)})
+            self._authors.set(user.id, (versions[0], authors))
+            versions = versions[:1] + await self.backend.get_versions(
+                [author_version_key(a) for a in authors]
+            )
+        digest = hashlib.blake2b(
+            ",".join(map(str, versions)).encode(), digest_size=12
+        ).hexdigest()
+        return versions[0], digest
+
+    async def versions(self, user: AuthUser) -> Optional[Tuple[int, str]]:
+        """Версия пользователя и отпечаток; None - кэш выключен или недоступен"""
+        if self.backend is None:
+            return None
+        try:
+            return await self.fingerprint(user)
+        except (OSError, RedisError) as e:
+            logger.warning("Кэш ленты недоступен: %s", e)
+            return None
+
+    async def get_feed(
+        self,
+        user: AuthUser,
+        limit: int,
+        cursor: Optional[str],
+        load: FeedLoader,
+        versions: Optional[Tuple[int, str]] = None,
+    ) -> Tuple[Dict, Optional[str]]:
+        """
+        Страница ленты из кэша или из БД и отпечаток, которому она соответствует.
+
+        load получает сессию: при обычном промахе - сессию запроса,
+        при фоновом обновлении - отдельную сессию только для чтения.
+        versions - уже полученный результат self.versions(user).
+        """
+        if versions is None:
+            versions = await self.versions(user)
+        if versions is None:
+            return await load(None), None
+        user_version, fingerprint = versions
+        key = f"feed:{user.id}:{limit}:{cursor or ''}"
+        try:
+            cached = await self.backend.get(key)
+        except (OSError, RedisError) as e:
+            logger.warning("Кэш ленты недоступен: %s", e)
+            return await load(None), fingerprint
+
+        if cached is not None:
+            entry = loads(cached)
+            age = time.time() - entry["created"]
+            if entry["fingerprint"] == fingerprint and age < self.ttl:
+                return entry["feed"], fingerprint
+            # Устаревшая страница отдаётся, только если пользователь сам
+            # ничего не менял и окно FEED_CACHE_STALE_TTL не истекло
+            stale_allowed = self.stale_ttl > 0 and age < self.ttl + self.stale_ttl
+            if stale_allowed and entry["user_version"] == user_version:
+                self._refresh_later(key, user_version, fingerprint, load)
+                return entry["feed"], entry["fingerprint"]
+
+        feed = await load(None)
+        await self._store(key, user_version, fingerprint, feed)
+        return feed, fingerprint
+
+    async def _store(
+        self, key: str, user_version: int, fingerprint: str, feed: Dict
+    ) -> None:
+        entry = {
+            "created": time.time(),
+            "user_version": user_version,
+            "fingerprint": fingerprint,
+            "feed": feed,
+        }
+        try:
+            await self.backend.set(key, dumps(entry), self.ttl + self.stale_ttl)
+        except (OSError, RedisError) as e:
+            logger.warning("Не удалось сохранить ленту в кэш: %s", e)
+
+    def _refresh_later(
+        self, key: str, user_version: int, fingerprint: str, load: FeedLoader
+    ) -> None:
+        """Одно фоновое обновление страницы на воркер"""
+        if key in self._refreshing:
+            return
+
+        async def refresh() -> None:
+            session = await open_read_session(None)
+            try:
+                feed = await load(session)
+            finally:
+                await session.close()
+            await self._store(key, user_version, fingerprint, feed)
+
+        task = asyncio.get_running_loop().create_task(refresh())
+        self._refreshing[key] = task
+        task.add_done_callback(lambda done: self._refresh_done(key, done))
+
+    def _refresh_done(self, key: str, task: asyncio.Task) -> None:
+        self._refreshing.pop(key, None)
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning("Фоновое обновление ленты не удалось: %s", task.exception())
+
+    async def bump(
+        self, users: Iterable[int] = (), authors: Iterable[int] = ()
+    ) -> None:
+        """Новые версии после фиксации записи, влияющей на ленты"""
+        if self.backend is None:
+            return
+        keys = [user_version_key(user_id) for user_id in set(users)]
+        keys += [author_version_key(author_id) for author_id in set(authors)]
+        if not keys:
+            return
+        try:
+            await self.backend.bump(keys)
+        except (OSError, RedisError) as e:
+            logger.warning("Не удалось обновить версии кэша ленты: %s", e)
+
+    async def close(self) -> None:
+        for task in list(self._refreshing.values()):
+            task.cancel()
+        if self.backend is not None:
+            await self.backend.close()
+
+
+def build_backend() -> Optional[CacheBackend]:
+    if settings.FEED_CACHE_BACKEND == "memory":
+        return MemoryBackend(maxsize=settings.FEED_CACHE_SIZE)
+    if settings.FEED_CACHE_BACKEND == "redis":
+        return RedisBackend(settings.FEED_CACHE_REDIS_URL)
+    return None
+
+
+feed_cache = FeedCache(
+    build_backend(),
+    ttl=settings.FEED_CACHE_TTL,
+    stale_ttl=settings.FEED_CACHE_STALE_TTL,
+)
@@ -0,0 +1,185 @@
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import Row, Select, func, or_, select, union_all
+from sqlalchemy.dialects.postgresql import JSON, aggregate_order_by
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+from sqlalchemy.sql.selectable import Subquery
+
+from api.config.models import HomeTimeline, Like, Media, Tweet, User, follower_tbl
+from api.function.pagination import decode_cursor, encode_cursor
+
+
+def followed_authors(user_id: int) -> Select:
+    """id авторов, на которых подписан пользователь"""
+    return select(follower_tbl.c.following_id).where(
+        follower_tbl.c.follower_id == user_id
+    )
+
+
+def build_version_query(user_id: int) -> Select:
+    """
+    Отпечаток ленты без сборки страницы: версия ленты пользователя
+    и старшие id разосланной и подмешиваемой частей ленты.
+
+    Новый твит меняет старший id, подписки и удаление твитов - версию.
+    Оба максимума читаются с края индексов, как первая строка страницы.
+    """
+    materialized = (
+        select(func.max(HomeTimeline.tweet_id))
+        .where(HomeTimeline.user_id == user_id)
+        .scalar_subquery()
+    )
+    merged = (
+        select(func.max(Tweet.id))
+        .where(
+            ~Tweet.fanned_out,
+            or_(
+                Tweet.author_id == user_id,
+                Tweet.author_id.in_(followed_authors(user_id)),
+            ),
+        )
+        .scalar_subquery()
+    )
+    return select(
+        User.feed_version,
+        materialized.label("materialized_max"),
+        merged.label("merged_max"),
+    ).where(User.id == user_id)
+
+
+def build_page_query(
+    user_id: int, limit: int, position: Optional[Tuple] = None
+) -> Select:
+    """Ключи (id) страницы ленты в порядке убывания"""
+    # Ранг твита в ленте - его неизменный id: лайки не переписывают строки
+    # лент, а курсор не смещается. Разосланные твиты читаются одним
+    # диапазоном по первичному ключу home_timeline (user_id, tweet_id)
+    materialized = select(HomeTimeline.tweet_id.label("id")).where(
+        HomeTimeline.user_id == user_id
+    )
+    if position is not None:
+        materialized = materialized.where(HomeTimeline.tweet_id < position[0])
+    materialized = materialized.order_by(HomeTimeline.tweet_id.desc()).limit(limit)
+
+    # Твиты популярных авторов не раскладываются по лентам при записи
+    # и подмешиваются при чтении по частичному индексу tweets (NOT fanned_out)
+    merged = select(Tweet.id).where(
+        ~Tweet.fanned_out,
+        or_(Tweet.author_id == user_id, Tweet.author_id.in_(followed_authors(user_id))),
+    )
+    if position is not None:
+        merged = merged.where(Tweet.id < position[0])
+    merged = merged.order_by(Tweet.id.desc()).limit(limit)
+
+    candidates = union_all(materialized, merged).subquery("candidates")
+    return select(candidates.c.id).order_by(candidates.c.id.desc()).limit(limit)
+
+
+def build_tweets_query(page: Subquery) -> Select:
+    """
+    Твиты страницы page: одна строка на твит с агрегатами вложений
+    и лайков, по убыванию столбцов page (ключ сортировки, последний - id)
+    """
+    # Вложения и лайки сворачиваются в массивы внутри Postgres, поэтому
+    # твит с N вложениями и M лайками возвращается одной строкой, а не N*M
+    attachments = (
+        select(
+            func.json_agg(
+                aggregate_order_by(
+                    func.json_build_object(
+                        "link",
+                        Media.link,
+                        "width",
+                        Media.width,
+                        "height",
+                        Media.height,
+                        "variants",
+                        Media.variants,
+                    ),
+                    Media.id,
+                ),
+                type_=JSON,
+            )
+        )
+        .where(Media.tweet_id == page.c.id)
+        .scalar_subquery()
+    )
+    liker = aliased(User, name="liker")
+    likes = (
+        select(
+            func.json_agg(
+                aggregate_order_by(
+                    func.json_build_object("user_id", Like.user_id, "name", liker.name),
+                    Like.id,
+                ),
+                type_=JSON,
+            )
+        )
+        .join(liker, Like.users_lk.of_type(liker))
+        .where(Like.tweet_id == page.c.id)
+        .scalar_subquery()
+    )
+    author = aliased(User, name="author")
+
+    return (
+        select(
+            *page.c,
+            Tweet.content,
+            author.id.label("author_id"),
+            author.name.label("author_name"),
+            attachments.label("attachments"),
+            likes.label("likes"),
+        )
+        .join(Tweet, Tweet.id == page.c.id)
+        .join(author, Tweet.author_id == author.id)
+        .order_by(*[column.desc() for column in page.c])
+    )
+
+
+def build_feed_query(
+    user_id: int, limit: int, position: Optional[Tuple] = None
+) -> Select:
+    """Запрос страницы ленты: одна строка на твит с агрегатами вложений и лайков"""
+    page = build_page_query(user_id=user_id, limit=limit, position=position)
+    return build_tweets_query(page.subquery("page"))
+
+
+def tweet_from_row(row: Row) -> Dict:
+    """Твит в формате ответа из строки build_tweets_query"""
+    return {
+        "id": row.id,
+        "content": row.content,
+        "attachments": [media["link"] for media in row.attachments or []],
+        "attachment_variants": row.attachments or [],
+        "author": {"id": row.author_id, "name": row.author_name},
+        "likes": row.likes or [],
+    }
+
+
+async def fetch_feed_version(session: AsyncSession, user_id: int) -> str:
+    """Отпечаток ленты пользователя из БД для ETag"""
+    row = (await session.execute(build_version_query(user_id))).one()
+    return ":".join(str(value) for value in row)
+
+
+async def fetch_feed(
+    session: AsyncSession,
+    user_id: int,
+    limit: int,
+    cursor: Optional[str] = None,
+) -> Dict:
+    """Получение страницы ленты и курсора следующей страницы"""
+    position = decode_cursor(cursor, int)
+    result = await session.execute(
+        build_feed_query(user_id=user_id, limit=limit + 1, position=position)
+    )
+    rows = result.all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].id)
+
+    tweets = [tweet_from_row(row) for row in rows]
+    return {"tweets": tweets, "next_cursor": next_cursor}
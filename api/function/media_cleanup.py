@@ -0,0 +1,147 @@
+import asyncio
+import os
+from typing import Awaitable, Callable, Iterable, List, Optional, Set
+
+from sqlalchemy import CompoundSelect, Text, bindparam, event, func, select, union
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from api.config.config import MEDIA_FOLDER, logger, settings
+from api.config.models import Media, MediaBlob
+from api.database.database import async_session_maker
+from api.function.media_variants import original_link, with_variants
+
+PENDING_UNLINKS = "pending_unlinks"
+
+
+async def lock_links(session: AsyncSession, links: Iterable[str]) -> None:
+    """
+    Блокировка имён файлов до конца транзакции сессии.
+
+    Её берут регистрация загруженного файла перед тем, как положить файл
+    на место, и отложенное удаление перед проверкой ссылок. Поэтому
+    удаление не уберёт файл, на который только что снова сослались.
+    Имена блокируются по порядку, чтобы два удаления не ждали друг друга.
+    """
+    names = sorted(set(links))
+    if not names:
+        return
+    ordered = (
+        select(func.unnest(bindparam("links", names, ARRAY(Text))).label("link"))
+        .order_by("link")
+        .subquery("ordered")
+    )
+    await session.execute(
+        select(func.pg_advisory_xact_lock(func.hashtext(ordered.c.link)))
+    )
+
+
+def referenced_links(links: List[str]) -> CompoundSelect:
+    """Имена файлов, на которые ссылаются записи medias или media_blobs"""
+    return union(
+        select(Media.link).where(Media.link.in_(links)),
+        select(MediaBlob.link).where(MediaBlob.link.in_(links)),
+    )
+
+
+async def find_referenced_links(links: List[str]) -> Set[str]:
+    """Имена файлов, на которые снова ссылаются записи medias или media_blobs"""
+    async with async_session_maker() as session:
+        result = await session.execute(referenced_links(links))
+        return set(result.scalars().all())
+
+
+def unlink_batch(folder: str, links: List[str]) -> int:
+    """Удаление пакета файлов вместе с производными, выполняется в пуле потоков"""
+    removed = 0
+    for name in (name for link in links for name in with_variants(link)):
+        try:
+            os.remove(os.path.join(folder, name))
+            removed += 1
+        except FileNotFoundError:
+            continue
+        except OSError as e:
+            logger.error("Не удалось удалить файл %s: %s", name, e)
+    return removed
+
+
+async def unlink_unreferenced(folder: str, links: List[str]) -> int:
+    """
+    Удаление файлов, на которые не ссылается ни одна запись.
+
+    Проверка ссылок и удаление выполняются под блокировкой имён: загрузка
+    того же содержимого ждёт окончания удаления и кладёт файл заново.
+    Производные файлы проверяются по имени оригинала.
+    """
+    originals = {link: original_link(link) for link in links}
+    async with async_session_maker() as session, session.begin():
+        await lock_links(session, originals.values())
+        result = await session.execute(referenced_links(list(set(originals.values()))))
+        referenced = set(result.scalars().all())
+        unused = [link for link in links if originals[link] not in referenced]
+        return await run_in_threadpool(unlink_batch, folder, unused)
+
+
+class DeferredUnlinker:
+    """Удаление файлов пакетами вне цикла событий"""
+
+    def __init__(
+        self,
+        folder: str,
+        batch_size: int,
+        remove: Callable[[str, List[str]], Awaitable[int]],
+    ) -> None:
+        self.folder = folder
+        self.batch_size = batch_size
+        self.remove = remove
+        self._pending: List[str] = []
+        self._task: Optional[asyncio.Task] = None
+
+    def submit(self, links: Iterable[str]) -> None:
+        self._pending.extend(links)
+        if self._pending and (self._task is None or self._task.done()):
+            self._task = asyncio.get_running_loop().create_task(self._drain())
+
+    async def wait(self) -> None:
+        """Ожидание удаления всех поставленных в очередь файлов"""
+        while self._task is not None and not self._task.done():
+            await self._task
+
+    async def _drain(self) -> None:
+        while self._pending:
+            batch = self._pending[: self.batch_size]
+            del self._pending[: self.batch_size]
+            try:
+                # Файл с тем же содержимым мог быть загружен заново
+                # после фиксации удаления
+                removed = await self.remove(self.folder, batch)
+                logger.info("Удалено файлов медиа: %s", removed)
+            except Exception as e:
+                logger.error("Ошибка отложенного удаления файлов: %s", e)
+
+
+unlinker = DeferredUnlinker(
+    folder=MEDIA_FOLDER,
+    batch_size=settings.MEDIA_UNLINK_BATCH_SIZE,
+    remove=unlink_unreferenced,
+)
+
+
+def schedule_unlink(session: AsyncSession, links: Iterable[str]) -> None:
+    """Удаление файлов после успешной фиксации транзакции сессии"""
+    session.info.setdefault(PENDING_UNLINKS, []).extend(links)
+
+
+@event.listens_for(Session, "after_commit")
+def _unlink_after_commit(session: Session) -> None:
+    links = session.info.pop(PENDING_UNLINKS, None)
+    if links:
+        unlinker.submit(links)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _forget_after_rollback(session: Session, previous_transaction) -> None:
+    # При откате записи остаются, а значит и файлы нужны
+    session.info.pop(PENDING_UNLINKS, None)
@@ -1,18 +1,73 @@
-from typing import Dict
+import os
+from collections import Counter
+from typing import Dict, Iterable, List
 
 from fastapi import HTTPException, status
+from sqlalchemy import case, delete, update
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from api.config.config import logger
-from api.config.models import Media
+from api.config.config import MEDIA_FOLDER, logger, settings
+from api.config.models import Media, MediaBlob
+from api.function.media_cleanup import lock_links
+from api.function.media_storage import StoredFile, discard_tmp
 
 
-async def post_media(file: str, session: AsyncSession) -> Dict:
+async def acquire_blob(session: AsyncSession, stored: StoredFile) -> str:
+    """
+    Регистрация ссылки на файл по его SHA-256, возвращает имя файла.
+
+    Временный файл кладётся на место под блокировкой имени всегда, даже
+    если файл уже есть: он мог ожидать отложенного удаления.
+    """
+    await lock_links(session, [stored.name])
+    result = await session.execute(
+        insert(MediaBlob)
+        .values(sha256=stored.sha256, link=stored.name, size=stored.size)
+        .on_conflict_do_update(
+            index_elements=[MediaBlob.sha256],
+            set_={"ref_count": MediaBlob.ref_count + 1},
+        )
+        .returning(MediaBlob.link)
+    )
+    link = result.scalar_one()
+    # То же содержимое под другим расширением: файл уже на месте
+    if link == stored.name and stored.tmp_path is not None:
+        os.replace(stored.tmp_path, os.path.join(MEDIA_FOLDER, link))
+    return link
+
+
+async def release_blobs(session: AsyncSession, hashes: Iterable[str]) -> List[str]:
+    """Снятие ссылок на файлы, возвращает имена файлов без ссылок"""
+    counts = Counter(hashes)
+    if not counts:
+        return []
+    released = case(counts, value=MediaBlob.sha256, else_=0)
+    await session.execute(
+        update(MediaBlob)
+        .where(MediaBlob.sha256.in_(counts))
+        .values(ref_count=MediaBlob.ref_count - released)
+        .execution_options(synchronize_session=False)
+    )
+    result = await session.execute(
+        delete(MediaBlob)
+        .where(MediaBlob.sha256.in_(counts), MediaBlob.ref_count <= 0)
+        .returning(MediaBlob.link)
+        .execution_options(synchronize_session=False)
+    )
+    return list(result.scalars().all())
+
+
+async def post_media(stored: StoredFile, session: AsyncSession) -> Dict:
     """Сохранение медиафайла"""
     try:
         # Создаем запись в базе данных
         logger.info("Начата попытка записи данных о загруженном файле в БД")
-        media = Media(link=file)
+        if settings.MEDIA_CONTENT_ADDRESSED:
+            link = await acquire_blob(session=session, stored=stored)
+            media = Media(link=link, sha256=stored.sha256)
+        else:
+            media = Media(link=stored.name)
         session.add(media)
         await session.flush()
 
@@ -24,3 +79,5 @@ async def post_media(file: str, session: AsyncSession) -> Dict:
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Ошибка при сохранении файла: {str(e)}",
         )
+    finally:
+        discard_tmp(stored)
@@ -0,0 +1,120 @@
+import hashlib
+import mimetypes
+import os
+import uuid
+from dataclasses import dataclass
+from typing import BinaryIO, Optional, Tuple
+
+from fastapi import HTTPException, UploadFile, status
+from starlette.concurrency import run_in_threadpool
+
+from api.config.config import MEDIA_FOLDER, logger, settings
+
+CHUNK_SIZE = 1024 * 1024
+
+
+@dataclass(frozen=True)
+class StoredFile:
+    name: str
+    size: int
+    sha256: str
+    # Временный файл, который acquire_blob кладёт на место name под
+    # блокировкой имени; None - файл уже на месте
+    tmp_path: Optional[str] = None
+
+
+def discard_tmp(stored: StoredFile) -> None:
+    """Удаление временного файла, если он не был положен на место"""
+    if stored.tmp_path is not None and os.path.exists(stored.tmp_path):
+        os.remove(stored.tmp_path)
+
+
+class FileTooLarge(Exception):
+    pass
+
+
+def validate_upload(file: UploadFile) -> None:
+    """Проверка типа и размера файла до копирования"""
+    if file.content_type not in settings.MEDIA_ALLOWED_TYPES:
+        logger.error("Недопустимый тип файла: %s", file.content_type)
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="Недопустимый тип файла",
+        )
+    if file.size is not None and file.size > settings.MEDIA_MAX_SIZE:
+        logger.error("Размер файла превышает допустимый")
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail="Размер файла превышает допустимый",
+        )
+
+
+def file_extension(file: UploadFile) -> str:
+    """Расширение файла по имени, а при его отсутствии - по MIME-типу"""
+    suffix = os.path.splitext(os.path.basename(file.filename or ""))[1].lstrip(".")
+    if suffix.isalnum():
+        return suffix.lower()
+    guessed = mimetypes.guess_extension(file.content_type or "") or ".bin"
+    return guessed.lstrip(".")
+
+
+def copy_stream(src: BinaryIO, dst_path: str, max_size: int) -> Tuple[int, str]:
+    """
+    Копирование файла блоками с подсчётом SHA-256 за один проход, без
+    буферизации целиком
+    """
+    digest = hashlib.sha256()
+    size = 0
+    src.seek(0)
+    with open(dst_path, "wb") as dst:
+        while chunk := src.read(CHUNK_SIZE):
+            size += len(chunk)
+            if size > max_size:
+                raise FileTooLarge(size)
+            digest.update(chunk)
+            dst.write(chunk)
+    return size, digest.hexdigest()
+
+
+async def save_upload(file: UploadFile) -> StoredFile:
+    """
+    Потоковое сохранение загруженного файла в MEDIA_FOLDER.
+
+    Файл с именем по хэшу остаётся во временном файле: на место его кладёт
+    acquire_blob под блокировкой имени, иначе отложенное удаление старой
+    копии могло бы убрать файл, на который уже сослалась новая запись.
+    """
+    validate_upload(file)
+    extension = file_extension(file)
+    tmp_path = os.path.join(MEDIA_FOLDER, f".{uuid.uuid4()}.part")
+    keep_tmp = False
+    try:
+        size, sha256 = await run_in_threadpool(
+            copy_stream, file.file, tmp_path, settings.MEDIA_MAX_SIZE
+        )
+        if settings.MEDIA_CONTENT_ADDRESSED:
+            # Одинаковое содержимое хранится в одном файле с именем по хэшу
+            stored = StoredFile(
+                name=f"{sha256}.{extension}",
+                size=size,
+                sha256=sha256,
+                tmp_path=tmp_path,
+            )
+            keep_tmp = True
+        else:
+            stored = StoredFile(
+                name=f"{uuid.uuid4()}.{extension}", size=size, sha256=sha256
+            )
+            os.replace(tmp_path, os.path.join(MEDIA_FOLDER, stored.name))
+    except FileTooLarge:
+        logger.error("Размер файла превышает допустимый")
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail="Размер файла превышает допустимый",
+        )
+    finally:
+        if not keep_tmp and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        await file.close()
+    logger.info("Файл %s сохранён, размер: %s, sha256: %s", stored.name, size, sha256)
+    return stored
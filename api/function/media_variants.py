@@ -0,0 +1,111 @@
+import asyncio
+import importlib.util
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+from sqlalchemy import select, update
+
+from api.config.config import MEDIA_FOLDER, logger, settings
+from api.config.models import Media
+from api.database.database import async_session_maker
+
+IMAGE_EXTENSIONS = {"jpg", "jpeg", "png", "gif", "webp"}
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def variant_link(link: str, variant: str) -> str:
+    """Имя файла производного изображения рядом с оригиналом"""
+    stem, extension = os.path.splitext(link)
+    return f"{stem}_{variant}{extension}"
+
+
+def with_variants(link: str) -> List[str]:
+    """Имя оригинала и всех возможных производных файлов"""
+    return [link] + [variant_link(link, variant) for variant in settings.MEDIA_VARIANTS]
+
+
+def original_link(name: str) -> str:
+    """Имя оригинала для производного файла или само имя"""
+    stem, extension = os.path.splitext(name)
+    for variant in settings.MEDIA_VARIANTS:
+        suffix = f"_{variant}"
+        if stem.endswith(suffix):
+            return stem[: -len(suffix)] + extension
+    return name
+
+
+def render_variants(folder: str, link: str, variants: Dict[str, int]) -> Dict:
+    """Создание уменьшенных копий изображения, выполняется в отдельном процессе"""
+    from PIL import Image
+
+    with Image.open(os.path.join(folder, link)) as image:
+        width, height = image.size
+        result: Dict = {"width": width, "height": height, "variants": {}}
+        for variant, max_side in variants.items():
+            if max(width, height) <= max_side:
+                # Оригинал не больше варианта, отдельный файл не нужен
+                result["variants"][variant] = {
+                    "link": link,
+                    "width": width,
+                    "height": height,
+                }
+                continue
+            name = variant_link(link, variant)
+            path = os.path.join(folder, name)
+            copy = image.copy()
+            copy.thumbnail((max_side, max_side))
+            if not os.path.exists(path):
+                # Одинаковое содержимое даёт одинаковые имена, файл уже создан
+                tmp_path = os.path.join(folder, f".{name}.part")
+                copy.save(tmp_path, format=image.format)
+                os.replace(tmp_path, path)
+            result["variants"][variant] = {
+                "link": name,
+                "width": copy.width,
+                "height": copy.height,
+            }
+    return result
+
+
+def get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=settings.MEDIA_PROCESS_WORKERS)
+    return _pool
+
+
+def shutdown_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+async def process_media(media_id: int) -> None:
+    """Фоновая обработка загруженного изображения после ответа клиенту"""
+    if not settings.MEDIA_VARIANTS or importlib.util.find_spec("PIL") is None:
+        return
+    async with async_session_maker() as session:
+        link = await session.scalar(select(Media.link).where(Media.id == media_id))
+    if link is None or link.rsplit(".", 1)[-1].lower() not in IMAGE_EXTENSIONS:
+        return
+
+    loop = asyncio.get_running_loop()
+    try:
+        info = await loop.run_in_executor(
+            get_pool(), render_variants, MEDIA_FOLDER, link, settings.MEDIA_VARIANTS
+        )
+    except Exception as e:
+        logger.error("Ошибка обработки изображения %s: %s", link, e)
+        return
+
+    async with async_session_maker() as session:
+        await session.execute(
+            update(Media)
+            .where(Media.link == link, Media.variants.is_(None))
+            .values(**info)
+        )
+        await session.commit()
+    logger.info("Созданы уменьшенные копии изображения %s", link)
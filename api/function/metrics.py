@@ -0,0 +1,292 @@
+import time
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional, Tuple, TypeVar
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import QueuePool
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+LabelValues = Tuple[str, ...]
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+def _format_labels(names: Tuple[str, ...], values: LabelValues) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(
+        '{}="{}"'.format(name, value.replace("\\", "\\\\").replace('"', '\\"'))
+        for name, value in zip(names, values)
+    )
+    return "{" + pairs + "}"
+
+
+class Metric:
+    """
+    Базовая метрика в памяти процесса.
+
+    Все обновления выполняются в потоке цикла событий, поэтому обходятся
+    без блокировок; значения живут в пределах одного воркера.
+    """
+
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type_name}",
+        ]
+        lines += self.samples()
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    type_name = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.values: Dict[LabelValues, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.labels, key)} {value}"
+            for key, value in sorted(self.values.items())
+        ]
+
+
+class Gauge(Metric):
+    """Значение считывается функцией в момент выгрузки метрик"""
+
+    type_name = "gauge"
+
+    def __init__(self, *args, collect: Callable[[], float], **kwargs):
+        super().__init__(*args, **kwargs)
+        self.collect = collect
+
+    def samples(self) -> List[str]:
+        return [f"{self.name} {self.collect()}"]
+
+
+class UpDownGauge(Counter):
+    type_name = "gauge"
+
+    def dec(self, *labels: str) -> None:
+        self.inc(*labels, amount=-1)
+
+
+class Histogram(Metric):
+    type_name = "histogram"
+
+    def __init__(self, *args, buckets: Tuple[float, ...] = LATENCY_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = buckets
+        # По ключу меток: счётчики корзин, сумма и количество наблюдений
+        self.values: Dict[LabelValues, List] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        data = self.values.get(labels)
+        if data is None:
+            data = self.values[labels] = [[0] * len(self.buckets), 0.0, 0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                data[0][i] += 1
+                break
+        data[1] += value
+        data[2] += 1
+
+    def samples(self) -> List[str]:
+        lines = []
+        names = self.labels + ("le",)
+        for key, (counts, total, count) in sorted(self.values.items()):
+            cumulative = 0
+            for bound, bucket in zip(self.buckets, counts):
+                cumulative += bucket
+                lines.append(
+                    f"{self.name}_bucket"
+                    f"{_format_labels(names, key + (str(bound),))} {cumulative}"
+                )
+            lines.append(
+                f"{self.name}_bucket{_format_labels(names, key + ('+Inf',))} {count}"
+            )
+            label_str = _format_labels(self.labels, key)
+            lines.append(f"{self.name}_sum{label_str} {total}")
+            lines.append(f"{self.name}_count{label_str} {count}")
+        return lines
+
+
+MetricT = TypeVar("MetricT", bound=Metric)
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: MetricT) -> MetricT:
+        self.metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self.metrics.values()) + "\n"
+
+
+registry = Registry()
+
+REQUEST_LATENCY = registry.register(
+    Histogram(
+        "http_request_duration_seconds",
+        "Время обработки запроса",
+        labels=("method", "route"),
+    )
+)
+REQUEST_COUNT = registry.register(
+    Counter(
+        "http_requests_total",
+        "Количество запросов по коду ответа",
+        labels=("method", "route", "status"),
+    )
+)
+IN_FLIGHT = registry.register(
+    UpDownGauge("http_requests_in_flight", "Запросы в обработке")
+)
+REQUEST_DB_QUERIES = registry.register(
+    Histogram(
+        "http_request_db_queries",
+        "Количество запросов к БД на один HTTP-запрос",
+        labels=("method", "route"),
+        buckets=QUERY_COUNT_BUCKETS,
+    )
+)
+REQUEST_DB_TIME = registry.register(
+    Histogram(
+        "http_request_db_duration_seconds",
+        "Суммарное время запросов к БД на один HTTP-запрос",
+        labels=("method", "route"),
+    )
+)
+DB_QUERY_LATENCY = registry.register(
+    Histogram("db_query_duration_seconds", "Время выполнения одного запроса к БД")
+)
+
+
+class RequestDBStats:
+    __slots__ = ("queries", "duration")
+
+    def __init__(self):
+        self.queries = 0
+        self.duration = 0.0
+
+
+# Статистика текущего HTTP-запроса; вне запроса (фоновые задачи) - None
+request_db_stats: ContextVar[Optional[RequestDBStats]] = ContextVar(
+    "request_db_stats", default=None
+)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("query_start")
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    DB_QUERY_LATENCY.observe(elapsed)
+    stats = request_db_stats.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.duration += elapsed
+
+
+def _handle_error(context) -> None:
+    # Упавший запрос не доходит до after_cursor_execute
+    starts = context.connection.info.get("query_start") if context.connection else None
+    if starts:
+        starts.pop()
+
+
+def instrument_engine(engine: Engine) -> None:
+    """Подключение счётчиков запросов к синхронному движку"""
+    if event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        return
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+
+def register_pool_gauges(pool: QueuePool) -> None:
+    """Метрики пула соединений, значения снимаются при выгрузке"""
+    registry.register(
+        Gauge(
+            "db_pool_checked_out",
+            "Соединения пула, выданные приложению",
+            collect=pool.checkedout,
+        )
+    )
+    registry.register(
+        Gauge(
+            "db_pool_overflow",
+            "Соединения сверх pool_size",
+            collect=lambda: max(pool.overflow(), 0),
+        )
+    )
+    registry.register(
+        Gauge("db_pool_size", "Размер пула соединений", collect=pool.size)
+    )
+
+
+class MetricsMiddleware:
+    """
+    ASGI-мидлварь: задержка, коды ответов, запросы в обработке и нагрузка
+    на БД по шаблону маршрута.
+
+    Метка route берётся из шаблона пути FastAPI, а не из фактического URL,
+    чтобы число рядов не росло с числом id.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status_code = 500
+        stats = RequestDBStats()
+        token = request_db_stats.set(stats)
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        IN_FLIGHT.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            IN_FLIGHT.dec()
+            request_db_stats.reset(token)
+            route = scope.get("route")
+            path = getattr(route, "path", "unmatched")
+            REQUEST_LATENCY.observe(elapsed, method, path)
+            REQUEST_COUNT.inc(method, path, str(status_code))
+            REQUEST_DB_QUERIES.observe(stats.queries, method, path)
+            REQUEST_DB_TIME.observe(stats.duration, method, path)
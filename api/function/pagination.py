@@ -0,0 +1,31 @@
+import base64
+import binascii
+from typing import Optional, Tuple
+
+from fastapi import HTTPException, status
+
+from api.config.config import logger
+
+
+def encode_cursor(*values: float) -> str:
+    """Кодирование ключа последней записи страницы в курсор"""
+    raw = ":".join(str(value) for value in values).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str], *types: type) -> Optional[Tuple]:
+    """Разбор курсора в кортеж значений указанных типов"""
+    if cursor is None:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        parts = base64.urlsafe_b64decode(padded.encode()).decode().split(":")
+        if len(parts) != len(types):
+            raise ValueError(cursor)
+        return tuple(cast(part) for cast, part in zip(types, parts))
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        logger.error("Некорректный курсор пагинации")
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Некорректный курсор пагинации",
+        )
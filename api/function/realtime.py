@@ -0,0 +1,222 @@
+"""
+Рассылка событий о новых твитах и лайках клиентам по SSE.
+
+Записи публикуют события через pg_notify в своей транзакции, поэтому
+событие уходит только после фиксации. Каждый воркер держит одно
+соединение LISTEN и раскладывает события подписчикам по словарю
+автор -> подписчики: клиент получает события авторов, на которых он
+подписан, и свои собственные.
+
+У каждого подписчика ограниченная очередь. Медленный клиент, чья очередь
+переполнилась, получает событие reset и отключается: он перечитывает
+ленту и подключается заново, не задерживая рассылку остальным.
+"""
+
+import asyncio
+import json
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Set
+
+import asyncpg
+from fastapi import Depends, HTTPException, status
+from sqlalchemy import Text, bindparam, func, select
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from api.config.config import logger, settings
+from api.config.schemas import AuthUser
+from api.database.database import get_async_session
+from api.function.user_func import get_user_by_token
+
+CHANNEL = "tweet_events"
+# Последнее событие для переполненного или отключённого подписчика
+RESET = {"type": "reset"}
+
+
+def tweet_event(tweet_id: int, author_id: int) -> Dict:
+    return {"type": "tweet", "tweet_id": tweet_id, "author_id": author_id}
+
+
+def like_event(tweet_id: int, author_id: int, user_id: int, delta: int) -> Dict:
+    return {
+        "type": "like",
+        "tweet_id": tweet_id,
+        "author_id": author_id,
+        "user_id": user_id,
+        "delta": delta,
+    }
+
+
+async def publish_events(session: AsyncSession, events: List[Dict]) -> None:
+    """NOTIFY одним запросом, доставляется после фиксации транзакции"""
+    if not events:
+        return
+    payloads = func.unnest(
+        bindparam("events", [json.dumps(event) for event in events], ARRAY(Text))
+    ).table_valued("payload")
+    await session.execute(select(func.pg_notify(CHANNEL, payloads.c.payload)))
+
+
+class Subscriber:
+    def __init__(self, user_id: int, authors: Iterable[int], queue_size: int):
+        self.user_id = user_id
+        self.authors = frozenset(authors)
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.closed = False
+
+    def push(self, event: Dict) -> None:
+        """Событие в очередь без ожидания; переполнение закрывает подписку"""
+        if self.closed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.reset()
+
+    def reset(self) -> None:
+        if self.closed:
+            return
+        self.closed = True
+        # Место под RESET освобождается за счёт недоставленных событий
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(RESET)
+
+
+class EventHub:
+    """Одно соединение LISTEN на воркер и подписчики по авторам"""
+
+    def __init__(self, dsn: str, queue_size: int, max_subscribers: int):
+        self.dsn = dsn
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self.subscribers: Set[Subscriber] = set()
+        self.by_author: Dict[int, Set[Subscriber]] = {}
+        self._connection: Optional[asyncpg.Connection] = None
+        self._connecting: Optional[asyncio.Task] = None
+
+    @property
+    def full(self) -> bool:
+        return len(self.subscribers) >= self.max_subscribers
+
+    async def subscribe(self, user_id: int, authors: Iterable[int]) -> Subscriber:
+        await self.ensure_listening()
+        subscriber = Subscriber(user_id, {user_id, *authors}, self.queue_size)
+        self.subscribers.add(subscriber)
+        for author_id in subscriber.authors:
+            self.by_author.setdefault(author_id, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        self.subscribers.discard(subscriber)
+        for author_id in subscriber.authors:
+            followers = self.by_author.get(author_id)
+            if followers is not None:
+                followers.discard(subscriber)
+                if not followers:
+                    del self.by_author[author_id]
+
+    def dispatch(self, event: Dict) -> int:
+        """Событие подписчикам автора; возвращает число получателей"""
+        followers = self.by_author.get(event.get("author_id"), ())
+        for subscriber in list(followers):
+            subscriber.push(event)
+        return len(followers)
+
+    def _on_notify(self, connection, pid, channel, payload: str) -> None:
+        try:
+            event = json.loads(payload)
+        except ValueError:
+            logger.warning("Некорректное событие в канале %s: %s", channel, payload)
+            return
+        self.dispatch(event)
+
+    async def ensure_listening(self) -> None:
+        """Соединение LISTEN открывается при первом подписчике"""
+        if self._connection is not None and not self._connection.is_closed():
+            return
+        if self._connecting is None or self._connecting.done():
+            self._connecting = asyncio.get_running_loop().create_task(self._listen())
+        await asyncio.shield(self._connecting)
+
+    async def _listen(self) -> None:
+        connection = await asyncpg.connect(self.dsn)
+        await connection.add_listener(CHANNEL, self._on_notify)
+        connection.add_termination_listener(self._on_terminated)
+        self._connection = connection
+        logger.info("Слушаю канал %s", CHANNEL)
+
+    def _on_terminated(self, connection) -> None:
+        # События за время переподключения потеряны: клиенты перечитывают
+        # ленту по reset и подключаются заново
+        logger.warning("Соединение LISTEN закрыто, подписчики получат reset")
+        self._connection = None
+        for subscriber in list(self.subscribers):
+            subscriber.reset()
+
+    async def close(self) -> None:
+        for subscriber in list(self.subscribers):
+            subscriber.reset()
+        connection, self._connection = self._connection, None
+        if connection is not None and not connection.is_closed():
+            await connection.close()
+
+
+def format_event(event: Dict) -> str:
+    """Событие в формате text/event-stream"""
+    return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+
+async def event_stream(subscriber: Subscriber, heartbeat: float) -> AsyncIterator[str]:
+    """
+    Поток событий подписчика; при простое - комментарий-пинг, чтобы прокси
+    не закрывали соединение. reset завершает поток.
+    """
+    try:
+        yield ": connected\n\n"
+        while True:
+            try:
+                # asyncio.timeout не создаёт задачу на каждое ожидание
+                async with asyncio.timeout(heartbeat):
+                    event = await subscriber.queue.get()
+            except TimeoutError:
+                yield ": ping\n\n"
+                continue
+            yield format_event(event)
+            if event is RESET:
+                return
+    finally:
+        hub.unsubscribe(subscriber)
+
+
+hub = EventHub(
+    settings.get_db_url().replace("postgresql+asyncpg://", "postgresql://", 1),
+    queue_size=settings.STREAM_QUEUE_SIZE,
+    max_subscribers=settings.STREAM_MAX_CONNECTIONS,
+)
+
+
+async def open_stream(
+    user: AuthUser = Depends(get_user_by_token),
+    session: AsyncSession = Depends(get_async_session),
+) -> Subscriber:
+    """Подписка на события авторов из подписок пользователя"""
+    # Соединение с БД не должно оставаться занятым на время потока
+    await session.commit()
+    if hub.full:
+        logger.warning("Превышено число потоков событий: %s", hub.max_subscribers)
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Превышено число потоков событий, повторите запрос позже",
+            headers={"Retry-After": "5"},
+        )
+    try:
+        subscriber = await hub.subscribe(user.id, user.following_ids)
+    except (OSError, asyncpg.PostgresError) as e:
+        logger.error("Не удалось подписаться на канал %s: %s", CHANNEL, e)
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Поток событий недоступен, повторите запрос позже",
+            headers={"Retry-After": "5"},
+        )
+    logger.info("Пользователь с id: %s подключился к потоку событий", user.id)
+    return subscriber
@@ -0,0 +1,101 @@
+"""
+Полнотекстовый поиск по твитам.
+
+Совпадения ищутся по индексу GIN на tweets.search_vector, поэтому время
+запроса зависит от числа совпадений, а не от размера таблицы. Твиты
+упорядочены по ts_rank; страницы продолжаются курсором по (ранг, id).
+Подсветка (ts_headline) считается только для твитов страницы.
+"""
+
+import html
+from typing import Dict, Optional, Tuple
+
+from fastapi import Depends, Query
+from sqlalchemy import Select, func, literal_column, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from api.config.config import logger, settings
+from api.config.models import SEARCH_CONFIG, Tweet
+from api.config.schemas import AuthUser
+from api.database.database import get_read_session
+from api.function.feed_query import build_tweets_query, tweet_from_row
+from api.function.pagination import decode_cursor, encode_cursor
+from api.function.user_func import get_user_by_token
+
+# Управляющие символы вместо тегов: текст твита экранируется уже после
+# ts_headline, а маркеры заменяются на <b> и </b>
+START_MARK, STOP_MARK = "\x02", "\x03"
+HEADLINE_OPTIONS = f"StartSel={START_MARK}, StopSel={STOP_MARK}, MaxFragments=2"
+
+
+def to_tsquery(text: str):
+    """Запрос в синтаксисе поисковиков: слова, "фраза", or, -исключение"""
+    return func.websearch_to_tsquery(
+        literal_column(f"'{SEARCH_CONFIG}'::regconfig"), text
+    )
+
+
+def build_search_query(
+    text: str, limit: int, position: Optional[Tuple] = None, highlight: bool = True
+) -> Select:
+    """Страница найденных твитов по убыванию (ранг, id)"""
+    query = to_tsquery(text).column_valued("query")
+    rank = func.ts_rank(Tweet.search_vector, query)
+    page = (
+        select(rank.label("score"), Tweet.id)
+        .select_from(Tweet)
+        .where(Tweet.search_vector.op("@@")(query))
+    )
+    if position is not None:
+        page = page.where(tuple_(rank, Tweet.id) < tuple_(*position))
+    page = page.order_by(rank.desc(), Tweet.id.desc()).limit(limit)
+
+    tweets = build_tweets_query(page.subquery("page"))
+    if highlight:
+        headline = func.ts_headline(
+            literal_column(f"'{SEARCH_CONFIG}'::regconfig"),
+            Tweet.content,
+            to_tsquery(text),
+            HEADLINE_OPTIONS,
+        )
+        tweets = tweets.add_columns(headline.label("headline"))
+    return tweets
+
+
+def render_headline(headline: str) -> str:
+    """Фрагмент ts_headline в HTML: экранированный текст и совпадения в <b>"""
+    return html.escape(headline).replace(START_MARK, "<b>").replace(STOP_MARK, "</b>")
+
+
+async def search_tweets(
+    q: str = Query(min_length=1, max_length=256),
+    limit: int = Query(
+        default=settings.FEED_PAGE_SIZE, ge=1, le=settings.FEED_MAX_PAGE_SIZE
+    ),
+    cursor: Optional[str] = Query(default=None),
+    highlight: bool = Query(default=True),
+    user: AuthUser = Depends(get_user_by_token),
+    session: AsyncSession = Depends(get_read_session),
+) -> Dict:
+    """Поиск твитов по тексту со страницами по курсору"""
+    logger.info("Пользователь с id: %s ищет твиты", user.id)
+    position = decode_cursor(cursor, float, int)
+    result = await session.execute(
+        build_search_query(
+            text=q, limit=limit + 1, position=position, highlight=highlight
+        )
+    )
+    rows = result.all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].score, rows[-1].id)
+
+    tweets = []
+    for row in rows:
+        tweet = tweet_from_row(row)
+        if highlight:
+            tweet["highlight"] = render_headline(row.headline)
+        tweets.append(tweet)
+    return {"tweets": tweets, "next_cursor": next_cursor}
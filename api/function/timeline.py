@@ -0,0 +1,107 @@
+from sqlalchemy import Select, delete, func, literal, select, update
+from sqlalchemy.dialects.postgresql import Insert, insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql.dml import Delete, Update
+from sqlalchemy.sql.selectable import CTE
+
+from api.config.config import logger, settings
+from api.config.models import HomeTimeline, Tweet, User, follower_tbl
+
+
+async def is_celebrity(session: AsyncSession, author_id: int) -> bool:
+    """Проверка, превышает ли число подписчиков автора порог рассылки"""
+    threshold = settings.TIMELINE_FANOUT_THRESHOLD
+    # Считаем не больше threshold + 1 строк, чтобы не сканировать
+    # всех подписчиков популярного автора
+    followers = (
+        select(follower_tbl.c.follower_id)
+        .where(follower_tbl.c.following_id == author_id)
+        .limit(threshold + 1)
+        .subquery()
+    )
+    count = await session.scalar(select(func.count()).select_from(followers))
+    return (count or 0) > threshold
+
+
+async def fan_out_tweet(session: AsyncSession, tweet_id: int, author_id: int) -> None:
+    """Рассылка нового твита в home_timeline подписчиков и самого автора"""
+    logger.info("Рассылаю твит с id:%s в ленты подписчиков", tweet_id)
+    recipients = select(follower_tbl.c.follower_id, literal(tweet_id)).where(
+        follower_tbl.c.following_id == author_id
+    )
+    recipients = recipients.union_all(select(literal(author_id), literal(tweet_id)))
+    await session.execute(
+        insert(HomeTimeline)
+        .from_select(["user_id", "tweet_id"], recipients)
+        .on_conflict_do_nothing()
+    )
+
+
+def backfill_timeline(follows: CTE) -> Insert:
+    """
+    Добавление последних твитов автора в ленту нового подписчика.
+
+    follows - CTE с колонками follower_id и following_id только что
+    созданных подписок, оператор выполняется внутри того же запроса.
+    """
+    # Номер твита среди твитов своего автора, чтобы при подписке сразу на
+    # нескольких авторов каждый добавил свои последние твиты
+    position = (
+        func.row_number()
+        .over(partition_by=follows.c.following_id, order_by=Tweet.id.desc())
+        .label("position")
+    )
+    ranked = (
+        select(follows.c.follower_id, Tweet.id, position)
+        .join(follows, Tweet.author_id == follows.c.following_id)
+        .where(Tweet.fanned_out)
+        .subquery("ranked")
+    )
+    recent = select(ranked.c.follower_id, ranked.c.id).where(
+        ranked.c.position <= settings.TIMELINE_BACKFILL_SIZE
+    )
+    return (
+        insert(HomeTimeline)
+        .from_select(["user_id", "tweet_id"], recent)
+        .on_conflict_do_nothing()
+    )
+
+
+def drop_author_from_timeline(follows: CTE) -> Delete:
+    """Удаление твитов автора из ленты отписавшегося пользователя"""
+    return delete(HomeTimeline).where(
+        HomeTimeline.user_id.in_(select(follows.c.follower_id)),
+        HomeTimeline.tweet_id.in_(
+            select(Tweet.id).where(Tweet.author_id.in_(select(follows.c.following_id)))
+        ),
+    )
+
+
+def bump_feed_version(readers: Select) -> Update:
+    """Новая версия лент пользователей из readers, профили не меняются"""
+    return (
+        update(User)
+        .where(User.id.in_(readers))
+        .values(feed_version=User.feed_version + 1, updated_at=User.updated_at)
+    )
+
+
+async def drop_tweet_from_timelines(
+    session: AsyncSession, tweet_id: int, author_id: int, fanned_out: bool
+) -> None:
+    """Удаление твита из всех лент и смена версии лент, где он был"""
+    if fanned_out:
+        dropped = (
+            delete(HomeTimeline)
+            .where(HomeTimeline.tweet_id == tweet_id)
+            .returning(HomeTimeline.user_id)
+            .cte("dropped")
+        )
+        readers = select(dropped.c.user_id)
+    else:
+        # Твит популярного автора подмешивался при чтении в ленты подписчиков
+        readers = select(follower_tbl.c.follower_id).where(
+            follower_tbl.c.following_id == author_id
+        )
+        readers = readers.union_all(select(literal(author_id)))
+    await session.execute(bump_feed_version(readers))
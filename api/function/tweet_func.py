@@ -1,108 +1,91 @@
-import os
-from typing import Dict, List
+from typing import Dict, Optional
 
-from fastapi import Depends, HTTPException, status
-from sqlalchemy import delete, func, select
+from fastapi import Depends, HTTPException, Query, Request, Response, status
+from sqlalchemy import Select, delete, literal, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import aliased, selectinload
+from sqlalchemy.sql.selectable import CTE
 
-from api.config.config import MEDIA_FOLDER, logger
-from api.config.models import Like, Media, Tweet, User
-from api.config.schemas import TweetPost, Tweets, UserSCH
-from api.database.database import get_async_session
+from api.config.config import logger, settings
+from api.config.models import Like, Media, Tweet
+from api.config.schemas import AuthUser, BatchIds, TweetPost
+from api.database.database import (
+    get_async_session,
+    get_read_session,
+    is_foreign_key_violation,
+)
+from api.function.batch import batch_result, check_batch
+from api.function.etag import check_not_modified, make_etag
+from api.function.feed_cache import feed_cache
+from api.function.feed_query import fetch_feed, fetch_feed_version
+from api.function.media_cleanup import schedule_unlink
+from api.function.media_func import release_blobs
+from api.function.realtime import like_event, publish_events, tweet_event
+from api.function.timeline import (
+    drop_tweet_from_timelines,
+    fan_out_tweet,
+    is_celebrity,
+)
 from api.function.user_func import get_user_by_token
 
 
 async def get_tweet_func(
-    user: UserSCH = Depends(get_user_by_token),
-    session: AsyncSession = Depends(get_async_session),
-) -> List[Tweets]:
-    """Получение твитов пользователя и его подписок"""
+    request: Request,
+    response: Response,
+    limit: int = Query(
+        default=settings.FEED_PAGE_SIZE, ge=1, le=settings.FEED_MAX_PAGE_SIZE
+    ),
+    cursor: Optional[str] = Query(default=None),
+    user: AuthUser = Depends(get_user_by_token),
+    session: AsyncSession = Depends(get_read_session),
+) -> Dict:
+    """Получение страницы твитов пользователя и его подписок"""
     logger.info(
-        f"Формирую запрос информации к БД о твитах пользователе с id: {user.id}"
+        "Формирую запрос информации к БД о твитах пользователе с id: %s", user.id
     )
-    if user.following is None:
-        following_ids = list()
-        following_ids.append(user.id)
-    else:
-        following_ids = [following.id for following in user.following]
-        following_ids.append(user.id)
-
-    author = aliased(User, name="author")
-    liker = aliased(User, name="liker")
-
-    stmt = (
-        select(
-            Tweet.id,
-            Tweet.content,
-            author.id.label("author_id"),
-            author.name.label("author_name"),
-            Media.link.label("media_link"),
-            Like.user_id.label("like_user_id"),
-            liker.name.label("like_user_name"),
-            func.count(Like.id).label("likes_count"),
-        )
-        .join(author, Tweet.author)
-        .outerjoin(Media)
-        .outerjoin(Like, Tweet.likes)
-        .outerjoin(liker, Like.users_lk)
-        .filter(Tweet.author_id.in_(following_ids))
-        .group_by(
-            Tweet.id,
-            author.id,
-            author.name,
-            Tweet.content,
-            Media.link,
-            Like.user_id,
-            liker.name,
+
+    async def load(refresh_session: Optional[AsyncSession]) -> Dict:
+        return await fetch_feed(
+            session=refresh_session or session,
+            user_id=user.id,
+            limit=limit,
+            cursor=cursor,
         )
-    )
 
-    result = await session.execute(stmt)
-
-    # Группируем результаты по твитам
-    tweets_dict = {}
-    for row in result.all():
-        if row.id not in tweets_dict:
-            tweets_dict[row.id] = {
-                "id": row.id,
-                "content": row.content,
-                "attachments": [],
-                "author": {"id": row.author_id, "name": row.author_name},
-                "likes": [],
-            }
-
-        # Добавляем attachment, если есть
-        if row.media_link:
-            attachment = row.media_link
-            if attachment not in tweets_dict[row.id]["attachments"]:
-                tweets_dict[row.id]["attachments"].append(attachment)
-
-        # Добавляем like, если есть
-        if row.like_user_id and not any(
-            like["user_id"] == row.like_user_id for like in tweets_dict[row.id]["likes"]
-        ):
-            tweets_dict[row.id]["likes"].append(
-                {"user_id": row.like_user_id, "name": row.like_user_name}
-            )
+    versions = await feed_cache.versions(user)
+    if versions is None:
+        # Кэш выключен или недоступен: отпечаток ленты читается из БД одним
+        # запросом по краям индексов, страница собирается только при
+        # несовпадении. Отпечаток читается раньше страницы, поэтому ETag
+        # никогда не новее её содержимого
+        version = await fetch_feed_version(session=session, user_id=user.id)
+        etag = make_etag("feed", user.id, limit, cursor, version)
+        check_not_modified(request, etag)
+        response.headers["ETag"] = etag
+        return await load(None)
 
-    sorted_dict = dict(
-        sorted(
-            tweets_dict.items(), key=lambda item: len(item[1]["likes"]), reverse=True
-        )
+    # Отпечаток версий кэша совпал - страница не собирается
+    check_not_modified(request, make_etag("feed", user.id, limit, cursor, versions[1]))
+    feed, served = await feed_cache.get_feed(
+        user=user, limit=limit, cursor=cursor, load=load, versions=versions
     )
-
-    return list(sorted_dict.values())
+    # Устаревшая страница из кэша получает ETag своей версии
+    response.headers["ETag"] = make_etag("feed", user.id, limit, cursor, served)
+    return feed
 
 
 async def post_tweet_func(
     tweet_post: TweetPost,
-    user: UserSCH = Depends(get_user_by_token),
+    user: AuthUser = Depends(get_user_by_token),
     session: AsyncSession = Depends(get_async_session),
 ) -> Dict:
     """Создание нового твита"""
-    logger.info(f"Вношу информацию в БД о создании твита пользователем с id: {user.id}")
-    tweet = Tweet(content=tweet_post.tweet_data, author_id=user.id)
+    logger.info(
+        "Вношу информацию в БД о создании твита пользователем с id: %s", user.id
+    )
+    fan_out = not await is_celebrity(session=session, author_id=user.id)
+    tweet = Tweet(content=tweet_post.tweet_data, author_id=user.id, fanned_out=fan_out)
     session.add(tweet)
     await session.flush()
 
@@ -122,25 +105,32 @@ async def post_tweet_func(
         for media in media_files:
             media.tweet_id = tweet.id
 
+    if fan_out:
+        await fan_out_tweet(session=session, tweet_id=tweet.id, author_id=user.id)
+
+    await publish_events(session, [tweet_event(tweet.id, user.id)])
+    # Версии ленты меняются после фиксации, чтобы кэш не заполнился
+    # лентой без нового твита
+    await session.commit()
+    await feed_cache.bump(users=[user.id], authors=[user.id])
     return {"result": "true", "tweet_id": tweet.id}
 
 
 async def delete_tweet(
     tweet_id: int,
-    current_user: UserSCH = Depends(get_user_by_token),
+    current_user: AuthUser = Depends(get_user_by_token),
     session: AsyncSession = Depends(get_async_session),
 ) -> Dict:
     """Зависимость для проверки владения твитом"""
     logger.info(
-        f"Начинаю попытку удаления твита с id:{tweet_id} пользователем с id: {current_user.id}"
+        "Начинаю попытку удаления твита с id:%s пользователем с id: %s",
+        tweet_id,
+        current_user.id,
     )
-    query = (
-        select(Tweet)
-        .where(Tweet.id == tweet_id, Tweet.author_id == current_user.id)
-        .options(selectinload(Tweet.attachments))
+    query = select(Tweet.id, Tweet.fanned_out).where(
+        Tweet.id == tweet_id, Tweet.author_id == current_user.id
     )
-    result = await session.execute(query)
-    tweet = result.scalar_one_or_none()
+    tweet = (await session.execute(query)).one_or_none()
 
     if not tweet:
         logger.error("У пользователя нет прав на выполнение этой операции")
@@ -149,61 +139,164 @@ async def delete_tweet(
             detail="У вас нет прав на выполнение этой операции",
         )
     else:
-        for file in tweet.attachments:
-            file_link = os.path.join(MEDIA_FOLDER, file.link)
-            os.remove(file_link)
-        await session.delete(tweet)
+        # Записи medias удаляются раньше media_blobs, на которые они ссылаются
+        result = await session.execute(
+            delete(Media)
+            .where(Media.tweet_id == tweet_id)
+            .returning(Media.link, Media.sha256)
+            .execution_options(synchronize_session=False)
+        )
+        attachments = result.all()
+        await session.execute(
+            delete(Like)
+            .where(Like.tweet_id == tweet_id)
+            .execution_options(synchronize_session=False)
+        )
+        await drop_tweet_from_timelines(
+            session=session,
+            tweet_id=tweet_id,
+            author_id=current_user.id,
+            fanned_out=tweet.fanned_out,
+        )
+        await session.execute(
+            delete(Tweet)
+            .where(Tweet.id == tweet_id)
+            .execution_options(synchronize_session=False)
+        )
+
+        unused = [file.link for file in attachments if file.sha256 is None]
+        unused += await release_blobs(
+            session=session,
+            hashes=[file.sha256 for file in attachments if file.sha256],
+        )
+        # Файлы удаляются только после фиксации транзакции и вне цикла событий
+        schedule_unlink(session, unused)
+        await session.commit()
+        await feed_cache.bump(users=[current_user.id], authors=[current_user.id])
         return {"result": True}
 
 
+def like_counter_cte(changed: CTE, delta: int) -> CTE:
+    """
+    Обновление счётчиков твитов для лайков из changed.
+
+    changed - INSERT или DELETE лайков с RETURNING tweet_id; меняются
+    только реально изменённые строки. Строки home_timeline лайк не трогает:
+    ленты упорядочены по id твита, а likes_count читается при выдаче.
+    """
+    return (
+        update(Tweet)
+        .where(Tweet.id.in_(select(changed.c.tweet_id)))
+        .values(likes_count=Tweet.likes_count + delta)
+        .returning(Tweet.author_id)
+        .cte("tweets_updated")
+    )
+
+
+def change_likes_count(changed: CTE, delta: int) -> Select:
+    """Запрос, применяющий изменение лайков вместе со счётчиками, - авторы твитов"""
+    return select(like_counter_cte(changed, delta).c.author_id)
+
+
 async def set_like_tweet(
     tweet_id: int,
-    user: UserSCH = Depends(get_user_by_token),
+    user: AuthUser = Depends(get_user_by_token),
     session: AsyncSession = Depends(get_async_session),
 ) -> Dict:
-    """Поставить лайк твиту"""
+    """Поставить лайк твиту, повторный лайк ничего не меняет"""
     logger.info(
-        f"Начинаю попытку установки лайка на  твит с id:{tweet_id} пользователем с id: {user.id}"
+        "Начинаю попытку установки лайка на  твит с id:%s пользователем с id: %s",
+        tweet_id,
+        user.id,
     )
-    # Проверяем существование твита
-    result = await session.execute(select(Tweet).where(Tweet.id == tweet_id))
-    tweet = result.scalar_one_or_none()
-
-    if tweet is None:
-        logger.error("Твит не найден")
-        raise HTTPException(status_code=500, detail="Твит не найден")
-
-    # Проверяем, не стоит ли уже лайк
-    result = await session.execute(
-        select(Like).where(Like.tweet_id == tweet_id).where(Like.user_id == user.id)
+    inserted = (
+        insert(Like)
+        .values(user_id=user.id, tweet_id=tweet_id)
+        .on_conflict_do_nothing(index_elements=[Like.tweet_id, Like.user_id])
+        .returning(Like.tweet_id)
+        .cte("inserted")
     )
-    if result.scalar_one_or_none() is not None:
-        logger.error("Данный пользователь уже поставили лайк этому твиту")
-        raise HTTPException(status_code=500, detail="Вы уже поставили лайк этому твиту")
-
-    # Создаем новый лайк
-    like = Like(user_id=user.id, tweet_id=tweet_id)
-    session.add(like)
+    try:
+        authors = (await session.scalars(change_likes_count(inserted, 1))).all()
+    except IntegrityError as e:
+        if not is_foreign_key_violation(e):
+            raise
+        logger.error("Твит не найден")
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Твит не найден"
+        )
+    if authors:
+        await publish_events(
+            session, [like_event(tweet_id, authors[0], user.id, delta=1)]
+        )
+        await session.commit()
+        await feed_cache.bump(users=[user.id], authors=authors)
     return {"result": "true"}
 
 
 async def del_like_tweet(
     tweet_id: int,
-    user: UserSCH = Depends(get_user_by_token),
+    user: AuthUser = Depends(get_user_by_token),
     session: AsyncSession = Depends(get_async_session),
 ) -> Dict:
     """Удалить лайк с твита"""
     logger.info(
-        f"Начинаю попытку удаления лайка с твита с id:{tweet_id} пользователем с id: {user.id}"
+        "Начинаю попытку удаления лайка с твита с id:%s пользователем с id: %s",
+        tweet_id,
+        user.id,
     )
-    result = await session.execute(
+    deleted = (
         delete(Like)
-        .where(Like.tweet_id == tweet_id)
-        .where(Like.user_id == user.id)
-        .returning(Like.id)
+        .where(Like.tweet_id == tweet_id, Like.user_id == user.id)
+        .returning(Like.tweet_id)
+        .cte("deleted")
     )
-    if result.scalar_one_or_none() is None:
+    authors = (await session.scalars(change_likes_count(deleted, -1))).all()
+    if not authors:
         logger.error("Лайк не найден")
         raise HTTPException(status_code=500, detail="Лайк не найден")
-
+    await publish_events(session, [like_event(tweet_id, authors[0], user.id, delta=-1)])
+    await session.commit()
+    await feed_cache.bump(users=[user.id], authors=authors)
     return {"result": "true"}
+
+
+async def set_like_tweets(
+    batch: BatchIds,
+    user: AuthUser = Depends(get_user_by_token),
+    session: AsyncSession = Depends(get_async_session),
+) -> Dict:
+    """
+    Лайки сразу нескольким твитам одним запросом.
+
+    Несуществующие твиты пропускаются и возвращаются в not_found,
+    уже поставленные лайки не меняются.
+    """
+    tweet_ids = check_batch(batch.ids)
+    logger.info("Пользователь с id:%s ставит лайки твитам: %s", user.id, len(tweet_ids))
+    targets = (
+        select(Tweet.id, Tweet.author_id).where(Tweet.id.in_(tweet_ids)).cte("targets")
+    )
+    inserted = (
+        insert(Like)
+        .from_select(["user_id", "tweet_id"], select(literal(user.id), targets.c.id))
+        .on_conflict_do_nothing(index_elements=[Like.tweet_id, Like.user_id])
+        .returning(Like.tweet_id)
+        .cte("inserted")
+    )
+    query = select(
+        targets.c.id,
+        targets.c.author_id,
+        targets.c.id.in_(select(inserted.c.tweet_id)).label("applied"),
+    ).add_cte(like_counter_cte(inserted, 1))
+    rows = (await session.execute(query)).all()
+    applied = [row for row in rows if row.applied]
+    authors = [row.author_id for row in applied]
+    if authors:
+        await publish_events(
+            session,
+            [like_event(row.id, row.author_id, user.id, delta=1) for row in applied],
+        )
+        await session.commit()
+        await feed_cache.bump(users=[user.id], authors=authors)
+    return batch_result(tweet_ids, rows)
@@ -1,144 +1,443 @@
-from typing import Dict
+from typing import Dict, List, Optional
 
-from fastapi import Depends, HTTPException, status
-from sqlalchemy import delete, select
-from sqlalchemy.dialects.mysql import insert
+from fastapi import Depends, HTTPException, Query, Request, Response, status
+from sqlalchemy import (
+    CompoundSelect,
+    Select,
+    delete,
+    false,
+    func,
+    literal,
+    or_,
+    select,
+    true,
+    union_all,
+    update,
+)
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
+from sqlalchemy.sql.dml import Update
+from sqlalchemy.sql.selectable import CTE
 
-from api.config.config import API_KEY_HEADER, logger
+from api.config.config import API_KEY_HEADER, logger, settings
 from api.config.models import User, follower_tbl
-from api.database.database import get_async_session
+from api.config.schemas import AuthUser, BatchIds
+from api.database.database import (
+    get_async_session,
+    get_read_session,
+    is_foreign_key_violation,
+)
+from api.function.batch import batch_result, check_batch, parse_ids
+from api.function.cache import AuthCache
+from api.function.etag import check_not_modified, make_etag
+from api.function.feed_cache import feed_cache
+from api.function.pagination import decode_cursor, encode_cursor
+from api.function.timeline import backfill_timeline, drop_author_from_timeline
+
+auth_cache = AuthCache(maxsize=settings.AUTH_CACHE_SIZE, ttl=settings.AUTH_CACHE_TTL)
 
 
 async def get_user_by_token(
     token: str = Depends(API_KEY_HEADER),
     session: AsyncSession = Depends(get_async_session),
-) -> User:
-    logger.info("Формирую запрос информации к БД о пользователе по api ключу")
+) -> AuthUser:
     """Зависимость для получения текущего пользователя по API ключу"""
-    query = (
-        select(User)
-        .where(User.api_key == token)
-        .options(selectinload(User.following), selectinload(User.followers))
+    user = auth_cache.get(token)
+    if user is not None:
+        return user
+
+    logger.info("Формирую запрос информации к БД о пользователе по api ключу")
+    following_ids = (
+        select(func.array_agg(follower_tbl.c.following_id))
+        .where(follower_tbl.c.follower_id == User.id)
+        .scalar_subquery()
+    )
+    query = select(User.id, User.name, following_ids.label("following_ids")).where(
+        User.api_key == token
     )
     result = await session.execute(query)
-    user = result.scalar_one_or_none()
+    row = result.one_or_none()
+    # Соединение возвращается в пул сразу после проверки ключа: маршруты
+    # чтения работают через get_read_session и иначе держали бы два
+    # соединения, а запись возьмёт соединение заново
+    await session.commit()
 
-    if not user:
+    if row is None:
         logger.info("Неверный API ключ")
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="Неверный API ключ"
         )
+    user = AuthUser(
+        id=row.id, name=row.name, following_ids=tuple(row.following_ids or ())
+    )
+    auth_cache.set(token, user)
     return user
 
 
-async def get_user_by_id(
-    user_id: int, session: AsyncSession = Depends(get_async_session)
-) -> User:
-    """Получение пользователя по ID или токену"""
-    logger.info("Формирую запрос информации к БД о пользователе по id")
-    query = (
-        select(User)
-        .where(User.id == user_id)
-        .options(selectinload(User.following), selectinload(User.followers))
-    )
+def user_profile_query() -> Select:
+    """Профили пользователей со счётчиками подписок"""
+    return select(User.id, User.name, User.followers_count, User.following_count)
+
+
+async def fetch_user_profile(session: AsyncSession, user_id: int) -> Dict:
+    """Профиль пользователя по ID со счётчиками подписок и updated_at"""
+    query = user_profile_query().add_columns(User.updated_at).where(User.id == user_id)
     result = await session.execute(query)
-    user = result.scalar_one_or_none()
+    user = result.mappings().one_or_none()
 
     if user is None:
         logger.error("Пользователь не найден")
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Пользователь не найден"
         )
-    return user
+    return dict(user)
+
+
+def follow_preview_query(user_id: int, limit: int) -> CompoundSelect:
+    """Первые limit подписчиков и подписок пользователя по id, одним запросом"""
+    followers = (
+        select(true().label("is_follower"), User.id, User.name)
+        .join(follower_tbl, follower_tbl.c.follower_id == User.id)
+        .where(follower_tbl.c.following_id == user_id)
+        .order_by(follower_tbl.c.follower_id)
+        .limit(limit)
+        .subquery("followers_preview")
+    )
+    following = (
+        select(false().label("is_follower"), User.id, User.name)
+        .join(follower_tbl, follower_tbl.c.following_id == User.id)
+        .where(follower_tbl.c.follower_id == user_id)
+        .order_by(follower_tbl.c.following_id)
+        .limit(limit)
+        .subquery("following_preview")
+    )
+    return union_all(select(followers), select(following))
+
+
+async def add_follow_previews(
+    session: AsyncSession, profile: Dict, viewer: AuthUser
+) -> Dict:
+    """
+    Списки followers и following профиля для клиентов, читающих списки.
+
+    Списки ограничены PROFILE_FOLLOW_PREVIEW, полные числа - в счётчиках.
+    Текущий пользователь всегда есть в followers, если он подписан: по
+    нему клиент определяет состояние кнопки подписки.
+    """
+    rows = await session.execute(
+        follow_preview_query(profile["id"], settings.PROFILE_FOLLOW_PREVIEW)
+    )
+    followers: List[Dict] = []
+    following: List[Dict] = []
+    for row in rows:
+        (followers if row.is_follower else following).append(
+            {"id": row.id, "name": row.name}
+        )
+    if profile.get("is_following") and all(
+        follower["id"] != viewer.id for follower in followers
+    ):
+        followers.append({"id": viewer.id, "name": viewer.name})
+    profile["followers"] = followers
+    profile["following"] = following
+    return profile
+
+
+def conditional_profile(request: Request, response: Response, profile: Dict) -> Dict:
+    """
+    ETag профиля по updated_at строки пользователя и признаку is_following.
+
+    updated_at меняется вместе со счётчиками подписок, поэтому совпадение
+    означает, что у клиента актуальный профиль, и отдаётся 304.
+    """
+    etag = make_etag(
+        "user",
+        profile["id"],
+        profile.pop("updated_at"),
+        profile.get("is_following", False),
+    )
+    check_not_modified(request, etag)
+    response.headers["ETag"] = etag
+    return profile
+
+
+async def get_user_by_id(
+    user_id: int,
+    request: Request,
+    response: Response,
+    viewer: AuthUser = Depends(get_user_by_token),
+    session: AsyncSession = Depends(get_read_session),
+) -> Dict:
+    """
+    Получение профиля пользователя по ID со счётчиками подписок.
+
+    is_following - подписан ли на него текущий пользователь, берётся из
+    его подписок без отдельного запроса.
+    """
+    logger.info("Формирую запрос информации к БД о пользователе по id")
+    profile = await fetch_user_profile(session=session, user_id=user_id)
+    profile["is_following"] = user_id in viewer.following_ids
+    # Списки строятся только для ответа 200, после проверки ETag
+    conditional_profile(request, response, profile)
+    return await add_follow_previews(session, profile, viewer)
+
+
+async def get_users_by_ids(
+    user_ids: List[int] = Depends(parse_ids),
+    session: AsyncSession = Depends(get_read_session),
+) -> List[Dict]:
+    """Профили нескольких пользователей одним запросом в порядке ids"""
+    logger.info("Формирую запрос информации к БД о пользователях: %s", len(user_ids))
+    query = user_profile_query().where(User.id.in_(user_ids))
+    users = {row["id"]: dict(row) for row in (await session.execute(query)).mappings()}
+    # Несуществующие пользователи пропускаются
+    return [users[user_id] for user_id in user_ids if user_id in users]
+
+
+async def get_current_user_profile(
+    request: Request,
+    response: Response,
+    user: AuthUser = Depends(get_user_by_token),
+    session: AsyncSession = Depends(get_read_session),
+) -> Dict:
+    """Получение полного профиля текущего пользователя"""
+    profile = await fetch_user_profile(session=session, user_id=user.id)
+    conditional_profile(request, response, profile)
+    return await add_follow_previews(session, profile, user)
+
+
+async def get_follow_list(
+    session: AsyncSession,
+    user_id: int,
+    followers: bool,
+    limit: int,
+    cursor: Optional[str] = None,
+) -> Dict:
+    """Страница подписчиков или подписок пользователя, упорядоченная по id"""
+    await fetch_user_profile(session=session, user_id=user_id)
+    if followers:
+        own_column, other_column = (
+            follower_tbl.c.following_id,
+            follower_tbl.c.follower_id,
+        )
+    else:
+        own_column, other_column = (
+            follower_tbl.c.follower_id,
+            follower_tbl.c.following_id,
+        )
+
+    query = (
+        select(User.id, User.name)
+        .join(follower_tbl, other_column == User.id)
+        .where(own_column == user_id)
+    )
+    position = decode_cursor(cursor, int)
+    if position is not None:
+        query = query.where(other_column > position[0])
+    query = query.order_by(other_column).limit(limit + 1)
+
+    rows = (await session.execute(query)).mappings().all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]["id"])
+    return {"users": [dict(row) for row in rows], "next_cursor": next_cursor}
+
+
+async def get_followers(
+    user_id: int,
+    limit: int = Query(
+        default=settings.FEED_PAGE_SIZE, ge=1, le=settings.FEED_MAX_PAGE_SIZE
+    ),
+    cursor: Optional[str] = Query(default=None),
+    session: AsyncSession = Depends(get_read_session),
+) -> Dict:
+    """Получение страницы подписчиков пользователя"""
+    logger.info("Формирую запрос к БД о подписчиках пользователя с id:%s", user_id)
+    return await get_follow_list(
+        session=session, user_id=user_id, followers=True, limit=limit, cursor=cursor
+    )
+
+
+async def get_following(
+    user_id: int,
+    limit: int = Query(
+        default=settings.FEED_PAGE_SIZE, ge=1, le=settings.FEED_MAX_PAGE_SIZE
+    ),
+    cursor: Optional[str] = Query(default=None),
+    session: AsyncSession = Depends(get_read_session),
+) -> Dict:
+    """Получение страницы подписок пользователя"""
+    logger.info("Формирую запрос к БД о подписках пользователя с id:%s", user_id)
+    return await get_follow_list(
+        session=session, user_id=user_id, followers=False, limit=limit, cursor=cursor
+    )
+
+
+def change_follow_counts(follows: CTE, delta: int) -> Update:
+    """
+    Изменение счётчиков обоих пользователей для подписок из follows.
+
+    follows - INSERT или DELETE подписок с RETURNING follower_id,
+    following_id; без изменённых строк счётчики не меняются. Счётчик
+    меняется на delta за каждую изменённую подписку пользователя, версия
+    ленты подписчика растёт при любом изменении его подписок.
+    """
+    followers = select(follows.c.follower_id)
+    followings = select(follows.c.following_id)
+    following_delta = (
+        select(func.count()).where(follows.c.follower_id == User.id).scalar_subquery()
+    )
+    followers_delta = (
+        select(func.count()).where(follows.c.following_id == User.id).scalar_subquery()
+    )
+    return (
+        update(User)
+        .where(or_(User.id.in_(followers), User.id.in_(followings)))
+        .values(
+            following_count=User.following_count + following_delta * delta,
+            followers_count=User.followers_count + followers_delta * delta,
+            feed_version=User.feed_version + following_delta,
+        )
+    )
+
+
+def check_self_follow(follower_id: int, following_id: int) -> None:
+    if follower_id == following_id:
+        logger.error("Нельзя подписаться на самого себя")
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Нельзя подписаться на самого себя",
+        )
 
 
 async def user_follow(
     user_id: int,
-    follower: User = Depends(get_user_by_token),
+    follower: AuthUser = Depends(get_user_by_token),
     session: AsyncSession = Depends(get_async_session),
 ) -> Dict:
+    """Подписка на пользователя, повторная подписка ничего не меняет"""
     logger.info(
-        f"Попытка пользователя с id:{follower.id} подписаться на пользователя с id:{user_id}"
-    )
-    if await get_user_by_id(user_id=user_id, session=session) is not None:
-        """Подписка на пользователя"""
-        if await check_user_follow(
-            session=session, follower_id=follower.id, following_id=user_id
-        ):
-            logger.error("Вы уже подписаны на этого пользователя")
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Вы уже подписаны на этого пользователя",
-            )
-        else:
-            await session.execute(
-                insert(follower_tbl).values(
-                    follower_id=follower.id, following_id=user_id
-                )
-            )
-            await session.commit()
-            return {"result": "true"}
-    else:
+        "Попытка пользователя с id:%s подписаться на пользователя с id:%s",
+        follower.id,
+        user_id,
+    )
+    check_self_follow(follower_id=follower.id, following_id=user_id)
+    # Подписка, счётчики и заполнение ленты - один запрос к БД
+    follows = (
+        insert(follower_tbl)
+        .values(follower_id=follower.id, following_id=user_id)
+        .on_conflict_do_nothing()
+        .returning(follower_tbl.c.follower_id, follower_tbl.c.following_id)
+        .cte("follows")
+    )
+    statement = (
+        select(func.count())
+        .select_from(follows)
+        .add_cte(
+            change_follow_counts(follows, 1).cte("counts"),
+            backfill_timeline(follows).cte("backfill"),
+        )
+    )
+    try:
+        created = await session.scalar(statement)
+    except IntegrityError as e:
+        if not is_foreign_key_violation(e):
+            raise
         logger.error("Пользователь не найден")
         raise HTTPException(
-            status_code=status.HTTP_404_BAD_REQUEST,
+            status_code=status.HTTP_404_NOT_FOUND,
             detail="Пользователь не найден",
         )
+    if created:
+        await session.commit()
+        auth_cache.invalidate_user(follower.id)
+        await feed_cache.bump(users=[follower.id])
+    return {"result": "true"}
 
 
 async def user_unfollow(
     user_id: int,
-    follower: User = Depends(get_user_by_token),
+    follower: AuthUser = Depends(get_user_by_token),
     session: AsyncSession = Depends(get_async_session),
 ) -> Dict:
     """Отписка от пользователя"""
     logger.info(
-        f"Попытка пользователя с id:{follower.id} отписаться от пользователя с id:{user_id}"
+        "Попытка пользователя с id:%s отписаться от пользователя с id:%s",
+        follower.id,
+        user_id,
     )
-    if not await check_user_follow(
-        session=session, follower_id=follower.id, following_id=user_id
-    ):
+    follows = (
+        delete(follower_tbl)
+        .where(
+            follower_tbl.c.follower_id == follower.id,
+            follower_tbl.c.following_id == user_id,
+        )
+        .returning(follower_tbl.c.follower_id, follower_tbl.c.following_id)
+        .cte("follows")
+    )
+    statement = (
+        select(func.count())
+        .select_from(follows)
+        .add_cte(
+            change_follow_counts(follows, -1).cte("counts"),
+            drop_author_from_timeline(follows).cte("dropped"),
+        )
+    )
+    if not await session.scalar(statement):
         logger.error("Вы не подписаны на этого пользователя")
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Вы не подписаны на этого пользователя",
         )
-    else:
-        await session.execute(
-            delete(follower_tbl).where(
-                follower_tbl.c.follower_id == follower.id,
-                follower_tbl.c.following_id == user_id,
-            )
-        )
-        await session.commit()
-        return {"result": "true"}
+    # Фиксация до сброса кэша, чтобы кэш не заполнился старыми подписками
+    await session.commit()
+    auth_cache.invalidate_user(follower.id)
+    await feed_cache.bump(users=[follower.id])
+    return {"result": "true"}
 
 
-async def check_user_follow(
-    follower_id: int,
-    following_id: int,
+async def user_follow_many(
+    batch: BatchIds,
+    follower: AuthUser = Depends(get_user_by_token),
     session: AsyncSession = Depends(get_async_session),
-) -> bool:
-    """Проверка подписки на пользователя"""
+) -> Dict:
+    """
+    Подписка сразу на нескольких пользователей одним запросом.
+
+    Несуществующие пользователи возвращаются в not_found, существующие
+    подписки и подписка на самого себя пропускаются.
+    """
+    user_ids = check_batch(batch.ids)
     logger.info(
-        f"Запуск проверки подписки пользователя с id:{follower_id} на пользователя с id:{following_id}"
+        "Пользователь с id:%s подписывается на пользователей: %s",
+        follower.id,
+        len(user_ids),
     )
-    if follower_id == following_id:
-        logger.error("Нельзя подписаться на самого себя")
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Нельзя подписаться на самого себя",
-        )
-    else:
-        result = await session.execute(
-            select(follower_tbl).filter_by(
-                follower_id=follower_id, following_id=following_id
-            )
+    targets = select(User.id).where(User.id.in_(user_ids)).cte("targets")
+    follows = (
+        insert(follower_tbl)
+        .from_select(
+            ["follower_id", "following_id"],
+            select(literal(follower.id), targets.c.id).where(
+                targets.c.id != follower.id
+            ),
         )
-        result = result.scalar_one_or_none()
-        if result is None:
-            return False
-        else:
-            return True
+        .on_conflict_do_nothing()
+        .returning(follower_tbl.c.follower_id, follower_tbl.c.following_id)
+        .cte("follows")
+    )
+    query = select(
+        targets.c.id,
+        targets.c.id.in_(select(follows.c.following_id)).label("applied"),
+    ).add_cte(
+        change_follow_counts(follows, 1).cte("counts"),
+        backfill_timeline(follows).cte("backfill"),
+    )
+    rows = (await session.execute(query)).all()
+    result = batch_result(user_ids, rows)
+    if result["applied"]:
+        await session.commit()
+        auth_cache.invalidate_user(follower.id)
+        await feed_cache.bump(users=[follower.id])
+    return result
@@ -0,0 +1,359 @@
+"""
+Массовая загрузка данных через COPY.
+
+Записи читаются потоком из NDJSON или CSV (или берутся из синтетического
+генератора) и передаются в asyncpg copy_records_to_table пачками.
+Вторичные индексы загружаемых таблиц удаляются до загрузки и строятся
+заново после неё. Затем пересчитываются счётчики, не переданные вместе
+с записями, ленты home_timeline заполняются разосланными твитами, и
+выполняется ANALYZE.
+
+    python -m api.jobs.bulk_load users=users.ndjson followers_tbl=follows.csv
+    python -m api.jobs.bulk_load --generate --users 1000000 --tweets 5000000
+"""
+
+import argparse
+import asyncio
+import csv
+import json
+import os
+from datetime import datetime
+from itertools import chain, islice
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    cast,
+)
+
+from sqlalchemy import (
+    JSON,
+    Boolean,
+    DateTime,
+    Index,
+    Integer,
+    Table,
+    func,
+    select,
+    update,
+)
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from api.config.config import logger, settings
+from api.config.models import HomeTimeline, Like, Media, Tweet, User, follower_tbl
+from api.database.database import engine
+
+COPY_BATCH_SIZE = 50000
+
+# Порядок загрузки учитывает внешние ключи
+TABLES: Dict[str, Table] = {
+    "users": cast(Table, User.__table__),
+    "followers_tbl": follower_tbl,
+    "tweets": cast(Table, Tweet.__table__),
+    "likes": cast(Table, Like.__table__),
+    "medias": cast(Table, Media.__table__),
+}
+
+
+def read_ndjson(path: str) -> Iterator[Dict]:
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def read_csv(path: str) -> Iterator[Dict]:
+    with open(path, encoding="utf-8", newline="") as f:
+        yield from csv.DictReader(f)
+
+
+def read_records(path: str) -> Iterator[Dict]:
+    """Чтение файла по расширению: .ndjson/.jsonl или .csv"""
+    extension = os.path.splitext(path)[1].lower()
+    if extension in (".ndjson", ".jsonl"):
+        return read_ndjson(path)
+    if extension == ".csv":
+        return read_csv(path)
+    raise ValueError(f"Неподдерживаемый формат файла: {path}")
+
+
+def _parse_bool(value: Any) -> bool:
+    if isinstance(value, str):
+        return value.strip().lower() in ("1", "t", "true", "yes", "y")
+    return bool(value)
+
+
+def _parse_datetime(value: Any) -> datetime:
+    return value if isinstance(value, datetime) else datetime.fromisoformat(value)
+
+
+def _dump_json(value: Any) -> str:
+    return value if isinstance(value, str) else json.dumps(value)
+
+
+def converter_for(column) -> Callable[[Any], Any]:
+    """Приведение значения из CSV/JSON к типу, который ждёт бинарный COPY"""
+    if isinstance(column.type, Boolean):
+        return _parse_bool
+    if isinstance(column.type, Integer):
+        return int
+    if isinstance(column.type, DateTime):
+        return _parse_datetime
+    if isinstance(column.type, JSON):
+        return _dump_json
+    return str
+
+
+def to_rows(table: Table, records: Iterable[Dict]) -> Tuple[List[str], Iterator[Tuple]]:
+    """
+    Список колонок и поток кортежей для COPY.
+
+    Колонки берутся из первой записи; отсутствующие в записи колонки
+    получают значения по умолчанию на стороне БД.
+    """
+    records = iter(records)
+    first = next(records, None)
+    if first is None:
+        return [], iter(())
+    columns = [name for name in first if name in table.c]
+    unknown = set(first) - set(columns)
+    if unknown:
+        logger.warning(
+            "Колонки %s отсутствуют в таблице %s и пропущены", sorted(unknown), table
+        )
+    converters = [converter_for(table.c[name]) for name in columns]
+
+    rows = (
+        tuple(
+            None if item.get(name) in (None, "") else convert(item[name])
+            for name, convert in zip(columns, converters)
+        )
+        for item in chain([first], records)
+    )
+    return columns, rows
+
+
+def secondary_indexes(table: Table) -> List[Index]:
+    """Индексы, которые можно построить после загрузки (не PK и не UNIQUE)"""
+    return [index for index in table.indexes if not index.unique]
+
+
+async def copy_records(
+    conn: AsyncConnection, table: Table, records: Iterable[Dict]
+) -> Tuple[int, List[str]]:
+    """
+    Загрузка записей в таблицу пачками через copy_records_to_table;
+    возвращает число записей и загруженные колонки
+    """
+    columns, rows = to_rows(table, records)
+    if not columns:
+        return 0, columns
+    raw = (await conn.get_raw_connection()).driver_connection
+    loaded = 0
+    while True:
+        batch = list(islice(rows, COPY_BATCH_SIZE))
+        if not batch:
+            break
+        await raw.copy_records_to_table(table.name, records=batch, columns=columns)
+        loaded += len(batch)
+        logger.info("В таблицу %s загружено записей: %s", table.name, loaded)
+    return loaded, columns
+
+
+async def reset_sequence(conn: AsyncConnection, table: Table) -> None:
+    """Сдвиг последовательности id после загрузки записей с явными id"""
+    if "id" not in table.c or not table.c.id.autoincrement:
+        return
+    max_id = await conn.scalar(select(func.max(table.c.id)))
+    await conn.scalar(
+        select(
+            func.setval(
+                func.pg_get_serial_sequence(table.name, "id"),
+                max_id or 1,
+                max_id is not None,
+            )
+        )
+    )
+
+
+async def recount_likes(conn: AsyncConnection) -> None:
+    """likes_count твитов, получивших лайки, по таблице likes"""
+    counts = (
+        select(Like.tweet_id, func.count().label("likes_count"))
+        .group_by(Like.tweet_id)
+        .subquery()
+    )
+    await conn.execute(
+        update(Tweet)
+        .where(Tweet.id == counts.c.tweet_id)
+        .values(likes_count=counts.c.likes_count)
+    )
+
+
+async def recount_follows(conn: AsyncConnection) -> None:
+    """Счётчики подписчиков и подписок пользователей по followers_tbl"""
+    followers = (
+        select(func.count())
+        .where(follower_tbl.c.following_id == User.id)
+        .scalar_subquery()
+    )
+    following = (
+        select(func.count())
+        .where(follower_tbl.c.follower_id == User.id)
+        .scalar_subquery()
+    )
+    await conn.execute(
+        update(User).values(followers_count=followers, following_count=following)
+    )
+
+
+async def backfill_timelines(conn: AsyncConnection) -> None:
+    """
+    Ленты home_timeline из разосланных твитов, как их построила бы
+    рассылка при публикации; уже существующие строки не меняются
+    """
+    followers = select(follower_tbl.c.follower_id, Tweet.id).join(
+        Tweet, Tweet.author_id == follower_tbl.c.following_id
+    )
+    own = select(Tweet.author_id, Tweet.id)
+    await conn.execute(
+        insert(HomeTimeline)
+        .from_select(
+            ["user_id", "tweet_id"],
+            followers.where(Tweet.fanned_out).union_all(own.where(Tweet.fanned_out)),
+        )
+        .on_conflict_do_nothing(
+            index_elements=[HomeTimeline.user_id, HomeTimeline.tweet_id]
+        )
+    )
+
+
+async def rebuild_derived(conn: AsyncConnection, columns: Dict[str, Set[str]]) -> None:
+    """
+    Пересчёт данных, которые обычно поддерживают записи через API:
+    счётчики, не переданные в загруженных записях, и ленты
+    """
+    tweets_counted = "likes_count" in columns.get("tweets", ())
+    if "likes" in columns and not tweets_counted:
+        logger.info("Пересчитываю likes_count по загруженным лайкам")
+        await recount_likes(conn)
+    users_counted = {"followers_count", "following_count"} <= columns.get(
+        "users", set()
+    )
+    if "followers_tbl" in columns and not users_counted:
+        logger.info("Пересчитываю счётчики подписок по загруженным подпискам")
+        await recount_follows(conn)
+    if "tweets" in columns or "followers_tbl" in columns:
+        logger.info("Заполняю home_timeline разосланными твитами")
+        await backfill_timelines(conn)
+
+
+async def bulk_load(
+    sources: Dict[str, Iterable[Dict]], defer_indexes: bool = True
+) -> Dict[str, int]:
+    """
+    Загрузка нескольких таблиц в одной транзакции.
+
+    При ошибке транзакция откатывается вместе с удалением индексов,
+    поэтому схема остаётся прежней.
+    """
+    unknown = set(sources) - set(TABLES)
+    if unknown:
+        raise ValueError(f"Неизвестные таблицы: {sorted(unknown)}")
+
+    tables = [TABLES[name] for name in TABLES if name in sources]
+    deferred = (
+        [index for table in tables for index in secondary_indexes(table)]
+        if defer_indexes
+        else []
+    )
+    loaded: Dict[str, int] = {}
+    columns: Dict[str, Set[str]] = {}
+
+    async with engine.begin() as conn:
+        for index in deferred:
+            await conn.run_sync(index.drop)
+        for table in tables:
+            count, names = await copy_records(conn, table, sources[table.name])
+            loaded[table.name] = count
+            columns[table.name] = set(names)
+            await reset_sequence(conn, table)
+        for index in deferred:
+            logger.info("Строю индекс %s", index.name)
+            await conn.run_sync(index.create)
+        await rebuild_derived(conn, columns)
+        # Свежая статистика, чтобы планировщик сразу видел новые объёмы
+        for table in [*tables, HomeTimeline.__table__]:
+            await conn.exec_driver_sql(f"ANALYZE {table.name}")
+    logger.info("Массовая загрузка завершена: %s", loaded)
+    return loaded
+
+
+async def run(sources: Dict[str, Iterable[Dict]], defer_indexes: bool) -> None:
+    await bulk_load(sources, defer_indexes=defer_indexes)
+    await engine.dispose()
+
+
+def generated_sources(args: argparse.Namespace) -> Dict[str, Iterable[Dict]]:
+    from api.config.generator import generate_social_graph
+
+    graph = generate_social_graph(
+        users=args.users,
+        avg_following=args.avg_following,
+        tweets=args.tweets,
+        likes=args.likes,
+        media=args.media,
+        seed=args.seed,
+        fanout_threshold=settings.TIMELINE_FANOUT_THRESHOLD,
+    )
+    return {
+        "users": graph.users,
+        "followers_tbl": graph.follows,
+        "tweets": graph.tweets,
+        "likes": graph.likes,
+        "medias": graph.media,
+    }
+
+
+def parse_sources(pairs: List[str]) -> Dict[str, Iterable[Dict]]:
+    sources: Dict[str, Iterable[Dict]] = {}
+    for pair in pairs:
+        table, _, path = pair.partition("=")
+        if not path:
+            raise SystemExit(f"Ожидается таблица=файл, получено: {pair}")
+        sources[table] = read_records(path)
+    return sources
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Массовая загрузка данных через COPY")
+    parser.add_argument("sources", nargs="*", metavar="таблица=файл")
+    parser.add_argument("--generate", action="store_true")
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--avg-following", type=int, default=50)
+    parser.add_argument("--tweets", type=int, default=50000)
+    parser.add_argument("--likes", type=int, default=200000)
+    parser.add_argument("--media", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--keep-indexes",
+        action="store_true",
+        help="не удалять вторичные индексы на время загрузки",
+    )
+    args = parser.parse_args(argv)
+
+    sources = generated_sources(args) if args.generate else parse_sources(args.sources)
+    if not sources:
+        parser.error("укажите файлы для загрузки или --generate")
+    asyncio.run(run(sources, defer_indexes=not args.keep_indexes))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+import asyncio
+import os
+import time
+from datetime import timedelta
+from typing import List
+
+from sqlalchemy import delete, func, select
+from starlette.concurrency import run_in_threadpool
+
+from api.config.config import MEDIA_FOLDER, logger, settings
+from api.config.models import Media
+from api.database.database import async_session_maker
+from api.function.media_cleanup import (
+    find_referenced_links,
+    schedule_unlink,
+    unlinker,
+)
+from api.function.media_func import release_blobs
+from api.function.media_variants import original_link
+
+
+async def collect_unattached_media() -> int:
+    """Удаление медиа, не привязанных к твиту дольше MEDIA_GC_TTL"""
+    ttl = timedelta(seconds=settings.MEDIA_GC_TTL)
+    expired = (
+        select(Media.id)
+        .where(
+            Media.tweet_id.is_(None),
+            Media.created_at < func.now() - ttl,
+        )
+        .limit(settings.MEDIA_GC_BATCH_SIZE)
+    )
+    async with async_session_maker() as session:
+        result = await session.execute(
+            delete(Media)
+            .where(Media.id.in_(expired))
+            .returning(Media.link, Media.sha256)
+            .execution_options(synchronize_session=False)
+        )
+        rows = result.all()
+        unused = [row.link for row in rows if row.sha256 is None]
+        unused += await release_blobs(
+            session=session, hashes=[row.sha256 for row in rows if row.sha256]
+        )
+        schedule_unlink(session, unused)
+        await session.commit()
+    logger.info("Удалено непривязанных медиа: %s", len(rows))
+    return len(rows)
+
+
+def list_stale_files(folder: str, min_age: float) -> List[str]:
+    """Файлы каталога медиа старше min_age секунд, выполняется в пуле потоков"""
+    deadline = time.time() - min_age
+    with os.scandir(folder) as entries:
+        return [
+            entry.name
+            for entry in entries
+            if entry.is_file() and entry.stat().st_mtime < deadline
+        ]
+
+
+async def collect_orphan_files() -> int:
+    """Удаление файлов, на которые не ссылается ни одна запись"""
+    # Свежие файлы пропускаются: запись о них может быть ещё не зафиксирована
+    names = await run_in_threadpool(
+        list_stale_files, MEDIA_FOLDER, settings.MEDIA_GC_TTL
+    )
+    orphans = []
+    batch = settings.MEDIA_GC_BATCH_SIZE
+    for start in range(0, len(names), batch):
+        end = start + batch
+        chunk = names[start:end]
+        # Производные файлы живут, пока есть запись об оригинале
+        originals = {name: original_link(name) for name in chunk}
+        referenced = await find_referenced_links(list(set(originals.values())))
+        orphans += [name for name in chunk if originals[name] not in referenced]
+
+    unlinker.submit(orphans)
+    logger.info("Найдено файлов без записей в БД: %s", len(orphans))
+    return len(orphans)
+
+
+async def collect_media_garbage() -> None:
+    await collect_unattached_media()
+    await collect_orphan_files()
+    await unlinker.wait()
+
+
+if __name__ == "__main__":
+    asyncio.run(collect_media_garbage())
@@ -0,0 +1,106 @@
+import asyncio
+
+from sqlalchemy import func, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from api.config.config import logger, settings
+from api.config.models import Like, Tweet, User, follower_tbl
+from api.database.database import async_session_maker
+
+
+async def reconcile_likes_range(
+    session: AsyncSession, start_id: int, end_id: int
+) -> int:
+    """Сверка likes_count с таблицей likes для твитов с id в [start_id, end_id)"""
+    actual = (
+        select(Tweet.id, func.count(Like.id).label("likes_count"))
+        .outerjoin(Like, Tweet.likes)
+        .where(Tweet.id >= start_id, Tweet.id < end_id)
+        .group_by(Tweet.id)
+        .subquery()
+    )
+    result = await session.execute(
+        update(Tweet)
+        .where(Tweet.id == actual.c.id, Tweet.likes_count != actual.c.likes_count)
+        .values(likes_count=actual.c.likes_count)
+        .returning(Tweet.id)
+        .execution_options(synchronize_session=False)
+    )
+    return len(result.all())
+
+
+async def reconcile_follow_range(
+    session: AsyncSession, start_id: int, end_id: int
+) -> int:
+    """Сверка счётчиков подписок с followers_tbl для пользователей с id в диапазоне"""
+    followers = (
+        select(func.count())
+        .where(follower_tbl.c.following_id == User.id)
+        .correlate(User)
+        .scalar_subquery()
+    )
+    following = (
+        select(func.count())
+        .where(follower_tbl.c.follower_id == User.id)
+        .correlate(User)
+        .scalar_subquery()
+    )
+    actual = (
+        select(
+            User.id,
+            followers.label("followers_count"),
+            following.label("following_count"),
+        )
+        .where(User.id >= start_id, User.id < end_id)
+        .subquery()
+    )
+    result = await session.execute(
+        update(User)
+        .where(
+            User.id == actual.c.id,
+            or_(
+                User.followers_count != actual.c.followers_count,
+                User.following_count != actual.c.following_count,
+            ),
+        )
+        .values(
+            followers_count=actual.c.followers_count,
+            following_count=actual.c.following_count,
+        )
+        .returning(User.id)
+        .execution_options(synchronize_session=False)
+    )
+    return len(result.all())
+
+
+async def reconcile_in_batches(model, reconcile_range) -> int:
+    """Запуск сверки по диапазонам id, каждый пакет в своей транзакции"""
+    async with async_session_maker() as session:
+        max_id = await session.scalar(select(func.max(model.id)))
+
+    repaired = 0
+    batch = settings.RECONCILE_BATCH_SIZE
+    for start_id in range(1, (max_id or 0) + 1, batch):
+        # Короткие транзакции, чтобы не держать блокировки строк долго
+        async with async_session_maker() as session:
+            repaired += await reconcile_range(
+                session=session, start_id=start_id, end_id=start_id + batch
+            )
+            await session.commit()
+    return repaired
+
+
+async def reconcile_counters() -> int:
+    """Исправление расхождений денормализованных счётчиков"""
+    likes = await reconcile_in_batches(Tweet, reconcile_likes_range)
+    follows = await reconcile_in_batches(User, reconcile_follow_range)
+    logger.info(
+        "Сверка счётчиков завершена, исправлено твитов: %s, пользователей: %s",
+        likes,
+        follows,
+    )
+    return likes + follows
+
+
+if __name__ == "__main__":
+    asyncio.run(reconcile_counters())
@@ -0,0 +1,28 @@
+import asyncio
+from typing import Awaitable, Callable, Optional
+
+from api.config.config import logger
+
+
+async def run_periodically(
+    name: str, interval: float, job: Callable[[], Awaitable[object]]
+) -> None:
+    """Бесконечный запуск фоновой задачи с заданным интервалом в секундах"""
+    logger.info("Фоновая задача %s запущена с интервалом %s с", name, interval)
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await job()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error("Ошибка фоновой задачи %s: %s", name, e)
+
+
+def start_periodic(
+    name: str, interval: float, job: Callable[[], Awaitable[object]]
+) -> Optional[asyncio.Task]:
+    """Запуск периодической задачи; интервал 0 отключает задачу"""
+    if interval <= 0:
+        return None
+    return asyncio.create_task(run_periodically(name, interval, job), name=name)
@@ -1,35 +1,74 @@
 from contextlib import asynccontextmanager
+from typing import cast
 
 from fastapi import FastAPI
 from fastapi.exceptions import RequestValidationError, ResponseValidationError
+from sqlalchemy.pool import QueuePool
 from starlette.exceptions import HTTPException
 
-from api.config.config import logger
+from api.config.config import logger, settings
 from api.config.exceptions import (
     Error_DB,
+    NotModified,
     all_http_exception_handler,
     custom_exception_handler,
+    not_modified_handler,
     response_validation_exception_handler,
     validation_exception_handler,
 )
-from api.database.database import Base, engine
-from api.routers import main, media, tweets, users
+from api.database.database import engine, replicas
+from api.function.admission import AdmissionMiddleware
+from api.function.feed_cache import feed_cache
+from api.function.media_cleanup import unlinker
+from api.function.media_variants import shutdown_pool
+from api.function.metrics import (
+    MetricsMiddleware,
+    instrument_engine,
+    register_pool_gauges,
+)
+from api.function.realtime import hub
+from api.jobs.media_gc import collect_media_garbage
+from api.jobs.reconcile import reconcile_counters
+from api.jobs.scheduler import start_periodic
+from api.routers import main, media, metrics, tweets, users
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
-    logger.info("База готова")
+    # Схема БД создаётся и обновляется миграциями: alembic upgrade head
+    reconcile_task = start_periodic(
+        "reconcile_counters", settings.RECONCILE_INTERVAL, reconcile_counters
+    )
+    media_gc_task = start_periodic(
+        "collect_media_garbage", settings.MEDIA_GC_INTERVAL, collect_media_garbage
+    )
     logger.info("Приложение запущено")
     yield
+    for task in (reconcile_task, media_gc_task):
+        if task is not None:
+            task.cancel()
+    await unlinker.wait()
+    shutdown_pool()
+    await hub.close()
+    await feed_cache.close()
+    await replicas.dispose()
     await engine.dispose()
     logger.info("Работа приложения завершена")
 
 
 app = FastAPI(lifespan=lifespan, debug=True)
 
+instrument_engine(engine.sync_engine)
+register_pool_gauges(cast(QueuePool, engine.sync_engine.pool))
+for replica in replicas.replicas:
+    instrument_engine(replica.engine.sync_engine)
+if settings.ADMISSION_ENABLED:
+    # Добавлена раньше метрик, поэтому отказы 503 тоже попадают в метрики
+    app.add_middleware(AdmissionMiddleware)
+app.add_middleware(MetricsMiddleware)
+
 app.add_exception_handler(Error_DB, custom_exception_handler)
+app.add_exception_handler(NotModified, not_modified_handler)
 app.add_exception_handler(RequestValidationError, validation_exception_handler)
 app.add_exception_handler(HTTPException, all_http_exception_handler)
 app.add_exception_handler(
@@ -40,3 +79,4 @@ app.include_router(users.user_router)
 app.include_router(tweets.tweets_router)
 app.include_router(media.media_router)
 app.include_router(main.main_router)
+app.include_router(metrics.metrics_router)
@@ -0,0 +1,104 @@
+"""Исходная схема: пользователи, подписки, твиты, лайки, медиа
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18 12:00:00
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+revision: str = "0001"
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def timestamps() -> list:
+    return [
+        sa.Column(
+            "created_at", sa.DateTime(), server_default=sa.func.now(), nullable=False
+        ),
+        sa.Column(
+            "updated_at", sa.DateTime(), server_default=sa.func.now(), nullable=False
+        ),
+    ]
+
+
+def upgrade() -> None:
+    op.create_table(
+        "users",
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column("api_key", sa.String(), nullable=False),
+        *timestamps(),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("api_key"),
+    )
+    op.create_index("ix_users_id", "users", ["id"])
+    op.create_index("ix_users_name", "users", ["name"])
+
+    op.create_table(
+        "followers_tbl",
+        sa.Column("follower_id", sa.Integer(), nullable=False),
+        sa.Column("following_id", sa.Integer(), nullable=False),
+        sa.Column(
+            "created_at",
+            sa.TIMESTAMP(timezone=True),
+            server_default=sa.func.now(),
+            nullable=True,
+        ),
+        sa.Column(
+            "updated_at",
+            sa.TIMESTAMP(timezone=True),
+            server_default=sa.func.now(),
+            nullable=True,
+        ),
+        sa.ForeignKeyConstraint(["follower_id"], ["users.id"]),
+        sa.ForeignKeyConstraint(["following_id"], ["users.id"]),
+        sa.PrimaryKeyConstraint("follower_id", "following_id"),
+    )
+
+    op.create_table(
+        "tweets",
+        sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column("author_id", sa.Integer(), nullable=False),
+        sa.Column("content", sa.String(length=2500), nullable=False),
+        *timestamps(),
+        sa.ForeignKeyConstraint(["author_id"], ["users.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_tweets_id", "tweets", ["id"])
+
+    op.create_table(
+        "likes",
+        sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("tweet_id", sa.Integer(), nullable=False),
+        *timestamps(),
+        sa.ForeignKeyConstraint(["tweet_id"], ["tweets.id"]),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_likes_id", "likes", ["id"])
+
+    op.create_table(
+        "medias",
+        sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column("link", sa.String(), nullable=False),
+        sa.Column("tweet_id", sa.Integer(), nullable=True),
+        *timestamps(),
+        sa.ForeignKeyConstraint(["tweet_id"], ["tweets.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_medias_id", "medias", ["id"])
+
+
+def downgrade() -> None:
+    op.drop_table("medias")
+    op.drop_table("likes")
+    op.drop_table("tweets")
+    op.drop_table("followers_tbl")
+    op.drop_table("users")
@@ -0,0 +1,125 @@
+"""Счётчики, home_timeline и хранение медиа по содержимому
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 12:10:00
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+revision: str = "0002"
+down_revision: Union[str, None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def timestamps() -> list:
+    return [
+        sa.Column(
+            "created_at", sa.DateTime(), server_default=sa.func.now(), nullable=False
+        ),
+        sa.Column(
+            "updated_at", sa.DateTime(), server_default=sa.func.now(), nullable=False
+        ),
+    ]
+
+
+def upgrade() -> None:
+    op.add_column(
+        "users",
+        sa.Column("followers_count", sa.Integer(), server_default="0", nullable=False),
+    )
+    op.add_column(
+        "users",
+        sa.Column("following_count", sa.Integer(), server_default="0", nullable=False),
+    )
+    # Существующие твиты не разложены по лентам и подмешиваются при чтении
+    op.add_column(
+        "tweets",
+        sa.Column(
+            "fanned_out", sa.Boolean(), server_default=sa.false(), nullable=False
+        ),
+    )
+    op.add_column(
+        "tweets",
+        sa.Column("likes_count", sa.Integer(), server_default="0", nullable=False),
+    )
+    op.create_index(
+        "ix_tweets_author_id_likes_count", "tweets", ["author_id", "likes_count"]
+    )
+    op.create_index(
+        "ix_tweets_author_id_not_fanned_out",
+        "tweets",
+        ["author_id", "likes_count", "id"],
+        postgresql_where=sa.text("NOT fanned_out"),
+    )
+
+    op.create_table(
+        "media_blobs",
+        sa.Column("sha256", sa.String(length=64), nullable=False),
+        sa.Column("link", sa.String(), nullable=False),
+        sa.Column("size", sa.BigInteger(), nullable=False),
+        sa.Column("ref_count", sa.Integer(), server_default="1", nullable=False),
+        *timestamps(),
+        sa.PrimaryKeyConstraint("sha256"),
+    )
+    op.add_column("medias", sa.Column("sha256", sa.String(length=64), nullable=True))
+    op.add_column("medias", sa.Column("width", sa.Integer(), nullable=True))
+    op.add_column("medias", sa.Column("height", sa.Integer(), nullable=True))
+    op.add_column("medias", sa.Column("variants", sa.JSON(), nullable=True))
+    op.create_index("ix_medias_sha256", "medias", ["sha256"])
+    op.create_foreign_key(
+        "medias_sha256_fkey", "medias", "media_blobs", ["sha256"], ["sha256"]
+    )
+
+    op.create_table(
+        "home_timeline",
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("tweet_id", sa.Integer(), nullable=False),
+        sa.Column("score", sa.Integer(), server_default="0", nullable=False),
+        *timestamps(),
+        sa.ForeignKeyConstraint(["tweet_id"], ["tweets.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("user_id", "tweet_id"),
+    )
+    op.create_index("ix_home_timeline_tweet_id", "home_timeline", ["tweet_id"])
+    op.create_index(
+        "ix_home_timeline_user_id_score",
+        "home_timeline",
+        ["user_id", "score", "tweet_id"],
+    )
+
+    # Начальные значения денормализованных счётчиков
+    op.execute("""
+        UPDATE users SET
+            followers_count = (
+                SELECT count(*) FROM followers_tbl f WHERE f.following_id = users.id
+            ),
+            following_count = (
+                SELECT count(*) FROM followers_tbl f WHERE f.follower_id = users.id
+            )
+        """)
+    op.execute("""
+        UPDATE tweets SET likes_count = counts.likes_count
+        FROM (SELECT tweet_id, count(*) AS likes_count FROM likes GROUP BY tweet_id)
+            AS counts
+        WHERE tweets.id = counts.tweet_id
+        """)
+
+
+def downgrade() -> None:
+    op.drop_table("home_timeline")
+    op.drop_constraint("medias_sha256_fkey", "medias", type_="foreignkey")
+    op.drop_index("ix_medias_sha256", table_name="medias")
+    for column in ("variants", "height", "width", "sha256"):
+        op.drop_column("medias", column)
+    op.drop_table("media_blobs")
+    op.drop_index("ix_tweets_author_id_not_fanned_out", table_name="tweets")
+    op.drop_index("ix_tweets_author_id_likes_count", table_name="tweets")
+    op.drop_column("tweets", "likes_count")
+    op.drop_column("tweets", "fanned_out")
+    op.drop_column("users", "following_count")
+    op.drop_column("users", "followers_count")
@@ -0,0 +1,73 @@
+"""Индексы горячих запросов, строятся конкурентно
+
+likes (tweet_id, user_id) UNIQUE - проверка и вставка лайка без сканирования
+и защита от повторного лайка; tweets (author_id, id) - выборка твитов
+автора для ленты; followers_tbl (following_id, follower_id) - поиск
+подписчиков, первичный ключ начинается с follower_id.
+
+CREATE INDEX CONCURRENTLY не блокирует запись, но не работает внутри
+транзакции, поэтому индексы строятся в autocommit_block. Если построение
+прервётся, индекс останется в состоянии INVALID: его нужно удалить
+и повторить миграцию.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 12:20:00
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+revision: str = "0003"
+down_revision: Union[str, None] = "0002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = [
+    ("uq_likes_tweet_id_user_id", "likes", ["tweet_id", "user_id"], True),
+    ("ix_tweets_author_id_id", "tweets", ["author_id", "id"], False),
+    (
+        "ix_followers_tbl_following_id_follower_id",
+        "followers_tbl",
+        ["following_id", "follower_id"],
+        False,
+    ),
+]
+
+
+def upgrade() -> None:
+    # Повторные лайки мешают построить уникальный индекс: оставляем самый
+    # ранний и уменьшаем счётчики и ранги в лентах на число удалённых
+    op.execute("""
+        WITH removed AS (
+            DELETE FROM likes a USING likes b
+            WHERE a.tweet_id = b.tweet_id AND a.user_id = b.user_id AND a.id > b.id
+            RETURNING a.tweet_id
+        ), counts AS (
+            SELECT tweet_id, count(*) AS n FROM removed GROUP BY tweet_id
+        ), tweets_fixed AS (
+            UPDATE tweets SET likes_count = tweets.likes_count - counts.n
+            FROM counts WHERE tweets.id = counts.tweet_id
+        )
+        UPDATE home_timeline SET score = home_timeline.score - counts.n
+        FROM counts WHERE home_timeline.tweet_id = counts.tweet_id
+        """)
+    with op.get_context().autocommit_block():
+        for name, table, columns, unique in INDEXES:
+            op.create_index(
+                name,
+                table,
+                columns,
+                unique=unique,
+                postgresql_concurrently=True,
+                if_not_exists=True,
+            )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, _, _ in reversed(INDEXES):
+            op.drop_index(
+                name, table_name=table, postgresql_concurrently=True, if_exists=True
+            )
@@ -0,0 +1,57 @@
+"""Полнотекстовый поиск по твитам: tweets.search_vector и индекс GIN
+
+search_vector - хранимый генерируемый столбец to_tsvector('russian',
+content), его поддерживает сама БД при вставке и изменении твита.
+Добавление хранимого генерируемого столбца переписывает таблицу tweets
+под исключительной блокировкой, поэтому на большой таблице миграцию
+нужно выполнять в окно обслуживания. Индекс строится конкурентно, как
+в 0003; прерванное построение оставляет индекс INVALID, его нужно
+удалить и повторить миграцию.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 18:40:00
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+revision: str = "0004"
+down_revision: Union[str, None] = "0003"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "tweets",
+        sa.Column(
+            "search_vector",
+            postgresql.TSVECTOR(),
+            sa.Computed("to_tsvector('russian', content)", persisted=True),
+            nullable=False,
+        ),
+    )
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_tweets_search_vector",
+            "tweets",
+            ["search_vector"],
+            postgresql_using="gin",
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_tweets_search_vector",
+            table_name="tweets",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
+    op.drop_column("tweets", "search_vector")
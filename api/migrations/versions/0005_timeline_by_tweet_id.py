@@ -0,0 +1,84 @@
+"""Ленты упорядочены по неизменному ключу tweet_id
+
+Ранг home_timeline.score повторял likes_count и переписывался в лентах
+всех подписчиков при каждом лайке, а открытые курсоры смещались. Лента
+читается по первичному ключу (user_id, tweet_id), поэтому столбец score
+и индекс (user_id, score, tweet_id) удаляются. Частичный индекс
+популярных авторов перестраивается под порядок (author_id, id).
+
+Индексы строятся и удаляются конкурентно, как в 0003; прерванное
+построение оставляет индекс INVALID, его нужно удалить и повторить
+миграцию.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 21:10:00
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+revision: str = "0005"
+down_revision: Union[str, None] = "0004"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_tweets_author_id_id_not_fanned_out",
+            "tweets",
+            ["author_id", "id"],
+            postgresql_where=sa.text("NOT fanned_out"),
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.drop_index(
+            "ix_tweets_author_id_not_fanned_out",
+            table_name="tweets",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
+        op.drop_index(
+            "ix_home_timeline_user_id_score",
+            table_name="home_timeline",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
+    op.drop_column("home_timeline", "score")
+
+
+def downgrade() -> None:
+    op.add_column(
+        "home_timeline",
+        sa.Column("score", sa.Integer(), server_default="0", nullable=False),
+    )
+    op.execute("""
+        UPDATE home_timeline SET score = tweets.likes_count
+        FROM tweets WHERE tweets.id = home_timeline.tweet_id
+        """)
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_home_timeline_user_id_score",
+            "home_timeline",
+            ["user_id", "score", "tweet_id"],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.create_index(
+            "ix_tweets_author_id_not_fanned_out",
+            "tweets",
+            ["author_id", "likes_count", "id"],
+            postgresql_where=sa.text("NOT fanned_out"),
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.drop_index(
+            "ix_tweets_author_id_id_not_fanned_out",
+            table_name="tweets",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
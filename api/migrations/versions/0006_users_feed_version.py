@@ -0,0 +1,32 @@
+"""Версия ленты пользователя users.feed_version
+
+Счётчик увеличивается при подписке, отписке и удалении твита из ленты.
+Вместе со старшими id ленты он даёт отпечаток для ETag ленты без сборки
+страницы. Столбец со значением по умолчанию добавляется без перезаписи
+таблицы.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18 22:30:00
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+revision: str = "0006"
+down_revision: Union[str, None] = "0005"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "users",
+        sa.Column("feed_version", sa.Integer(), server_default="0", nullable=False),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("users", "feed_version")
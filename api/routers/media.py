@@ -1,16 +1,15 @@
-import os
-import uuid
-
-import aiofiles
-from fastapi import APIRouter, Depends, UploadFile, status
+from fastapi import APIRouter, BackgroundTasks, Depends, UploadFile, status
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from api.config.config import MEDIA_FOLDER, logger
+from api.config.log import get_logger
 from api.config.schemas import PostMedia
 from api.database.database import get_async_session
 from api.function.media_func import post_media
+from api.function.media_storage import save_upload
+from api.function.media_variants import process_media
 
 media_router = APIRouter(tags=["Работа с медиаданными"])
+logger = get_logger("routers")
 
 
 @media_router.post(
@@ -21,14 +20,13 @@ media_router = APIRouter(tags=["Работа с медиаданными"])
     description="Загрузка медиа данных",
 )
 async def upload_file(
-    file: UploadFile, session: AsyncSession = Depends(get_async_session)
+    file: UploadFile,
+    background_tasks: BackgroundTasks,
+    session: AsyncSession = Depends(get_async_session),
 ):
-    file_id = str(uuid.uuid4()) + "." + ".".join(file.filename.split(".")[-1:])
-    file.filename = file_id
-    contents = await file.read()
-    path1 = os.path.join(MEDIA_FOLDER, file.filename)
-    async with aiofiles.open(path1, mode="wb") as f:
-        await f.write(contents)
-        await file.close()
+    stored = await save_upload(file)
+    result = await post_media(stored=stored, session=session)
+    # Уменьшенные копии создаются после ответа в пуле процессов
+    background_tasks.add_task(process_media, result["media_id"])
     logger.info("Запрос на загрузку медиафайла выполнен")
-    return await post_media(file=file.filename, session=session)
+    return result
@@ -0,0 +1,18 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from api.function.metrics import registry
+
+metrics_router = APIRouter(tags=["Метрики"])
+
+
+@metrics_router.get(
+    "/metrics",
+    response_class=PlainTextResponse,
+    name="Метрики приложения",
+    description="Метрики приложения в текстовом формате Prometheus",
+)
+async def get_metrics() -> PlainTextResponse:
+    return PlainTextResponse(
+        registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
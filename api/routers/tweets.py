@@ -1,19 +1,25 @@
-from typing import Dict, List
+from typing import Dict, Union
 
-from fastapi import APIRouter, Depends, status
+from fastapi import APIRouter, Depends, Response, status
+from fastapi.responses import StreamingResponse
 
-from api.config.config import logger
-from api.config.models import Tweet
-from api.config.schemas import MSG, GetTweet, TweetResp
+from api.config.config import settings
+from api.config.log import get_logger
+from api.config.responses import fast_response
+from api.config.schemas import MSG, BatchResult, GetTweet, SearchResult, TweetResp
+from api.function.realtime import Subscriber, event_stream, open_stream
+from api.function.search import search_tweets
 from api.function.tweet_func import (
     del_like_tweet,
     delete_tweet,
     get_tweet_func,
     post_tweet_func,
     set_like_tweet,
+    set_like_tweets,
 )
 
 tweets_router = APIRouter(tags=["Работа с твитами"])
+logger = get_logger("routers")
 
 
 @tweets_router.get(
@@ -23,9 +29,49 @@ tweets_router = APIRouter(tags=["Работа с твитами"])
     name="Получение ленты с твитами",
     description="Получение ленты с твитами пользователя по API-ключу",
 )
-async def get_tweet(tweets: List[Tweet] = Depends(get_tweet_func)) -> Dict:
+async def get_tweet(
+    response: Response, feed: Dict = Depends(get_tweet_func)
+) -> Union[Dict, Response]:
     logger.info("Запрос на получение ленты с твитами выполнен")
-    return {"result": "true", "tweets": tweets}
+    return fast_response(GetTweet, {"result": True, **feed}, response)
+
+
+@tweets_router.get(
+    "/api/tweets/search",
+    status_code=status.HTTP_200_OK,
+    response_model=SearchResult,
+    name="Поиск твитов",
+    description=(
+        "Полнотекстовый поиск твитов по релевантности с подсветкой совпадений "
+        "и страницами по курсору"
+    ),
+)
+async def search_tweet(
+    response: Response, result: Dict = Depends(search_tweets)
+) -> Union[Dict, Response]:
+    logger.info("Запрос на поиск твитов выполнен")
+    return fast_response(SearchResult, {"result": True, **result}, response)
+
+
+@tweets_router.get(
+    "/api/tweets/stream",
+    status_code=status.HTTP_200_OK,
+    response_class=StreamingResponse,
+    name="Поток новых твитов и лайков",
+    description=(
+        "События о новых твитах и лайках авторов из подписок пользователя "
+        "в формате Server-Sent Events по API-ключу"
+    ),
+)
+async def stream_tweets(
+    subscriber: Subscriber = Depends(open_stream),
+) -> StreamingResponse:
+    logger.info("Поток событий открыт")
+    return StreamingResponse(
+        event_stream(subscriber, settings.STREAM_HEARTBEAT),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @tweets_router.post(
@@ -52,6 +98,18 @@ async def delete_tweets(result: MSG = Depends(delete_tweet)) -> MSG:
     return result
 
 
+@tweets_router.post(
+    "/api/tweets/likes:batch",
+    status_code=status.HTTP_200_OK,
+    response_model=BatchResult,
+    name="Установка отметки «Нравится» на несколько твитов",
+    description="Установка отметки «Нравится» на твиты по списку id одним запросом",
+)
+async def post_like_tweets(result: Dict = Depends(set_like_tweets)) -> Dict:
+    logger.info("Запрос на установку лайков для твитов выполнен")
+    return result
+
+
 @tweets_router.post(
     "/api/tweets/{tweet_id}/likes",
     status_code=status.HTTP_200_OK,
@@ -1,18 +1,23 @@
-from typing import Dict
+from typing import Dict, List, Union
 
-from fastapi import APIRouter, Depends, status
+from fastapi import APIRouter, Depends, Response, status
 
-from api.config.config import logger
-from api.config.models import User
-from api.config.schemas import MSG, GetUser
+from api.config.log import get_logger
+from api.config.responses import fast_response
+from api.config.schemas import MSG, BatchResult, GetFollows, GetUser, GetUsers
 from api.function.user_func import (
+    get_current_user_profile,
+    get_followers,
+    get_following,
     get_user_by_id,
-    get_user_by_token,
+    get_users_by_ids,
     user_follow,
+    user_follow_many,
     user_unfollow,
 )
 
 user_router = APIRouter(tags=["Работа с пользователями"])
+logger = get_logger("routers")
 
 
 @user_router.get(
@@ -22,9 +27,26 @@ user_router = APIRouter(tags=["Работа с пользователями"])
     description="Получение информации о своём профиле",
     name="Получение информации о своём профиле по API-ключу",
 )
-async def get_users_me(current_user: User = Depends(get_user_by_token)) -> Dict:
+async def get_users_me(
+    response: Response,
+    current_user: Dict = Depends(get_current_user_profile),
+) -> Union[Dict, Response]:
     logger.info("Запрос информации о пользователе по api ключу выполнен")
-    return {"result": True, "user": current_user}
+    return fast_response(GetUser, {"result": True, "user": current_user}, response)
+
+
+@user_router.get(
+    "/api/users",
+    status_code=status.HTTP_200_OK,
+    response_model=GetUsers,
+    name="Получение информации о нескольких профилях по их id",
+    description="Получение профилей по списку id: ?ids=1,2,3",
+)
+async def get_users_batch(
+    users: List[Dict] = Depends(get_users_by_ids),
+) -> Union[Dict, Response]:
+    logger.info("Запрос информации о пользователях по списку id выполнен")
+    return fast_response(GetUsers, {"result": True, "users": users})
 
 
 @user_router.get(
@@ -34,9 +56,51 @@ async def get_users_me(current_user: User = Depends(get_user_by_token)) -> Dict:
     name="Получение информации о произвольном профиле по его id",
     description="Получение информации о произвольном профиле по его id",
 )
-async def get_users(current_user: User = Depends(get_user_by_id)) -> Dict:
+async def get_users(
+    response: Response, current_user: Dict = Depends(get_user_by_id)
+) -> Union[Dict, Response]:
     logger.info("Запрос информации о пользователе по id выполнен")
-    return {"result": True, "user": current_user}
+    return fast_response(GetUser, {"result": True, "user": current_user}, response)
+
+
+@user_router.get(
+    "/api/users/{user_id}/followers",
+    status_code=status.HTTP_200_OK,
+    response_model=GetFollows,
+    name="Получение подписчиков пользователя",
+    description="Получение подписчиков пользователя по его id с курсорной пагинацией",
+)
+async def get_users_followers(
+    page: Dict = Depends(get_followers),
+) -> Union[Dict, Response]:
+    logger.info("Запрос подписчиков пользователя по id выполнен")
+    return fast_response(GetFollows, {"result": True, **page})
+
+
+@user_router.get(
+    "/api/users/{user_id}/following",
+    status_code=status.HTTP_200_OK,
+    response_model=GetFollows,
+    name="Получение подписок пользователя",
+    description="Получение подписок пользователя по его id с курсорной пагинацией",
+)
+async def get_users_following(
+    page: Dict = Depends(get_following),
+) -> Union[Dict, Response]:
+    logger.info("Запрос подписок пользователя по id выполнен")
+    return fast_response(GetFollows, {"result": True, **page})
+
+
+@user_router.post(
+    "/api/users/follow:batch",
+    status_code=status.HTTP_200_OK,
+    response_model=BatchResult,
+    name="Подписка на нескольких пользователей",
+    description="Подписка на пользователей по списку id одним запросом",
+)
+async def follow_users_batch(result: Dict = Depends(user_follow_many)) -> Dict:
+    logger.info("Подписка на пользователей по списку id выполнена")
+    return result
 
 
 @user_router.post(
@@ -0,0 +1,114 @@
+"""Пропускная способность сериализации ленты из 500 твитов.
+
+Сравниваются три способа превратить словарь ленты в тело ответа:
+  fastapi - стандартный путь: валидация по response_model, дамп в объекты
+            Python и json.dumps в JSONResponse;
+  adapter - fast_response без orjson: одна проверка и dump_json через
+            скомпилированный TypeAdapter;
+  orjson  - fast_response с orjson: сериализация без валидации.
+
+    python benchmarks/bench_feed_json.py --tweets 500 --rounds 200
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+for name, value in {
+    "DB_USERNAME": "bench",
+    "DB_PASSWORD": "bench",
+    "DB_HOST": "localhost",
+    "DB_PORT": "5432",
+    "DB_NAME": "bench",
+}.items():
+    os.environ.setdefault(name, value)
+
+
+def make_feed(tweets: int) -> dict:
+    feed = []
+    for i in range(tweets):
+        links = [f"{i:064x}.jpg", f"{i + 1:064x}.png"]
+        feed.append(
+            {
+                "id": i,
+                "content": f"Твит номер {i} " * 8,
+                "attachments": links,
+                "attachment_variants": [
+                    {
+                        "link": link,
+                        "width": 1920,
+                        "height": 1080,
+                        "variants": {
+                            "thumb": {"link": link, "width": 320, "height": 180},
+                        },
+                    }
+                    for link in links
+                ],
+                "author": {"id": i % 100, "name": f"user_{i % 100}"},
+                "likes": [{"user_id": j, "name": f"user_{j}"} for j in range(i % 20)],
+            }
+        )
+    return {"result": True, "tweets": feed, "next_cursor": "MTAwOjUwMA"}
+
+
+def measure(name: str, render, rounds: int, size: int) -> None:
+    render()
+    start = time.perf_counter()
+    for _ in range(rounds):
+        body = render()
+    elapsed = time.perf_counter() - start
+    print(
+        f"{name:8} {rounds / elapsed:9.1f} ответов/с "
+        f"{elapsed / rounds * 1000:8.2f} мс/ответ {len(body) / 1024:8.1f} КБ "
+        f"x{size} твитов"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tweets", type=int, default=500)
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+
+    from fastapi.responses import JSONResponse
+    from fastapi.routing import serialize_response
+    from fastapi.utils import create_response_field
+
+    from api.config import responses
+    from api.config.schemas import GetTweet
+
+    content = make_feed(args.tweets)
+    field = create_response_field(name="response", type_=GetTweet)
+    loop = asyncio.new_event_loop()
+
+    def fastapi_path() -> bytes:
+        value = loop.run_until_complete(
+            serialize_response(field=field, response_content=content)
+        )
+        return JSONResponse(value).body
+
+    adapter = responses.get_adapter(GetTweet)
+
+    def adapter_path() -> bytes:
+        return adapter.dump_json(adapter.validate_python(content))
+
+    measure("fastapi", fastapi_path, args.rounds, args.tweets)
+    measure("adapter", adapter_path, args.rounds, args.tweets)
+    if responses.orjson is not None:
+        measure(
+            "orjson",
+            lambda: responses.ORJSONResponse(content).body,
+            args.rounds,
+            args.tweets,
+        )
+    else:
+        print("orjson не установлен, замер пропущен")
+    loop.close()
+
+
+if __name__ == "__main__":
+    main()
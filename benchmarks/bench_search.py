@@ -0,0 +1,119 @@
+"""Время поиска по твитам в зависимости от размера таблицы tweets.
+
+Таблица растёт до каждого размера из --sizes случайными текстами со
+словарём по закону Ципфа. Замеряется медиана времени первой страницы:
+
+    needle - редкое слово, совпадений всегда --needles: индекс GIN
+             находит их без просмотра таблицы, время почти не растёт;
+    common - частое слово, число совпадений растёт вместе с таблицей, и
+             ts_rank считается для каждого совпадения;
+    ilike  - прежний способ content ILIKE '%...%' для редкого слова,
+             просмотр всей таблицы.
+
+    python benchmarks/bench_search.py --sizes 10000 100000 1000000
+
+ВНИМАНИЕ: схема в БД из настроек приложения пересоздаётся, все таблицы
+приложения очищаются.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+NEEDLE = "иголка"
+
+
+async def grow(conn, start: int, end: int, vocabulary: int) -> None:
+    from sqlalchemy import text
+
+    # Номер слова exp(random * ln V) распределён логарифмически равномерно:
+    # частота k-го слова обратно пропорциональна k. Условие на n делает
+    # подзапрос коррелированным, иначе текст вычисляется один раз на всех
+    await conn.execute(
+        text("""
+            INSERT INTO tweets (author_id, content)
+            SELECT 1, (
+                SELECT string_agg(
+                    'w' || floor(exp(random() * ln(CAST(:vocabulary AS float8))))::int, ' '
+                )
+                FROM generate_series(1, 12) AS word
+                WHERE n > 0
+            )
+            FROM generate_series(:start, :end) AS n
+            """),
+        {"start": start + 1, "end": end, "vocabulary": vocabulary},
+    )
+
+
+async def timed(session, query, repeat: int) -> float:
+    await session.execute(query)
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        (await session.execute(query)).all()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples) * 1000
+
+
+async def run(args: argparse.Namespace) -> None:
+    from sqlalchemy import insert, select, text
+
+    from api.config.models import Tweet, User
+    from api.database.database import Base, async_session_maker, engine
+    from api.function.search import build_search_query
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.execute(insert(User).values(id=1, name="bench", api_key="bench"))
+        await conn.execute(
+            insert(Tweet),
+            [
+                {"author_id": 1, "content": f"w1 {NEEDLE} w2 {i}"}
+                for i in range(args.needles)
+            ],
+        )
+
+    queries = {
+        "needle_ms": build_search_query(NEEDLE, limit=args.limit + 1),
+        "common_ms": build_search_query("w1", limit=args.limit + 1),
+        "ilike_ms": select(Tweet.id, Tweet.content)
+        .where(Tweet.content.ilike(f"%{NEEDLE}%"))
+        .order_by(Tweet.id.desc())
+        .limit(args.limit + 1),
+    }
+    size = args.needles
+    for target in sorted(args.sizes):
+        async with engine.begin() as conn:
+            await grow(conn, size, target, args.vocabulary)
+        size = max(size, target)
+        async with engine.connect() as conn:
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            await conn.execute(text("VACUUM ANALYZE tweets"))
+
+        report = {"tweets": size}
+        async with async_session_maker() as session:
+            for name, query in queries.items():
+                report[name] = round(await timed(session, query, args.repeat), 2)
+        print(json.dumps(report))
+    await engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--needles", type=int, default=20)
+    parser.add_argument("--vocabulary", type=int, default=50000)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=20)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""Память и время рассылки для простаивающих потоков событий одного воркера.
+
+Без --url замер идёт в процессе: N подписчиков EventHub, у каждого своя
+задача, читающая event_stream, как у StreamingResponse. Выводятся память
+на подписчика (tracemalloc) и время доставки одного события всем N.
+
+С --url открываются N соединений к запущенному серверу (один воркер) с
+ключом --api-key; выводится число принятых потоков, память воркера
+смотрится снаружи (ps, /metrics).
+
+    python benchmarks/bench_sse_idle.py --connections 10000
+    python benchmarks/bench_sse_idle.py --url http://localhost:8000 --api-key test
+"""
+
+import argparse
+import asyncio
+import gc
+import json
+import os
+import resource
+import sys
+import time
+import tracemalloc
+from urllib.parse import urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+for name, value in {
+    "DB_USERNAME": "bench",
+    "DB_PASSWORD": "bench",
+    "DB_HOST": "localhost",
+    "DB_PORT": "5432",
+    "DB_NAME": "bench",
+}.items():
+    os.environ.setdefault(name, value)
+
+AUTHOR_ID = 1
+
+
+class OpenConnection:
+    @staticmethod
+    def is_closed() -> bool:
+        return False
+
+
+async def consume(stream, received: asyncio.Queue) -> None:
+    async for chunk in stream:
+        if chunk.startswith("event: tweet"):
+            received.put_nowait(time.perf_counter())
+
+
+async def run_in_process(connections: int, heartbeat: float) -> None:
+    from api.function import realtime
+    from api.function.realtime import EventHub, event_stream, tweet_event
+
+    hub = EventHub("postgresql://bench", queue_size=100, max_subscribers=connections)
+    hub._connection = OpenConnection()
+    realtime.hub = hub
+    received: asyncio.Queue = asyncio.Queue()
+
+    gc.collect()
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    tasks = []
+    for user_id in range(connections):
+        subscriber = await hub.subscribe(user_id + 2, [AUTHOR_ID])
+        stream = event_stream(subscriber, heartbeat)
+        tasks.append(asyncio.create_task(consume(stream, received)))
+    # Все задачи дошли до ожидания события
+    await asyncio.sleep(0.1)
+    gc.collect()
+    idle = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    hub.dispatch(tweet_event(1, AUTHOR_ID))
+    last = start
+    for _ in range(connections):
+        last = max(last, await received.get())
+
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    print(
+        json.dumps(
+            {
+                "mode": "in-process",
+                "connections": connections,
+                "bytes_per_connection": idle // connections,
+                "fanout_ms": round((last - start) * 1000, 2),
+                "subscribers_left": len(hub.subscribers),
+            }
+        )
+    )
+
+
+async def open_stream(host: str, port: int, api_key: str) -> asyncio.StreamWriter:
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(
+        (
+            "GET /api/tweets/stream HTTP/1.1\r\n"
+            f"Host: {host}\r\napi-key: {api_key}\r\n"
+            "Accept: text/event-stream\r\n\r\n"
+        ).encode()
+    )
+    status = await reader.readline()
+    if b" 200 " not in status:
+        writer.close()
+        raise ConnectionError(status.decode().strip())
+    return writer
+
+
+async def run_against_server(
+    url: str, api_key: str, connections: int, hold: float
+) -> None:
+    parsed = urlparse(url)
+    host, port = parsed.hostname, parsed.port or 80
+    start = time.perf_counter()
+    results = []
+    # Пачками, чтобы не упереться в очередь accept сервера
+    for offset in range(0, connections, 500):
+        batch = min(500, connections - offset)
+        results += await asyncio.gather(
+            *(open_stream(host, port, api_key) for _ in range(batch)),
+            return_exceptions=True,
+        )
+    opened = [writer for writer in results if isinstance(writer, asyncio.StreamWriter)]
+    errors = {}
+    for error in results:
+        if isinstance(error, Exception):
+            errors[str(error)] = errors.get(str(error), 0) + 1
+    print(
+        json.dumps(
+            {
+                "mode": "server",
+                "connections": connections,
+                "opened": len(opened),
+                "connect_s": round(time.perf_counter() - start, 2),
+                "errors": errors,
+            },
+            ensure_ascii=False,
+        )
+    )
+    await asyncio.sleep(hold)
+    for writer in opened:
+        writer.close()
+
+
+def raise_fd_limit(connections: int) -> None:
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    wanted = connections + 1024
+    if soft < wanted:
+        limit = wanted if hard == resource.RLIM_INFINITY else min(wanted, hard)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (limit, hard))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--connections", type=int, default=10000)
+    parser.add_argument("--heartbeat", type=float, default=15)
+    parser.add_argument("--url")
+    parser.add_argument("--api-key", default="test")
+    parser.add_argument("--hold", type=float, default=30, help="секунд простоя")
+    args = parser.parse_args()
+
+    if args.url:
+        raise_fd_limit(args.connections)
+        asyncio.run(
+            run_against_server(args.url, args.api_key, args.connections, args.hold)
+        )
+    else:
+        asyncio.run(run_in_process(args.connections, args.heartbeat))
+
+
+if __name__ == "__main__":
+    main()
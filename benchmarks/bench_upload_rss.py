@@ -0,0 +1,97 @@
+"""Пиковое потребление памяти (RSS) при сохранении загруженного файла.
+
+Каждый замер выполняется в отдельном процессе, чтобы пик RSS одного
+размера не влиял на другой. Режим buffered повторяет прежнюю реализацию
+(file.read() целиком и запись одним блоком), режим streaming - save_upload.
+
+    python benchmarks/bench_upload_rss.py --sizes 16 64 256
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+for name, value in {
+    "DB_USERNAME": "bench",
+    "DB_PASSWORD": "bench",
+    "DB_HOST": "localhost",
+    "DB_PORT": "5432",
+    "DB_NAME": "bench",
+}.items():
+    os.environ.setdefault(name, value)
+
+MB = 1024 * 1024
+
+
+def make_upload(size_mb: int):
+    from starlette.datastructures import Headers, UploadFile
+
+    spooled = tempfile.SpooledTemporaryFile(max_size=MB)
+    chunk = os.urandom(MB)
+    for _ in range(size_mb):
+        spooled.write(chunk)
+    spooled.seek(0)
+    return UploadFile(
+        spooled,
+        size=size_mb * MB,
+        filename="video.mp4",
+        headers=Headers({"content-type": "video/mp4"}),
+    )
+
+
+async def run_once(mode: str, size_mb: int, folder: str) -> None:
+    from api.config.config import settings
+    from api.function import media_storage
+
+    settings.MEDIA_MAX_SIZE = (size_mb + 1) * MB
+    media_storage.MEDIA_FOLDER = folder
+    upload = make_upload(size_mb)
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    if mode == "buffered":
+        contents = await upload.read()
+        with open(os.path.join(folder, "buffered.bin"), "wb") as f:
+            f.write(contents)
+        del contents
+    else:
+        await media_storage.save_upload(upload)
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(
+        json.dumps({"mode": mode, "size_mb": size_mb, "rss_delta_kb": peak - baseline})
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[16, 64, 256])
+    parser.add_argument("--child", nargs=2, metavar=("MODE", "SIZE"))
+    args = parser.parse_args()
+
+    if args.child:
+        with tempfile.TemporaryDirectory() as folder:
+            asyncio.run(run_once(args.child[0], int(args.child[1]), folder))
+        return
+
+    print(f"{'mode':<10}{'size, MB':>10}{'peak RSS delta, MB':>22}")
+    for mode in ("buffered", "streaming"):
+        for size_mb in args.sizes:
+            output = subprocess.run(
+                [sys.executable, __file__, "--child", mode, str(size_mb)],
+                check=True,
+                capture_output=True,
+                text=True,
+            ).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            print(f"{mode:<10}{size_mb:>10}{result['rss_delta_kb'] / 1024:>22.1f}")
+
+
+if __name__ == "__main__":
+    main()
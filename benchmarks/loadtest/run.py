@@ -0,0 +1,302 @@
+"""Нагрузочный тест приложения на смешанной нагрузке чтения и записи.
+
+Запускает настоящее ASGI-приложение в процессе (httpx без сети) поверх
+БД, заполненной benchmarks/loadtest/seed.py. Клиенты работают параллельно
+от имени случайных пользователей синтетического набора; выбор операции
+задаётся весами MIX. Для каждого эндпоинта выводятся p50/p95/p99
+задержки и число запросов в секунду, результат сохраняется в JSON.
+
+    python benchmarks/loadtest/run.py --clients 32 --duration 60 \\
+        --output results.json --baseline baseline.json
+
+Сравнение с базовым прогоном показывает изменение p95 и RPS в процентах.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+sys.path.insert(
+    0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+)
+
+# Доли операций в смешанной нагрузке
+MIX = {
+    "feed": 60,
+    "profile": 10,
+    "follow_list": 5,
+    "post_tweet": 8,
+    "like": 12,
+    "follow": 5,
+}
+
+
+class Dataset:
+    def __init__(self, users: int, tweets: int):
+        self.users = users
+        self.tweets = tweets
+
+
+class Stats:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+
+    def record(self, endpoint: str, elapsed: float, status_code: int) -> None:
+        self.latencies[endpoint].append(elapsed)
+        if status_code >= 400:
+            self.errors[endpoint] += 1
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Перцентиль по ближайшему рангу для отсортированного списка"""
+    index = max(0, min(len(values) - 1, int(round(q / 100 * len(values))) - 1))
+    return values[index]
+
+
+def summarize(latencies: List[float], errors: int, duration: float) -> Dict:
+    ordered = sorted(latencies)
+    return {
+        "count": len(ordered),
+        "errors": errors,
+        "rps": round(len(ordered) / duration, 2),
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 2),
+        "p50_ms": round(percentile(ordered, 50) * 1000, 2),
+        "p95_ms": round(percentile(ordered, 95) * 1000, 2),
+        "p99_ms": round(percentile(ordered, 99) * 1000, 2),
+    }
+
+
+async def call(client, stats: Stats, endpoint: str, method: str, url: str, **kw):
+    start = time.perf_counter()
+    response = await client.request(method, url, **kw)
+    stats.record(endpoint, time.perf_counter() - start, response.status_code)
+    return response
+
+
+async def run_operation(
+    client, stats: Stats, rng: random.Random, data: Dataset, operation: str
+) -> None:
+    from api.config.generator import bench_api_key
+
+    user_id = rng.randint(1, data.users)
+    headers = {"api-key": bench_api_key(user_id)}
+    other_id = rng.randint(1, data.users)
+
+    if operation == "feed":
+        await call(
+            client, stats, "GET /api/tweets", "GET", "/api/tweets", headers=headers
+        )
+    elif operation == "profile":
+        await call(
+            client,
+            stats,
+            "GET /api/users/{user_id}",
+            "GET",
+            f"/api/users/{other_id}",
+            headers=headers,
+        )
+    elif operation == "follow_list":
+        await call(
+            client,
+            stats,
+            "GET /api/users/{user_id}/followers",
+            "GET",
+            f"/api/users/{other_id}/followers",
+            headers=headers,
+        )
+    elif operation == "post_tweet":
+        await call(
+            client,
+            stats,
+            "POST /api/tweets",
+            "POST",
+            "/api/tweets",
+            headers=headers,
+            json={"tweet_data": f"нагрузочный твит {rng.random()}"},
+        )
+    elif operation == "like":
+        url = f"/api/tweets/{rng.randint(1, data.tweets)}/likes"
+        response = await call(
+            client, stats, "POST /api/tweets/{id}/likes", "POST", url, headers=headers
+        )
+        if response.status_code == 200:
+            await call(
+                client,
+                stats,
+                "DELETE /api/tweets/{id}/likes",
+                "DELETE",
+                url,
+                headers=headers,
+            )
+    elif operation == "follow" and other_id != user_id:
+        url = f"/api/users/{other_id}/follow"
+        response = await call(
+            client, stats, "POST /api/users/{id}/follow", "POST", url, headers=headers
+        )
+        if response.status_code == 200:
+            await call(
+                client,
+                stats,
+                "DELETE /api/users/{id}/follow",
+                "DELETE",
+                url,
+                headers=headers,
+            )
+
+
+async def worker(
+    client, stats: Stats, data: Dataset, seed: int, deadline: float
+) -> None:
+    rng = random.Random(seed)
+    operations = list(MIX)
+    weights = list(MIX.values())
+    while time.perf_counter() < deadline:
+        operation = rng.choices(operations, weights=weights)[0]
+        await run_operation(client, stats, rng, data, operation)
+
+
+async def load_dataset() -> Dataset:
+    from sqlalchemy import func, select
+
+    from api.config.models import Tweet, User
+    from api.database.database import async_session_maker
+
+    async with async_session_maker() as session:
+        users = await session.scalar(select(func.max(User.id)))
+        tweets = await session.scalar(select(func.max(Tweet.id)))
+    if not users or not tweets:
+        raise SystemExit("БД пуста, сначала запустите benchmarks/loadtest/seed.py")
+    return Dataset(users=users, tweets=tweets)
+
+
+async def run(args: argparse.Namespace) -> Dict:
+    from httpx import AsyncClient
+
+    from api.database.database import engine
+    from api.main import app
+
+    data = await load_dataset()
+    stats = Stats()
+    async with AsyncClient(app=app, base_url="http://loadtest") as client:
+        warmup_deadline = time.perf_counter() + args.warmup
+        await asyncio.gather(
+            *(
+                worker(
+                    client, Stats(), data, -args.seed * 1000 - i - 1, warmup_deadline
+                )
+                for i in range(args.clients)
+            )
+        )
+        started = time.perf_counter()
+        deadline = started + args.duration
+        await asyncio.gather(
+            *(
+                worker(client, stats, data, args.seed * 1000 + i, deadline)
+                for i in range(args.clients)
+            )
+        )
+        duration = time.perf_counter() - started
+    await engine.dispose()
+
+    endpoints = {
+        endpoint: summarize(latencies, stats.errors[endpoint], duration)
+        for endpoint, latencies in sorted(stats.latencies.items())
+    }
+    everything = [value for values in stats.latencies.values() for value in values]
+    return {
+        "meta": {
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "clients": args.clients,
+            "duration": args.duration,
+            "seed": args.seed,
+            "users": data.users,
+            "tweets": data.tweets,
+            "mix": MIX,
+        },
+        "total": summarize(everything, sum(stats.errors.values()), duration),
+        "endpoints": endpoints,
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def delta(current: float, previous: Optional[float]) -> str:
+    if not previous:
+        return ""
+    return f"{(current - previous) / previous * 100:+.1f}%"
+
+
+def report(result: Dict, baseline: Optional[Dict]) -> None:
+    rows = list(result["endpoints"].items()) + [("ВСЕГО", result["total"])]
+    previous = dict((baseline or {}).get("endpoints", {}))
+    if baseline:
+        previous["ВСЕГО"] = baseline.get("total", {})
+
+    header = f"{'эндпоинт':<36}{'n':>8}{'ошибок':>8}{'rps':>9}"
+    header += f"{'p50':>9}{'p95':>9}{'p99':>9}"
+    if baseline:
+        header += f"{'Δp95':>9}{'Δrps':>9}"
+    print(header)
+    for endpoint, row in rows:
+        line = f"{endpoint:<36}{row['count']:>8}{row['errors']:>8}{row['rps']:>9}"
+        line += f"{row['p50_ms']:>9}{row['p95_ms']:>9}{row['p99_ms']:>9}"
+        if baseline:
+            old = previous.get(endpoint, {})
+            line += f"{delta(row['p95_ms'], old.get('p95_ms')):>9}"
+            line += f"{delta(row['rps'], old.get('rps')):>9}"
+        print(line)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=60)
+    parser.add_argument("--warmup", type=float, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="куда сохранить результат в JSON")
+    parser.add_argument("--baseline", help="JSON прошлого прогона для сравнения")
+    parser.add_argument("--log-level", default="WARNING")
+    args = parser.parse_args()
+
+    # Журнал каждого запроса искажает задержки сильнее, чем сама нагрузка
+    from api.config.log import APP_LOGGER
+
+    logging.getLogger(APP_LOGGER).setLevel(args.log_level)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    result = asyncio.run(run(args))
+    report(result, baseline)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Загрузка синтетического набора данных для нагрузочного теста.
+
+Пересоздаёт схему в БД из настроек приложения (api/config/.env или
+переменные окружения DB_*) и заполняет её графом со степенным
+распределением популярности. Запуск с теми же параметрами и --seed
+даёт те же данные, поэтому результаты прогонов можно сравнивать.
+
+    python benchmarks/loadtest/seed.py --users 10000 --tweets 50000
+
+ВНИМАНИЕ: все таблицы приложения в целевой БД очищаются.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from typing import Dict
+
+sys.path.insert(
+    0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+)
+
+
+async def seed(args: argparse.Namespace) -> Dict:
+    from sqlalchemy import func, select
+
+    from api.config.config import settings
+    from api.config.generator import generate_social_graph
+    from api.config.models import HomeTimeline
+    from api.database.database import Base, engine
+    from api.jobs.bulk_load import bulk_load
+
+    started = time.perf_counter()
+    graph = generate_social_graph(
+        users=args.users,
+        avg_following=args.avg_following,
+        tweets=args.tweets,
+        likes=args.likes,
+        media=args.media,
+        alpha=args.alpha,
+        seed=args.seed,
+        fanout_threshold=settings.TIMELINE_FANOUT_THRESHOLD,
+    )
+    generated = time.perf_counter()
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+    await bulk_load(
+        {
+            "users": graph.users,
+            "followers_tbl": graph.follows,
+            "tweets": graph.tweets,
+            "likes": graph.likes,
+            "medias": graph.media,
+        }
+    )
+
+    # bulk_load заполняет и home_timeline
+    async with engine.connect() as conn:
+        timeline_rows = await conn.scalar(
+            select(func.count()).select_from(HomeTimeline)
+        )
+    await engine.dispose()
+
+    return {
+        "users": len(graph.users),
+        "follows": len(graph.follows),
+        "tweets": len(graph.tweets),
+        "likes": len(graph.likes),
+        "media": len(graph.media),
+        "home_timeline": timeline_rows,
+        "generate_seconds": round(generated - started, 2),
+        "load_seconds": round(time.perf_counter() - generated, 2),
+    }
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--avg-following", type=int, default=50)
+    parser.add_argument("--tweets", type=int, default=50000)
+    parser.add_argument("--likes", type=int, default=200000)
+    parser.add_argument("--media", type=int, default=10000)
+    parser.add_argument("--alpha", type=float, default=1.1)
+    parser.add_argument("--seed", type=int, default=0)
+    return parser
+
+
+def main() -> None:
+    args = build_parser().parse_args()
+    print(json.dumps(asyncio.run(seed(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
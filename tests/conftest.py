@@ -3,12 +3,15 @@ from typing import Mapping
 
 import pytest
 import pytest_asyncio
-from api.database.database import Base, get_async_session
+from api.database.database import Base, get_async_session, get_read_session
 from fastapi import FastAPI
 from httpx import AsyncClient
 from api.main import app
 from api.config.models import User, Tweet, follower_tbl
 from api.config.config import settings
+from api.function.metrics import instrument_engine
+from api.function.feed_cache import MemoryBackend, feed_cache
+from api.function.user_func import auth_cache
 from sqlalchemy import insert
 from sqlalchemy.ext.asyncio import (
     AsyncSession,
@@ -16,6 +19,8 @@ from sqlalchemy.ext.asyncio import (
     create_async_engine,
 )
 
+pytest_plugins = ["query_budget"]
+
 TEST_USERNAME = "Test"
 TEST_API_KEY = "test"
 TEST_SERVER_PORT = 8000
@@ -24,29 +29,40 @@ TEST_SERVER_PORT = 8000
 async def db_session() -> AsyncGenerator[AsyncSession, None]:
     DATABASE_URL = settings.get_db_url()
     engine = create_async_engine(DATABASE_URL, echo=True)
+    instrument_engine(engine.sync_engine)
     async_session = async_sessionmaker(engine, expire_on_commit=False)
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.drop_all)
         await conn.run_sync(Base.metadata.create_all)
     async with async_session() as session:
-        test_user = User(api_key=TEST_API_KEY, name=TEST_USERNAME)
+        # Пользователь 1 подписан на 2 и 3, счётчики совпадают с подписками
+        test_user = User(
+            api_key=TEST_API_KEY, name=TEST_USERNAME, following_count=2
+        )
         session.add(test_user)
         fake_users = [
-            User(api_key=f"fake_api_key{i}", name=f"fake_user{i}")
+            User(
+                api_key=f"fake_api_key{i}",
+                name=f"fake_user{i}",
+                followers_count=1 if i < 3 else 0,
+            )
             for i in range(1, 5)
         ]
         session.add_all(fake_users)
-        for i in range(2,4):
-            session.execute(insert(follower_tbl).values(
-                    follower_id=1, following_id=i
-                ))
-            session.commit()
+        await session.flush()
+        await session.execute(
+            insert(follower_tbl),
+            [{"follower_id": 1, "following_id": i} for i in range(2, 4)],
+        )
 
         tweets = [
             Tweet(author_id = i , content = f"random tweet text {i}")
             for i in range(1,5)
         ]
         session.add_all(tweets)
+        # Данные фикстуры записаны до первого HTTP-запроса и не попадают
+        # в его бюджет запросов
+        await session.commit()
         yield session
         await session.close()
 
@@ -54,7 +70,12 @@ async def db_session() -> AsyncGenerator[AsyncSession, None]:
 @pytest.fixture()
 def test_app(db_session: AsyncSession) -> FastAPI:
     """Create a test app with overridden dependencies."""
+    auth_cache.clear()
+    if isinstance(feed_cache.backend, MemoryBackend):
+        feed_cache.backend.clear()
+    feed_cache._authors.clear()
     app.dependency_overrides[get_async_session] = lambda: db_session
+    app.dependency_overrides[get_read_session] = lambda: db_session
     return app
 
 
@@ -0,0 +1,120 @@
+"""
+Плагин pytest для проверки числа SQL-запросов на один HTTP-запрос.
+
+    @pytest.mark.query_budget(statements=2)
+    async def test_get_feed(client): ...
+
+    @pytest.mark.query_budget(statements=3, rows=50)
+
+Запросы относятся к HTTP-запросу через контекст MetricsMiddleware, поэтому
+запросы фикстур и проверок внутри теста в бюджет не попадают. Если бюджет
+превышен хотя бы одним HTTP-запросом теста, тест падает со списком его SQL.
+"""
+
+from typing import Dict, List, Optional
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from api.function.metrics import RequestDBStats, request_db_stats
+
+
+class RequestQueries:
+    def __init__(self, number: int, stats: RequestDBStats):
+        self.number = number
+        # Ссылка держит объект живым, чтобы его id не достался другому запросу
+        self.stats = stats
+        self.statements: List[str] = []
+        self.rows = 0
+
+
+class QueryRecorder:
+    """Сбор SQL всех движков, сгруппированный по HTTP-запросам"""
+
+    def __init__(self):
+        self.requests: Dict[int, RequestQueries] = {}
+
+    def _current(self) -> Optional[RequestQueries]:
+        stats = request_db_stats.get()
+        if stats is None:
+            return None
+        key = id(stats)
+        if key not in self.requests:
+            self.requests[key] = RequestQueries(len(self.requests) + 1, stats)
+        return self.requests[key]
+
+    def before_cursor_execute(
+        self, conn, cursor, statement, parameters, context, executemany
+    ):
+        current = self._current()
+        if current is not None:
+            current.statements.append(" ".join(statement.split()))
+
+    def after_cursor_execute(
+        self, conn, cursor, statement, parameters, context, executemany
+    ):
+        current = self._current()
+        if current is not None and cursor.description is not None:
+            current.rows += max(cursor.rowcount, 0)
+
+    def __enter__(self) -> "QueryRecorder":
+        event.listen(Engine, "before_cursor_execute", self.before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", self.after_cursor_execute)
+        return self
+
+    def __exit__(self, *exc) -> None:
+        event.remove(Engine, "before_cursor_execute", self.before_cursor_execute)
+        event.remove(Engine, "after_cursor_execute", self.after_cursor_execute)
+
+    def violations(
+        self, statements: Optional[int] = None, rows: Optional[int] = None
+    ) -> List[str]:
+        messages = []
+        for request in self.requests.values():
+            over_statements = (
+                statements is not None and len(request.statements) > statements
+            )
+            over_rows = rows is not None and request.rows > rows
+            if not (over_statements or over_rows):
+                continue
+            sql = "\n".join(
+                f"    {i}. {statement}"
+                for i, statement in enumerate(request.statements, start=1)
+            )
+            messages.append(
+                f"HTTP-запрос #{request.number}: {len(request.statements)} SQL "
+                f"(бюджет {statements}), строк {request.rows} (бюджет {rows})\n{sql}"
+            )
+        return messages
+
+
+def pytest_configure(config):
+    config.addinivalue_line(
+        "markers",
+        "query_budget(statements=None, rows=None): "
+        "наибольшее число SQL-запросов и полученных строк на один HTTP-запрос",
+    )
+
+
+@pytest.fixture()
+def query_recorder():
+    """Сбор SQL по HTTP-запросам для проверок внутри теста"""
+    with QueryRecorder() as recorder:
+        yield recorder
+
+
+@pytest.hookimpl(wrapper=True)
+def pytest_runtest_call(item):
+    marker = item.get_closest_marker("query_budget")
+    if marker is None:
+        return (yield)
+
+    with QueryRecorder() as recorder:
+        result = yield
+    violations = recorder.violations(**marker.kwargs)
+    if violations:
+        pytest.fail(
+            "Превышен бюджет SQL-запросов:\n" + "\n".join(violations), pytrace=False
+        )
+    return result
@@ -0,0 +1,168 @@
+import asyncio
+
+import pytest
+from fastapi import FastAPI, HTTPException, Request, Response
+from httpx import AsyncClient
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+
+from api.config.config import settings
+from api.config.exceptions import Error_DB
+from api.database.database import get_async_session
+from api.function import admission
+from api.function.admission import (
+    ADMISSION_SHED,
+    AdmissionLimiter,
+    AdmissionMiddleware,
+    build_limiters,
+    route_class,
+)
+from api.function.metrics import REQUEST_COUNT, MetricsMiddleware
+
+
+def make_scope(method: str, path: str) -> dict:
+    return {"type": "http", "method": method, "path": path, "headers": []}
+
+
+class SlowApp:
+    """ASGI-приложение, отвечающее после сигнала release"""
+
+    def __init__(self):
+        self.release = asyncio.Event()
+
+    async def __call__(self, scope, receive, send):
+        await self.release.wait()
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+
+class TestAdmissionLimiter:
+    @pytest.mark.asyncio
+    async def test_admits_up_to_limit(self):
+        limiter = AdmissionLimiter("read", limit=2, queue_size=0, max_wait=0.1)
+        assert await limiter.acquire() is None
+        assert await limiter.acquire() is None
+        assert await limiter.acquire() == "queue_full"
+        limiter.release(0.01)
+        assert await limiter.acquire() is None
+
+    @pytest.mark.asyncio
+    async def test_waits_in_queue(self):
+        limiter = AdmissionLimiter("read", limit=1, queue_size=1, max_wait=1)
+        assert await limiter.acquire() is None
+        waiter = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        assert limiter.waiting == 1
+        limiter.release(0.01)
+        assert await waiter is None
+        assert limiter.waiting == 0
+
+    @pytest.mark.asyncio
+    async def test_times_out(self):
+        limiter = AdmissionLimiter("read", limit=1, queue_size=1, max_wait=0.01)
+        assert await limiter.acquire() is None
+        assert await limiter.acquire() == "timeout"
+        assert limiter.waiting == 0
+
+    @pytest.mark.asyncio
+    async def test_sheds_when_wait_exceeds_deadline(self):
+        limiter = AdmissionLimiter("read", limit=1, queue_size=10, max_wait=0.5)
+        limiter.service_time = 2
+        assert await limiter.acquire() is None
+        # Ожидание оценивается в 2 с, что дольше max_wait: отказ без очереди
+        assert await limiter.acquire() == "deadline"
+        assert limiter.waiting == 0
+        assert limiter.retry_after() == 2
+
+    def test_route_class(self):
+        assert route_class(make_scope("GET", "/api/tweets")) == "read"
+        assert route_class(make_scope("POST", "/api/tweets/1/likes")) == "write"
+        assert route_class(make_scope("POST", "/api/medias")) == "media"
+        assert route_class(make_scope("GET", "/metrics")) is None
+        assert route_class(make_scope("GET", "/api/tweets/stream")) is None
+
+    def test_warns_when_limits_exceed_pool(self, monkeypatch):
+        warnings = []
+        monkeypatch.setattr(
+            admission.logger, "warning", lambda *args: warnings.append(args)
+        )
+        monkeypatch.setattr(settings, "ADMISSION_LIMITS", {"read": 10, "write": 5})
+        monkeypatch.setattr(settings, "DB_POOL_SIZE", 10)
+        monkeypatch.setattr(settings, "DB_MAX_OVERFLOW", 5)
+        build_limiters()
+        assert not warnings
+
+        monkeypatch.setattr(settings, "DB_MAX_OVERFLOW", 4)
+        build_limiters()
+        assert len(warnings) == 1
+
+
+class TestAdmissionMiddleware:
+    @pytest.mark.asyncio
+    async def test_rejects_with_retry_after(self):
+        app = SlowApp()
+        limiter = AdmissionLimiter("read", limit=1, queue_size=0, max_wait=0.1)
+        middleware = AdmissionMiddleware(app, limiters={"read": limiter})
+        shed_before = ADMISSION_SHED.values.get(("read", "queue_full"), 0)
+
+        async with AsyncClient(app=middleware, base_url="http://test") as client:
+            admitted = asyncio.create_task(client.get("/api/tweets"))
+            await asyncio.sleep(0.01)
+            rejected = await client.get("/api/tweets")
+            app.release.set()
+            assert (await admitted).status_code == 200
+
+        assert rejected.status_code == 503
+        assert rejected.headers["retry-after"] == "1"
+        assert rejected.json()["error_type"] == "Service Unavailable"
+        assert ADMISSION_SHED.values[("read", "queue_full")] == shed_before + 1
+
+    @pytest.mark.asyncio
+    async def test_unlimited_paths_pass(self):
+        app = SlowApp()
+        app.release.set()
+        middleware = AdmissionMiddleware(app, limiters={})
+        async with AsyncClient(app=middleware, base_url="http://test") as client:
+            assert (await client.get("/metrics")).status_code == 200
+
+
+    @pytest.mark.asyncio
+    async def test_rejected_request_keeps_route_label(self):
+        limiter = AdmissionLimiter("read", limit=1, queue_size=0, max_wait=0.1)
+        assert await limiter.acquire() is None
+        app = FastAPI()
+
+        @app.get("/api/tweets/{tweet_id}")
+        async def get_tweet(tweet_id: int) -> dict:
+            return {}
+
+        app.add_middleware(AdmissionMiddleware, limiters={"read": limiter})
+        app.add_middleware(MetricsMiddleware)
+        labels = ("GET", "/api/tweets/{tweet_id}", "503")
+        before = REQUEST_COUNT.values.get(labels, 0)
+
+        async with AsyncClient(app=app, base_url="http://test") as client:
+            assert (await client.get("/api/tweets/7")).status_code == 503
+        assert REQUEST_COUNT.values[labels] == before + 1
+
+
+class TestSessionErrors:
+    @staticmethod
+    def make_request() -> Request:
+        return Request(make_scope("GET", "/api/tweets"))
+
+    @pytest.mark.asyncio
+    async def test_http_exception_is_not_wrapped(self):
+        sessions = get_async_session(self.make_request(), Response())
+        await sessions.__anext__()
+        with pytest.raises(HTTPException) as error:
+            await sessions.athrow(HTTPException(status_code=404, detail="нет"))
+        assert error.value.status_code == 404
+
+    @pytest.mark.asyncio
+    async def test_pool_timeout_is_503(self):
+        sessions = get_async_session(self.make_request(), Response())
+        await sessions.__anext__()
+        with pytest.raises(Error_DB) as error:
+            await sessions.athrow(PoolTimeoutError("QueuePool limit"))
+        assert error.value.code == 503
+        assert error.value.headers == {"Retry-After": "1"}
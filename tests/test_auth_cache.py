@@ -0,0 +1,60 @@
+import pytest
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from api.config.schemas import AuthUser
+from api.function.cache import AuthCache, TTLCache
+from api.function.user_func import auth_cache, get_user_by_token
+
+
+class TestTTLCache:
+    def test_lru_eviction(self):
+        cache = TTLCache(maxsize=2, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        assert cache.get("a") == 1
+        cache.set("c", 3)
+
+        assert cache.get("b") is None
+        assert cache.get("a") == 1
+        assert cache.stats()["evictions"] == 1
+
+    def test_expired_entry_is_miss(self):
+        cache = TTLCache(maxsize=2, ttl=-1)
+        cache.set("a", 1)
+
+        assert cache.get("a") is None
+        assert cache.stats() == {"size": 0, "hits": 0, "misses": 1, "evictions": 0}
+
+    def test_invalidate_user(self):
+        cache = AuthCache(maxsize=10, ttl=60)
+        cache.set("key", AuthUser(id=1, name="Test", following_ids=(2,)))
+        cache.set("other", AuthUser(id=2, name="Other"))
+        cache.invalidate_user(1)
+
+        assert cache.get("key") is None
+        assert cache.get("other") is not None
+
+
+class TestAuthCacheAPI:
+    @pytest.mark.asyncio
+    async def test_repeated_auth_hits_cache(self, client: AsyncClient):
+        assert (await client.get("/users/me")).status_code == 200
+        hits = auth_cache.hits
+        assert (await client.get("/users/me")).status_code == 200
+        assert auth_cache.hits == hits + 1
+
+    @pytest.mark.asyncio
+    async def test_follow_invalidates_cache(self, client: AsyncClient):
+        assert (await client.get("/users/me")).status_code == 200
+        assert auth_cache.get("test") is not None
+        assert (await client.post("/users/5/follow")).status_code == 200
+        assert auth_cache.get("test") is None
+
+    @pytest.mark.asyncio
+    async def test_lookup_releases_connection(self, db_session: AsyncSession):
+        auth_cache.clear()
+        user = await get_user_by_token(token="test", session=db_session)
+        assert user.name == "Test"
+        # Транзакция завершена, соединение вернулось в пул
+        assert not db_session.in_transaction()
@@ -0,0 +1,68 @@
+import pytest
+
+from api.jobs import bulk_load
+from api.jobs.bulk_load import (
+    TABLES,
+    read_records,
+    rebuild_derived,
+    secondary_indexes,
+    to_rows,
+)
+
+
+class TestBulkLoad:
+    def test_csv_and_ndjson_rows(self, tmp_path):
+        csv_file = tmp_path / "tweets.csv"
+        csv_file.write_text(
+            "id,author_id,content,fanned_out\n1,2,привет,true\n2,3,,0\n",
+            encoding="utf-8",
+        )
+        ndjson_file = tmp_path / "tweets.ndjson"
+        ndjson_file.write_text(
+            '{"id": 1, "author_id": 2, "content": "привет", "fanned_out": true}\n'
+            '{"id": 2, "author_id": 3, "content": null, "fanned_out": false}\n',
+            encoding="utf-8",
+        )
+        expected = [(1, 2, "привет", True), (2, 3, None, False)]
+        for path in (csv_file, ndjson_file):
+            columns, rows = to_rows(TABLES["tweets"], read_records(str(path)))
+            assert columns == ["id", "author_id", "content", "fanned_out"]
+            assert list(rows) == expected
+
+    def test_unknown_format(self, tmp_path):
+        with pytest.raises(ValueError):
+            read_records(str(tmp_path / "users.xml"))
+
+    def test_unique_indexes_kept(self):
+        names = [index.name for index in secondary_indexes(TABLES["tweets"])]
+        assert "ix_tweets_author_id_likes_count" in names
+        assert all(not index.unique for index in secondary_indexes(TABLES["users"]))
+
+    @pytest.mark.asyncio
+    async def test_rebuild_derived_fills_missing_counters(self, monkeypatch):
+        calls = []
+        for name in ("recount_likes", "recount_follows", "backfill_timelines"):
+
+            async def record(conn, name=name):
+                calls.append(name)
+
+            monkeypatch.setattr(bulk_load, name, record)
+
+        # Файлы подписок и лайков без счётчиков: пересчёт и ленты
+        await rebuild_derived(
+            None, {"followers_tbl": {"follower_id", "following_id"}, "likes": set()}
+        )
+        assert calls == ["recount_likes", "recount_follows", "backfill_timelines"]
+
+        # Сгенерированные данные уже содержат счётчики: только ленты
+        calls.clear()
+        await rebuild_derived(
+            None,
+            {
+                "users": {"id", "followers_count", "following_count"},
+                "followers_tbl": {"follower_id", "following_id"},
+                "tweets": {"id", "likes_count"},
+                "likes": {"tweet_id", "user_id"},
+            },
+        )
+        assert calls == ["backfill_timelines"]
@@ -0,0 +1,56 @@
+import pytest
+from fastapi import Request, Response
+
+from api.config.exceptions import NotModified
+from api.database.database import get_async_session, get_read_session
+from api.function.etag import check_not_modified, etag_matches, make_etag
+
+
+def make_request(if_none_match: str) -> Request:
+    return Request(
+        {
+            "type": "http",
+            "method": "GET",
+            "path": "/api/tweets",
+            "headers": [(b"if-none-match", if_none_match.encode())],
+        }
+    )
+
+
+class TestETag:
+    def test_etag_depends_on_every_part(self):
+        assert make_etag("feed", 1, 20, None) == make_etag("feed", 1, 20, None)
+        assert make_etag("feed", 1, 20, None) != make_etag("feed", 1, 10, None)
+        assert make_etag("feed", 1, 20, None) != make_etag("user", 1, 20, None)
+        assert make_etag("x").startswith('W/"')
+
+    def test_weak_comparison_and_lists(self):
+        etag = make_etag("user", 1)
+        strong = etag.removeprefix("W/")
+        assert etag_matches(etag, etag)
+        assert etag_matches(strong, etag)
+        assert etag_matches(f'"other", {etag}', etag)
+        assert etag_matches("*", etag)
+        assert not etag_matches('"other"', etag)
+
+    def test_check_not_modified(self):
+        etag = make_etag("user", 1)
+        with pytest.raises(NotModified) as error:
+            check_not_modified(make_request(etag), etag)
+        assert error.value.etag == etag
+        check_not_modified(make_request('"other"'), etag)
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize(
+        "dependency",
+        [lambda request: get_async_session(request, Response()), get_read_session],
+        ids=["get_async_session", "get_read_session"],
+    )
+    async def test_session_dependencies_pass_not_modified(self, dependency):
+        # Настоящие генераторы сессий, а не подмена из conftest
+        sessions = dependency(make_request('"x"'))
+        await sessions.__anext__()
+        with pytest.raises(NotModified) as error:
+            await sessions.athrow(NotModified('W/"x"'))
+        assert error.value.status_code == 304
+        assert error.value.headers == {"ETag": 'W/"x"'}
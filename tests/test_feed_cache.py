@@ -0,0 +1,282 @@
+import asyncio
+
+import pytest
+
+from api.config.schemas import AuthUser
+from redis.exceptions import AuthenticationError, ResponseError
+
+from api.function.feed_cache import FeedCache, MemoryBackend, RedisBackend
+
+USER = AuthUser(id=1, name="Test", following_ids=(2, 3))
+
+
+class FollowingLoader:
+    """Подписки из "БД": их меняют тесты, а не кэш авторизации"""
+
+    def __init__(self, *following_ids):
+        self.following_ids = list(following_ids)
+        self.calls = 0
+
+    async def __call__(self, user_id):
+        self.calls += 1
+        return self.following_ids
+
+
+def make_cache(backend, ttl=30, stale_ttl=0, following=None):
+    return FeedCache(
+        backend,
+        ttl=ttl,
+        stale_ttl=stale_ttl,
+        load_following=following or FollowingLoader(2, 3),
+    )
+
+
+class FakeRedis:
+    """Локальный сервер с командами Redis: AUTH, GET, SET, MGET, INCRBY"""
+
+    def __init__(self, password=None):
+        self.data = {}
+        self.password = password
+        # Задержка ответа на GET, чтобы прервать чтение посреди пакета
+        self.delay = 0
+        self.server = None
+        self.clients = set()
+
+    async def start(self) -> int:
+        self.server = await asyncio.start_server(self.handle, "127.0.0.1", 0)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def stop(self) -> None:
+        self.server.close()
+        for client in self.clients:
+            client.cancel()
+        await asyncio.gather(*self.clients, return_exceptions=True)
+        await self.server.wait_closed()
+
+    @staticmethod
+    def bulk(value) -> bytes:
+        if value is None:
+            return b"$-1\r\n"
+        return b"$%d\r\n%s\r\n" % (len(value), value)
+
+    async def read_command(self, reader):
+        header = await reader.readline()
+        if not header:
+            return None
+        args = []
+        for _ in range(int(header[1:-2])):
+            length = int((await reader.readline())[1:-2])
+            args.append((await reader.readexactly(length + 2))[:-2])
+        return args
+
+    async def handle(self, reader, writer):
+        self.clients.add(asyncio.current_task())
+        while True:
+            args = await self.read_command(reader)
+            if args is None:
+                break
+            name = args[0].upper()
+            if name == b"AUTH":
+                if args[1].decode() == self.password:
+                    reply = b"+OK\r\n"
+                else:
+                    reply = b"-WRONGPASS invalid password\r\n"
+            elif name == b"GET":
+                await asyncio.sleep(self.delay)
+                reply = self.bulk(self.data.get(args[1]))
+            elif name == b"SET":
+                self.data[args[1]] = args[2]
+                reply = b"+OK\r\n"
+            elif name == b"MGET":
+                values = [self.bulk(self.data.get(key)) for key in args[1:]]
+                reply = b"*%d\r\n" % len(values) + b"".join(values)
+            elif name == b"INCRBY":
+                value = int(self.data.get(args[1], b"0")) + int(args[2])
+                self.data[args[1]] = str(value).encode()
+                reply = b":%d\r\n" % value
+            else:
+                reply = b"-ERR unknown command\r\n"
+            writer.write(reply)
+            await writer.drain()
+        writer.close()
+
+
+class CountingLoader:
+    def __init__(self):
+        self.calls = 0
+
+    async def __call__(self, session):
+        self.calls += 1
+        return {"tweets": [], "next_cursor": None, "call": self.calls}
+
+
+class TestMemoryBackend:
+    @pytest.mark.asyncio
+    async def test_ttl_is_per_entry(self):
+        backend = MemoryBackend(maxsize=100)
+        await backend.set("short", b"1", ttl=0.01)
+        await backend.set("long", b"2", ttl=30)
+        await asyncio.sleep(0.05)
+        assert await backend.get("short") is None
+        assert await backend.get("long") == b"2"
+
+
+class TestFeedCache:
+    @pytest.mark.asyncio
+    async def test_hit_until_author_version_changes(self):
+        cache = make_cache(MemoryBackend(maxsize=100))
+        load = CountingLoader()
+        assert (await cache.get_feed(USER, 20, None, load))[0]["call"] == 1
+        assert (await cache.get_feed(USER, 20, None, load))[0]["call"] == 1
+
+        # Автор не из ленты пользователя не влияет на кэш
+        await cache.bump(authors=[4])
+        assert (await cache.get_feed(USER, 20, None, load))[0]["call"] == 1
+
+        await cache.bump(authors=[2])
+        assert (await cache.get_feed(USER, 20, None, load))[0]["call"] == 2
+
+    @pytest.mark.asyncio
+    async def test_pages_are_cached_separately(self):
+        cache = make_cache(MemoryBackend(maxsize=100))
+        load = CountingLoader()
+        await cache.get_feed(USER, 20, None, load)
+        await cache.get_feed(USER, 20, "cursor", load)
+        await cache.get_feed(USER, 10, None, load)
+        assert load.calls == 3
+
+    @pytest.mark.asyncio
+    async def test_stale_served_while_single_refresh_runs(self):
+        cache = make_cache(MemoryBackend(maxsize=100), stale_ttl=60)
+        load = CountingLoader()
+        await cache.get_feed(USER, 20, None, load)
+        await cache.bump(authors=[3])
+
+        stale = await asyncio.gather(
+            *(cache.get_feed(USER, 20, None, load) for _ in range(5))
+        )
+        assert [feed["call"] for feed, _ in stale] == [1] * 5
+        await asyncio.gather(*cache._refreshing.values())
+        assert load.calls == 2
+        assert (await cache.get_feed(USER, 20, None, load))[0]["call"] == 2
+
+    @pytest.mark.asyncio
+    async def test_own_write_skips_stale_entry(self):
+        cache = make_cache(MemoryBackend(maxsize=100), stale_ttl=60)
+        load = CountingLoader()
+        await cache.get_feed(USER, 20, None, load)
+        await cache.bump(users=[USER.id], authors=[USER.id])
+        assert (await cache.get_feed(USER, 20, None, load))[0]["call"] == 2
+        assert not cache._refreshing
+
+    @pytest.mark.asyncio
+    async def test_follow_in_other_worker_refreshes_authors(self):
+        # Два воркера с общим хранилищем версий; кэш авторизации первого
+        # не знает о новой подписке
+        backend = MemoryBackend(maxsize=100)
+        following = FollowingLoader(2, 3)
+        first = make_cache(backend, following=following)
+        second = make_cache(backend, following=following)
+        load = CountingLoader()
+        await first.get_feed(USER, 20, None, load)
+        await first.get_feed(USER, 20, None, load)
+        assert following.calls == 1
+
+        following.following_ids.append(4)
+        await second.bump(users=[USER.id])
+        assert (await first.get_feed(USER, 20, None, load))[0]["call"] == 2
+        assert following.calls == 2
+
+        await second.bump(authors=[4])
+        assert (await first.get_feed(USER, 20, None, load))[0]["call"] == 3
+
+    @pytest.mark.asyncio
+    async def test_disabled_cache_always_loads(self):
+        cache = make_cache(None, stale_ttl=60)
+        load = CountingLoader()
+        await cache.get_feed(USER, 20, None, load)
+        await cache.get_feed(USER, 20, None, load)
+        await cache.bump(users=[1])
+        assert load.calls == 2
+
+
+class TestRedisBackend:
+    @pytest.mark.asyncio
+    async def test_feed_cache_over_redis(self):
+        server = FakeRedis()
+        port = await server.start()
+        backend = RedisBackend(f"redis://127.0.0.1:{port}/0")
+        cache = make_cache(backend)
+        load = CountingLoader()
+        try:
+            await cache.get_feed(USER, 20, None, load)
+            await cache.get_feed(USER, 20, None, load)
+            assert load.calls == 1
+
+            await cache.bump(authors=[2, 3])
+            assert await backend.get_versions(
+                ["feed:v:author:2", "feed:v:author:3", "feed:v:author:4"]
+            ) == [1, 1, 0]
+            await cache.get_feed(USER, 20, None, load)
+            assert load.calls == 2
+        finally:
+            await cache.close()
+            await server.stop()
+
+    @pytest.mark.asyncio
+    async def test_unavailable_redis_falls_back_to_db(self):
+        server = FakeRedis()
+        port = await server.start()
+        await server.stop()
+        backend = RedisBackend(f"redis://127.0.0.1:{port}/0", timeout=0.5)
+        cache = make_cache(backend)
+        load = CountingLoader()
+        assert (await cache.get_feed(USER, 20, None, load))[0]["call"] == 1
+        await cache.bump(users=[1])
+        await cache.close()
+
+    @pytest.mark.asyncio
+    async def test_wrong_password_is_rejected(self):
+        server = FakeRedis(password="secret")
+        port = await server.start()
+        backend = RedisBackend(f"redis://:wrong@127.0.0.1:{port}/0")
+        try:
+            with pytest.raises(AuthenticationError):
+                await backend.get("key")
+        finally:
+            await backend.close()
+            await server.stop()
+
+    @pytest.mark.asyncio
+    async def test_cancelled_read_does_not_shift_replies(self):
+        server = FakeRedis()
+        server.data = {b"a": b"1", b"b": b"2"}
+        port = await server.start()
+        backend = RedisBackend(f"redis://127.0.0.1:{port}/0")
+        try:
+            server.delay = 0.2
+            pending = asyncio.create_task(backend.get("a"))
+            await asyncio.sleep(0.05)
+            pending.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await pending
+
+            server.delay = 0
+            assert await backend.get("b") == b"2"
+        finally:
+            await backend.close()
+            await server.stop()
+
+    @pytest.mark.asyncio
+    async def test_error_reply_keeps_connection(self):
+        server = FakeRedis()
+        server.data = {b"a": b"1", b"b": b"2"}
+        port = await server.start()
+        backend = RedisBackend(f"redis://127.0.0.1:{port}/0")
+        try:
+            with pytest.raises(ResponseError):
+                await backend.client.execute_command("UNKNOWN")
+            assert await backend.get("b") == b"2"
+        finally:
+            await backend.close()
+            await server.stop()
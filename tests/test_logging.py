@@ -0,0 +1,33 @@
+import json
+import logging
+
+from api.config.log import JSONFormatter, SamplingFilter
+
+
+def make_record(name: str, level: int = logging.INFO, **extra) -> logging.LogRecord:
+    record = logging.LogRecord(name, level, __file__, 1, "твит %s", (7,), None)
+    record.__dict__.update(extra)
+    return record
+
+
+class TestLogging:
+    def test_json_formatter(self):
+        line = JSONFormatter().format(make_record("TWITTER-BACKEND", user_id=3))
+        entry = json.loads(line)
+        assert entry["message"] == "твит 7"
+        assert entry["level"] == "INFO"
+        assert entry["logger"] == "TWITTER-BACKEND"
+        assert entry["user_id"] == 3
+
+    def test_sampling_by_logger_name(self):
+        sampler = SamplingFilter(
+            {"TWITTER-BACKEND": 1.0, "TWITTER-BACKEND.routers": 0.0}
+        )
+        assert sampler.filter(make_record("TWITTER-BACKEND"))
+        assert not sampler.filter(make_record("TWITTER-BACKEND.routers"))
+        assert sampler.rate_for("TWITTER-BACKEND.routers.users") == 0.0
+        assert sampler.rate_for("TWITTER-BACKENDX") == 1.0
+
+    def test_sampling_keeps_warnings(self):
+        sampler = SamplingFilter({"TWITTER-BACKEND": 0.0})
+        assert sampler.filter(make_record("TWITTER-BACKEND", logging.ERROR))
@@ -1,7 +1,23 @@
+import hashlib
+import os
+import tempfile
 import pytest
 from httpx import AsyncClient
 from io import BytesIO
 from api.config.schemas import PostMedia, ErrorMSG
+from api.config.models import MediaBlob
+from api.function import media_func
+from api.function.media_cleanup import DeferredUnlinker, unlink_unreferenced
+from api.function.media_func import acquire_blob, release_blobs
+from api.function.media_storage import (
+    CHUNK_SIZE,
+    FileTooLarge,
+    StoredFile,
+    copy_stream,
+)
+from api.function.media_variants import original_link, render_variants, variant_link
+from api.jobs.media_gc import list_stale_files
+from sqlalchemy.ext.asyncio import AsyncSession
 
 class TestMediaAPI:
     @classmethod
@@ -12,6 +28,7 @@ class TestMediaAPI:
         cls.wrong_file = {"file" : ("photo.jpg")}
         cls.base_url = "/medias"
 
+    @pytest.mark.query_budget(statements=4)
     @pytest.mark.asyncio
     @pytest.mark.asyncio
     async def test_media_route(self, client: AsyncClient):
@@ -31,4 +48,129 @@ class TestMediaAPI:
             )
             assert response.status_code == 401
             assert response.json()["result"] == False
-            assert ErrorMSG(**response.json())
\ No newline at end of file
+            assert ErrorMSG(**response.json())
+
+class TestMediaStreaming:
+    @pytest.mark.asyncio
+    async def test_unsupported_type(self, client: AsyncClient):
+        files = {"file": ("script.sh", BytesIO(b"echo"), "text/x-shellscript")}
+        response = await client.post("/medias", files=files)
+        assert response.status_code == 415
+        assert ErrorMSG(**response.json())
+
+    def test_copy_stream_checksum(self, tmp_path):
+        data = b"x" * (3 * CHUNK_SIZE + 7)
+        source = tempfile.SpooledTemporaryFile(max_size=CHUNK_SIZE)
+        source.write(data)
+        target = tmp_path / "copy.bin"
+
+        size, sha256 = copy_stream(source, str(target), max_size=len(data))
+
+        assert size == len(data)
+        assert sha256 == hashlib.sha256(data).hexdigest()
+        assert target.read_bytes() == data
+
+    def test_copy_stream_size_limit(self, tmp_path):
+        source = BytesIO(b"x" * 10)
+        with pytest.raises(FileTooLarge):
+            copy_stream(source, str(tmp_path / "copy.bin"), max_size=5)
+
+
+class TestContentAddressedMedia:
+    @pytest.mark.asyncio
+    async def test_blob_reference_counting(self, db_session: AsyncSession):
+        sha256 = hashlib.sha256(b"meme").hexdigest()
+        stored = StoredFile(name=f"{sha256}.jpg", size=4, sha256=sha256)
+
+        assert await acquire_blob(session=db_session, stored=stored) == stored.name
+        assert await acquire_blob(session=db_session, stored=stored) == stored.name
+        blob = await db_session.get(MediaBlob, sha256)
+        await db_session.refresh(blob)
+        assert blob.ref_count == 2
+
+        assert await release_blobs(session=db_session, hashes=[sha256]) == []
+        assert await release_blobs(session=db_session, hashes=[sha256]) == [
+            stored.name
+        ]
+
+    @pytest.mark.asyncio
+    async def test_upload_is_put_in_place_under_lock(
+        self, db_session: AsyncSession, tmp_path, monkeypatch
+    ):
+        monkeypatch.setattr(media_func, "MEDIA_FOLDER", str(tmp_path))
+        sha256 = hashlib.sha256(b"meme").hexdigest()
+        for attempt in range(2):
+            tmp = tmp_path / f".upload{attempt}.part"
+            tmp.write_bytes(b"meme")
+            stored = StoredFile(
+                name=f"{sha256}.jpg", size=4, sha256=sha256, tmp_path=str(tmp)
+            )
+            assert await acquire_blob(session=db_session, stored=stored) == stored.name
+            await db_session.commit()
+            # Файл кладётся на место и при повторной загрузке
+            assert not tmp.exists()
+            assert (tmp_path / stored.name).read_bytes() == b"meme"
+
+
+class TestMediaCleanup:
+    @pytest.mark.asyncio
+    async def test_unlinker_removes_in_batches(self, tmp_path):
+        batches = []
+
+        async def remove(folder, links):
+            batches.append(list(links))
+            return len(links)
+
+        unlinker = DeferredUnlinker(folder=str(tmp_path), batch_size=2, remove=remove)
+        unlinker.submit(["a.jpg", "b.jpg", "c.jpg"])
+        await unlinker.wait()
+
+        assert batches == [["a.jpg", "b.jpg"], ["c.jpg"]]
+
+    @pytest.mark.asyncio
+    async def test_unlink_skips_referenced_files(
+        self, db_session: AsyncSession, tmp_path
+    ):
+        for name in ("unused.jpg", "reused.jpg", "reused_thumb.jpg"):
+            (tmp_path / name).write_bytes(b"x")
+        db_session.add(MediaBlob(sha256="0" * 64, link="reused.jpg", size=1))
+        await db_session.commit()
+
+        removed = await unlink_unreferenced(
+            str(tmp_path), ["unused.jpg", "reused.jpg", "reused_thumb.jpg", "missing.jpg"]
+        )
+
+        assert removed == 1
+        assert not (tmp_path / "unused.jpg").exists()
+        assert (tmp_path / "reused.jpg").exists()
+        assert (tmp_path / "reused_thumb.jpg").exists()
+
+    def test_list_stale_files(self, tmp_path):
+        stale = tmp_path / "stale.jpg"
+        stale.write_bytes(b"x")
+        os.utime(stale, (0, 0))
+        (tmp_path / "fresh.jpg").write_bytes(b"x")
+
+        assert list_stale_files(str(tmp_path), min_age=60) == ["stale.jpg"]
+
+
+class TestMediaVariants:
+    def test_variant_names(self):
+        link = variant_link("abc.jpg", "thumb")
+        assert link == "abc_thumb.jpg"
+        assert original_link(link) == "abc.jpg"
+        assert original_link("abc.jpg") == "abc.jpg"
+
+    def test_render_variants(self, tmp_path):
+        Image = pytest.importorskip("PIL.Image")
+        Image.new("RGB", (2000, 1000)).save(tmp_path / "photo.jpg", format="JPEG")
+
+        info = render_variants(
+            str(tmp_path), "photo.jpg", {"thumb": 320, "medium": 4000}
+        )
+        assert (info["width"], info["height"]) == (2000, 1000)
+        thumb = info["variants"]["thumb"]
+        assert thumb["link"] == "photo_thumb.jpg"
+        assert (thumb["width"], thumb["height"]) == (320, 160)
+        assert (tmp_path / "photo_thumb.jpg").exists()
+        assert info["variants"]["medium"]["link"] == "photo.jpg"
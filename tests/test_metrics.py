@@ -0,0 +1,50 @@
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import create_engine, text
+
+from api.function.metrics import (
+    Histogram,
+    RequestDBStats,
+    instrument_engine,
+    request_db_stats,
+)
+from api.main import app
+
+
+class TestMetrics:
+    def test_histogram_render(self):
+        histogram = Histogram("latency", "Задержка", labels=("route",), buckets=(1, 5))
+        histogram.observe(0.5, "/a")
+        histogram.observe(3, "/a")
+        lines = histogram.render().splitlines()
+        assert 'latency_bucket{route="/a",le="1"} 1' in lines
+        assert 'latency_bucket{route="/a",le="5"} 2' in lines
+        assert 'latency_bucket{route="/a",le="+Inf"} 2' in lines
+        assert 'latency_count{route="/a"} 2' in lines
+
+    def test_engine_query_stats(self):
+        engine = create_engine("sqlite://")
+        instrument_engine(engine)
+        stats = RequestDBStats()
+        token = request_db_stats.set(stats)
+        try:
+            with engine.connect() as conn:
+                conn.execute(text("select 1"))
+                with pytest.raises(Exception):
+                    conn.execute(text("select * from missing"))
+                conn.execute(text("select 2"))
+        finally:
+            request_db_stats.reset(token)
+        assert stats.queries == 2
+        assert not engine.pool.connect().info.get("query_start")
+
+    @pytest.mark.asyncio
+    async def test_metrics_endpoint(self):
+        async with AsyncClient(app=app, base_url="http://test") as client:
+            await client.get("/metrics")
+            response = await client.get("/metrics")
+        assert response.status_code == 200
+        body = response.text
+        assert 'http_requests_total{method="GET",route="/metrics",status="200"}' in body
+        assert "db_pool_checked_out" in body
+        assert "http_requests_in_flight" in body
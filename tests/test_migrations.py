@@ -0,0 +1,28 @@
+import os
+
+from alembic.config import Config
+from alembic.script import ScriptDirectory
+
+from api.database.database import Base
+
+ALEMBIC_INI = os.path.join(os.path.dirname(__file__), "..", "api", "alembic.ini")
+
+
+class TestMigrations:
+    def test_single_head(self):
+        script = ScriptDirectory.from_config(Config(ALEMBIC_INI))
+        assert len(script.get_heads()) == 1
+
+    def test_model_indexes_have_migrations(self):
+        script = ScriptDirectory.from_config(Config(ALEMBIC_INI))
+        sources = ""
+        for revision in script.walk_revisions():
+            with open(revision.path, encoding="utf-8") as f:
+                sources += f.read()
+        missing = [
+            index.name
+            for table in Base.metadata.tables.values()
+            for index in table.indexes
+            if f'"{index.name}"' not in sources
+        ]
+        assert missing == []
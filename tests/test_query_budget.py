@@ -0,0 +1,32 @@
+from sqlalchemy import create_engine, text
+
+from api.function.metrics import RequestDBStats, request_db_stats
+from query_budget import QueryRecorder
+
+
+def run_request(engine, *statements: str) -> None:
+    token = request_db_stats.set(RequestDBStats())
+    try:
+        with engine.connect() as conn:
+            for statement in statements:
+                conn.execute(text(statement))
+    finally:
+        request_db_stats.reset(token)
+
+
+class TestQueryBudget:
+    def test_counts_per_request(self):
+        engine = create_engine("sqlite://")
+        with QueryRecorder() as recorder:
+            with engine.connect() as conn:
+                conn.execute(text("select 0"))
+            run_request(engine, "select 1")
+            run_request(engine, "select 1", "select 2", "select 3")
+
+        assert [len(r.statements) for r in recorder.requests.values()] == [1, 3]
+        assert recorder.violations(statements=3) == []
+
+        violations = recorder.violations(statements=2)
+        assert len(violations) == 1
+        assert "HTTP-запрос #2: 3 SQL" in violations[0]
+        assert "select 3" in violations[0]
@@ -0,0 +1,115 @@
+import json
+
+import pytest
+
+from api.function import realtime
+from api.function.realtime import (
+    RESET,
+    EventHub,
+    Subscriber,
+    event_stream,
+    format_event,
+    like_event,
+    tweet_event,
+)
+
+
+class OpenConnection:
+    """Соединение LISTEN, которое считается открытым"""
+
+    @staticmethod
+    def is_closed() -> bool:
+        return False
+
+
+def make_hub(queue_size: int = 10) -> EventHub:
+    hub = EventHub("postgresql://test", queue_size=queue_size, max_subscribers=2)
+    hub._connection = OpenConnection()
+    return hub
+
+
+class TestEventHub:
+    @pytest.mark.asyncio
+    async def test_dispatch_to_followers_and_self(self):
+        hub = make_hub()
+        reader = await hub.subscribe(1, [2])
+        other = await hub.subscribe(3, [])
+
+        assert hub.dispatch(tweet_event(10, 2)) == 1
+        assert hub.dispatch(tweet_event(11, 1)) == 1
+        assert hub.dispatch(tweet_event(12, 4)) == 0
+        assert [reader.queue.get_nowait()["tweet_id"] for _ in range(2)] == [10, 11]
+        assert other.queue.empty()
+        assert hub.full
+
+    @pytest.mark.asyncio
+    async def test_unsubscribe_drops_empty_authors(self):
+        hub = make_hub()
+        subscriber = await hub.subscribe(1, [2])
+        hub.unsubscribe(subscriber)
+        assert hub.by_author == {}
+        assert not hub.subscribers
+
+    @pytest.mark.asyncio
+    async def test_notify_payload_is_dispatched(self):
+        hub = make_hub()
+        subscriber = await hub.subscribe(1, [2])
+        hub._on_notify(None, 0, realtime.CHANNEL, json.dumps(like_event(5, 2, 3, 1)))
+        hub._on_notify(None, 0, realtime.CHANNEL, "не json")
+        assert subscriber.queue.get_nowait() == like_event(5, 2, 3, 1)
+        assert subscriber.queue.empty()
+
+    @pytest.mark.asyncio
+    async def test_lost_connection_resets_subscribers(self):
+        hub = make_hub()
+        subscriber = await hub.subscribe(1, [])
+        hub._on_terminated(hub._connection)
+        assert hub._connection is None
+        assert subscriber.queue.get_nowait() is RESET
+
+
+class TestBackpressure:
+    def test_slow_subscriber_gets_reset(self):
+        subscriber = Subscriber(1, [2], queue_size=2)
+        for tweet_id in range(3):
+            subscriber.push(tweet_event(tweet_id, 2))
+        subscriber.push(tweet_event(4, 2))
+
+        assert subscriber.closed
+        assert subscriber.queue.qsize() == 1
+        assert subscriber.queue.get_nowait() is RESET
+
+
+class TestEventStream:
+    @pytest.mark.asyncio
+    async def test_stream_ends_on_reset(self, monkeypatch):
+        hub = make_hub()
+        monkeypatch.setattr(realtime, "hub", hub)
+        subscriber = await hub.subscribe(1, [2])
+        hub.dispatch(tweet_event(7, 2))
+        subscriber.reset()
+        subscriber.queue.put_nowait(tweet_event(8, 2))
+
+        chunks = [chunk async for chunk in event_stream(subscriber, heartbeat=1)]
+        assert chunks[0] == ": connected\n\n"
+        assert chunks[1:] == [format_event(RESET)]
+        assert not hub.subscribers
+
+    @pytest.mark.asyncio
+    async def test_heartbeat_when_idle(self, monkeypatch):
+        hub = make_hub()
+        monkeypatch.setattr(realtime, "hub", hub)
+        subscriber = await hub.subscribe(1, [])
+        stream = event_stream(subscriber, heartbeat=0.01)
+        assert await stream.__anext__() == ": connected\n\n"
+        assert await stream.__anext__() == ": ping\n\n"
+        subscriber.push(tweet_event(1, 1))
+        assert await stream.__anext__() == format_event(tweet_event(1, 1))
+        await stream.aclose()
+        assert not hub.subscribers
+
+    def test_format_event(self):
+        assert format_event(tweet_event(1, 2)) == (
+            'event: tweet\ndata: {"type": "tweet", "tweet_id": 1, "author_id": 2}\n\n'
+        )
+
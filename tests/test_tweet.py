@@ -1,6 +1,23 @@
+import json
 import pytest
+from fastapi import Response
 from httpx import AsyncClient
-from api.config.schemas import GetTweet, ErrorMSG,MSG, TweetResp
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from api.config.config import settings
+from api.config.models import HomeTimeline, Like, Media, Tweet
+from api.config.schemas import (
+    BatchResult,
+    GetTweet,
+    ErrorMSG,
+    MSG,
+    SearchResult,
+    TweetResp,
+)
+from api.config import responses
+from api.function.feed_cache import MemoryBackend, feed_cache
+from api.function.feed_query import build_feed_query
+from api.function.search import render_headline
 
 
 class TestTweetAPI:
@@ -20,6 +37,7 @@ class TestTweetAPI:
             "error_message": "",
         }
 
+    @pytest.mark.query_budget(statements=5)
     @pytest.mark.asyncio
     async def test_create_tweet(self, client: AsyncClient):
         if (
@@ -36,6 +54,8 @@ class TestTweetAPI:
             assert response.json()["result"] == True
             assert TweetResp(**response.json())
 
+    # Пользователь, отпечаток ленты для ETag и страница
+    @pytest.mark.query_budget(statements=3)
     @pytest.mark.asyncio
     async def test_get_tweet(self, client: AsyncClient):
         if (
@@ -47,6 +67,7 @@ class TestTweetAPI:
             assert response.status_code == 200
             assert GetTweet(**response.json())
 
+    @pytest.mark.query_budget(statements=2)
     @pytest.mark.asyncio
     async def test_delete_tweet_alien_id(self, client: AsyncClient):
         if (
@@ -61,6 +82,7 @@ class TestTweetAPI:
             assert response.json() == self.error_response
             assert ErrorMSG(**response.json())
 
+    @pytest.mark.query_budget(statements=2)
     @pytest.mark.asyncio
     async def test_delete_tweet_wrong_id(self, client: AsyncClient):
         if (
@@ -75,6 +97,7 @@ class TestTweetAPI:
             assert response.json() == self.error_response
             assert ErrorMSG(**response.json())
 
+    @pytest.mark.query_budget(statements=3)
     @pytest.mark.asyncio
     async def test_post_like_tweet(self, client: AsyncClient):
         if (
@@ -87,6 +110,7 @@ class TestTweetAPI:
             assert response.json() == self.expected_response
             assert MSG(**response.json())
 
+    @pytest.mark.query_budget(statements=3)
     @pytest.mark.asyncio
     async def test_delete_like_tweet(self, client: AsyncClient):
         if (
@@ -99,6 +123,7 @@ class TestTweetAPI:
             assert response.json() == self.expected_response
             assert MSG(**response.json())
 
+    @pytest.mark.query_budget(statements=2)
     @pytest.mark.asyncio
     async def test_delete_like_tweet_wrong_id(self, client: AsyncClient):
         if (
@@ -113,6 +138,7 @@ class TestTweetAPI:
             assert response.json() == self.error_response
             assert ErrorMSG(**response.json())
 
+    @pytest.mark.query_budget(statements=2)
     @pytest.mark.asyncio
     async def test_post_like_tweet_wrong_id(self, client: AsyncClient):
         if (
@@ -122,11 +148,12 @@ class TestTweetAPI:
                 self.likes_url.format("3000")
                             )
             self.error_response["error_message"] = "Твит не найден"
-            self.error_response["error_type"] = "Internal Server Error"
-            assert response.status_code == 500
+            self.error_response["error_type"] = "Not Found"
+            assert response.status_code == 404
             assert response.json() == self.error_response
             assert ErrorMSG(**response.json())
 
+    @pytest.mark.query_budget(statements=6)
     @pytest.mark.asyncio
     async def test_delete_tweet(self, client: AsyncClient):
         if (
@@ -137,4 +164,338 @@ class TestTweetAPI:
             )
             assert response.status_code == 200
             assert response.json() == self.expected_response
-            assert MSG(**response.json())
\ No newline at end of file
+            assert MSG(**response.json())
+
+class TestTweetFeedPagination:
+    @classmethod
+    def setup_class(cls):
+        cls.base_url = "/tweets"
+
+    @pytest.mark.asyncio
+    async def test_feed_keyset_pages(self, client: AsyncClient):
+        for text in ("first page tweet", "second page tweet"):
+            response = await client.post(
+                self.base_url, json={"tweet_data": text, "tweet_media_ids": []}
+            )
+            assert response.status_code == 200
+
+        first = await client.get(self.base_url, params={"limit": 1})
+        assert first.status_code == 200
+        first_page = GetTweet(**first.json())
+        assert len(first_page.tweets) == 1
+        assert first_page.next_cursor is not None
+
+        second = await client.get(
+            self.base_url, params={"limit": 1, "cursor": first_page.next_cursor}
+        )
+        assert second.status_code == 200
+        second_page = GetTweet(**second.json())
+        assert len(second_page.tweets) == 1
+        assert second_page.tweets[0].id != first_page.tweets[0].id
+
+    @pytest.mark.asyncio
+    async def test_feed_invalid_cursor(self, client: AsyncClient):
+        response = await client.get(self.base_url, params={"cursor": "???"})
+        assert response.status_code == 400
+        assert ErrorMSG(**response.json())
+
+
+class TestFeedQuery:
+    @pytest.mark.asyncio
+    async def test_feed_returns_one_row_per_tweet(self, db_session: AsyncSession):
+        tweet = Tweet(author_id=1, content="tweet with media and likes")
+        db_session.add(tweet)
+        await db_session.flush()
+        db_session.add_all(
+            [Media(link=f"attachment{i}.jpg", tweet_id=tweet.id) for i in range(4)]
+        )
+        db_session.add_all(
+            [Like(user_id=user_id, tweet_id=tweet.id) for user_id in range(1, 6)]
+        )
+        await db_session.flush()
+
+        result = await db_session.execute(build_feed_query(user_id=1, limit=10))
+        rows = result.all()
+
+        assert len(rows) == len({row.id for row in rows})
+        row = next(row for row in rows if row.id == tweet.id)
+        assert len(row.attachments) == 4
+        assert len(row.likes) == 5
+
+
+    @pytest.mark.asyncio
+    async def test_like_updates_counter(
+        self, client: AsyncClient, db_session: AsyncSession
+    ):
+        likes_url = "/tweets/3/likes"
+        assert (await client.post(likes_url)).status_code == 200
+        tweet = await db_session.get(Tweet, 3)
+        await db_session.refresh(tweet)
+        assert tweet.likes_count == 1
+
+        assert (await client.delete(likes_url)).status_code == 200
+        await db_session.refresh(tweet)
+        assert tweet.likes_count == 0
+
+    @pytest.mark.asyncio
+    async def test_repeated_like_is_idempotent(
+        self, client: AsyncClient, db_session: AsyncSession
+    ):
+        likes_url = "/tweets/3/likes"
+        assert (await client.post(likes_url)).status_code == 200
+        assert (await client.post(likes_url)).status_code == 200
+        tweet = await db_session.get(Tweet, 3)
+        await db_session.refresh(tweet)
+        assert tweet.likes_count == 1
+
+
+class TestLikeBatch:
+    @pytest.mark.asyncio
+    async def test_like_batch(self, client: AsyncClient, db_session: AsyncSession):
+        response = await client.post(
+            "/tweets/likes:batch", json={"ids": [2, 3, 3000]}
+        )
+        assert response.status_code == 200
+        result = BatchResult(**response.json())
+        assert result.applied == [2, 3]
+        assert result.not_found == [3000]
+
+        response = await client.post("/tweets/likes:batch", json={"ids": [3, 4]})
+        assert BatchResult(**response.json()).applied == [4]
+        tweet = await db_session.get(Tweet, 3)
+        await db_session.refresh(tweet)
+        assert tweet.likes_count == 1
+
+    @pytest.mark.asyncio
+    async def test_like_batch_too_large(self, client: AsyncClient):
+        ids = list(range(1, settings.BATCH_MAX_SIZE + 2))
+        response = await client.post("/tweets/likes:batch", json={"ids": ids})
+        assert response.status_code == 400
+
+
+class TestHomeTimeline:
+    @classmethod
+    def setup_class(cls):
+        cls.base_url = "/tweets"
+        cls.tweet_structure = {"tweet_data": "timeline tweet", "tweet_media_ids": []}
+
+    @pytest.mark.asyncio
+    async def test_post_tweet_fans_out(
+        self, client: AsyncClient, db_session: AsyncSession
+    ):
+        response = await client.post(self.base_url, json=self.tweet_structure)
+        tweet_id = response.json()["tweet_id"]
+
+        result = await db_session.execute(
+            select(HomeTimeline.user_id).where(HomeTimeline.tweet_id == tweet_id)
+        )
+        assert 1 in result.scalars().all()
+
+    @pytest.mark.asyncio
+    async def test_celebrity_tweet_merged_on_read(
+        self, client: AsyncClient, db_session: AsyncSession, monkeypatch
+    ):
+        monkeypatch.setattr(settings, "TIMELINE_FANOUT_THRESHOLD", -1)
+        response = await client.post(self.base_url, json=self.tweet_structure)
+        tweet_id = response.json()["tweet_id"]
+
+        result = await db_session.execute(
+            select(HomeTimeline.user_id).where(HomeTimeline.tweet_id == tweet_id)
+        )
+        assert result.scalars().all() == []
+
+        feed = GetTweet(**(await client.get(self.base_url)).json())
+        assert tweet_id in [tweet.id for tweet in feed.tweets]
+
+    @pytest.mark.asyncio
+    async def test_like_keeps_feed_order(self, client: AsyncClient):
+        tweet_ids = []
+        for _ in range(2):
+            response = await client.post(self.base_url, json=self.tweet_structure)
+            tweet_ids.append(response.json()["tweet_id"])
+
+        first = GetTweet(
+            **(await client.get(self.base_url, params={"limit": 1})).json()
+        )
+        assert [tweet.id for tweet in first.tweets] == [tweet_ids[1]]
+
+        # Лайк не меняет положение твита, открытый курсор остаётся верным
+        assert (await client.post(f"/tweets/{tweet_ids[0]}/likes")).status_code == 200
+        second = await client.get(
+            self.base_url, params={"limit": 1, "cursor": first.next_cursor}
+        )
+        assert [tweet.id for tweet in GetTweet(**second.json()).tweets] == [
+            tweet_ids[0]
+        ]
+
+
+class TestFastJSON:
+    feed = {
+        "result": True,
+        "tweets": [
+            {
+                "id": 1,
+                "content": "твит",
+                "attachments": ["a.jpg"],
+                "attachment_variants": [
+                    {"link": "a.jpg", "width": 10, "height": 5, "variants": None}
+                ],
+                "author": {"id": 1, "name": "user"},
+                "likes": [{"user_id": 2, "name": "other"}],
+            }
+        ],
+        "next_cursor": None,
+    }
+
+    def test_disabled_returns_content(self, monkeypatch):
+        monkeypatch.setattr(settings, "FAST_JSON", False)
+        assert responses.fast_response(GetTweet, self.feed) is self.feed
+
+    @pytest.mark.parametrize("use_orjson", [True, False])
+    def test_body_matches_schema(self, monkeypatch, use_orjson):
+        if use_orjson and responses.orjson is None:
+            pytest.skip("orjson не установлен")
+        monkeypatch.setattr(settings, "FAST_JSON", True)
+        if not use_orjson:
+            monkeypatch.setattr(responses, "orjson", None)
+
+        response = responses.fast_response(GetTweet, self.feed)
+        expected = GetTweet.model_validate(self.feed).model_dump(mode="json")
+        assert json.loads(response.body) == expected
+
+    @pytest.mark.parametrize("use_orjson", [True, False])
+    def test_keeps_dependency_headers(self, monkeypatch, use_orjson):
+        if use_orjson and responses.orjson is None:
+            pytest.skip("orjson не установлен")
+        monkeypatch.setattr(settings, "FAST_JSON", True)
+        if not use_orjson:
+            monkeypatch.setattr(responses, "orjson", None)
+
+        injected = Response()
+        injected.headers["ETag"] = 'W/"1"'
+        response = responses.fast_response(GetTweet, self.feed, injected)
+        assert response.headers["etag"] == 'W/"1"'
+        assert int(response.headers["content-length"]) == len(response.body)
+
+
+class TestFeedETag:
+    @pytest.mark.asyncio
+    async def test_not_modified(self, client: AsyncClient, query_recorder):
+        response = await client.get("/tweets")
+        etag = response.headers["etag"]
+        assert response.status_code == 200
+
+        repeated = await client.get("/tweets", headers={"If-None-Match": etag})
+        assert repeated.status_code == 304
+        assert repeated.headers["etag"] == etag
+        assert repeated.content == b""
+        # Кэш ленты выключен: выполняется только запрос отпечатка ленты,
+        # страница не собирается, пользователь уже в кэше аутентификации
+        *_, last = query_recorder.requests.values()
+        assert len(last.statements) == 1
+        assert "json_agg" not in last.statements[0]
+
+    @pytest.mark.asyncio
+    async def test_not_modified_from_cache_versions(
+        self, client: AsyncClient, query_recorder, monkeypatch
+    ):
+        monkeypatch.setattr(feed_cache, "backend", MemoryBackend(maxsize=100))
+        etag = (await client.get("/tweets")).headers["etag"]
+        repeated = await client.get("/tweets", headers={"If-None-Match": etag})
+        assert repeated.status_code == 304
+        # Версии из кэша ленты: повторный запрос не обращается к БД
+        assert len(query_recorder.requests) == 1
+
+    @pytest.mark.asyncio
+    async def test_new_tweet_changes_etag(self, client: AsyncClient):
+        etag = (await client.get("/tweets")).headers["etag"]
+        response = await client.post(
+            "/tweets", json={"tweet_data": "new tweet", "tweet_media_ids": []}
+        )
+        assert response.status_code == 200
+        response = await client.get("/tweets", headers={"If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.headers["etag"] != etag
+
+    @pytest.mark.asyncio
+    async def test_follow_changes_etag(self, client: AsyncClient):
+        etag = (await client.get("/tweets")).headers["etag"]
+        assert (await client.post("/users/4/follow")).status_code == 200
+        response = await client.get("/tweets", headers={"If-None-Match": etag})
+        assert response.status_code == 200
+
+    @pytest.mark.asyncio
+    async def test_deleting_older_tweet_changes_etag(self, client: AsyncClient):
+        tweet_ids = []
+        for text in ("older", "newer"):
+            response = await client.post(
+                "/tweets", json={"tweet_data": text, "tweet_media_ids": []}
+            )
+            tweet_ids.append(response.json()["tweet_id"])
+        etag = (await client.get("/tweets")).headers["etag"]
+
+        # Старший id ленты не меняется, меняется версия ленты
+        assert (await client.delete(f"/tweets/{tweet_ids[0]}")).status_code == 200
+        response = await client.get("/tweets", headers={"If-None-Match": etag})
+        assert response.status_code == 200
+
+    @pytest.mark.asyncio
+    async def test_like_keeps_etag(self, client: AsyncClient):
+        # Лайки не входят в отпечаток ленты: счётчики клиент получает
+        # событиями like из /api/tweets/stream
+        etag = (await client.get("/tweets")).headers["etag"]
+        assert (await client.post("/tweets/1/likes")).status_code == 200
+        response = await client.get("/tweets", headers={"If-None-Match": etag})
+        assert response.status_code == 304
+
+    @pytest.mark.asyncio
+    async def test_pages_have_different_etags(self, client: AsyncClient):
+        first = await client.get("/tweets", params={"limit": 1})
+        second = await client.get("/tweets", params={"limit": 2})
+        assert first.headers["etag"] != second.headers["etag"]
+
+
+class TestTweetSearch:
+    @pytest.mark.query_budget(statements=2)
+    @pytest.mark.asyncio
+    async def test_search_ranked_with_highlight(self, client: AsyncClient):
+        response = await client.get("/tweets/search", params={"q": "random tweets"})
+        assert response.status_code == 200
+        result = SearchResult(**response.json())
+        assert result.tweets
+        assert all("random" in tweet.content for tweet in result.tweets)
+        assert "<b>random</b>" in result.tweets[0].highlight
+
+    @pytest.mark.asyncio
+    async def test_search_keyset_pages(self, client: AsyncClient):
+        first = SearchResult(
+            **(
+                await client.get("/tweets/search", params={"q": "random", "limit": 1})
+            ).json()
+        )
+        assert first.next_cursor is not None
+        second = SearchResult(
+            **(
+                await client.get(
+                    "/tweets/search",
+                    params={"q": "random", "limit": 1, "cursor": first.next_cursor},
+                )
+            ).json()
+        )
+        assert second.tweets[0].id != first.tweets[0].id
+
+    @pytest.mark.asyncio
+    async def test_search_without_matches(self, client: AsyncClient):
+        response = await client.get(
+            "/tweets/search", params={"q": "отсутствующееслово"}
+        )
+        assert response.status_code == 200
+        assert response.json()["tweets"] == []
+
+    @pytest.mark.asyncio
+    async def test_search_requires_query(self, client: AsyncClient):
+        response = await client.get("/tweets/search")
+        assert response.status_code == 422
+
+    def test_headline_is_escaped(self):
+        assert render_headline("<i>\x02кот\x03</i>") == "&lt;i&gt;<b>кот</b>&lt;/i&gt;"
@@ -1,6 +1,7 @@
 import pytest
 from httpx import AsyncClient
-from api.config.schemas import GetUser, ErrorMSG, MSG
+from api.config.config import settings
+from api.config.schemas import BatchResult, GetFollows, GetUser, GetUsers, ErrorMSG, MSG
 
 
 class TestUserAPI:
@@ -14,6 +15,7 @@ class TestUserAPI:
             "error_message": "",
         }
 
+    @pytest.mark.query_budget(statements=2)
     @pytest.mark.asyncio
     async def test_follow_user_correct(self, client: AsyncClient):
         if hasattr(self, "base_url"):
@@ -23,6 +25,7 @@ class TestUserAPI:
                 assert response.json() == self.expected_response
                 assert MSG(**response.json())
 
+    @pytest.mark.query_budget(statements=2)
     @pytest.mark.asyncio
     async def test_follow_yourself(self, client: AsyncClient):
         if hasattr(self, "error_response") and hasattr(self, "base_url"):
@@ -32,6 +35,7 @@ class TestUserAPI:
             assert response.json() == self.error_response
             assert ErrorMSG(**response.json())
 
+    @pytest.mark.query_budget(statements=2)
     @pytest.mark.asyncio
     async def test_follow_user_that_doesnt_exist(self, client: AsyncClient):
         if hasattr(self, "error_response") and hasattr(self, "base_url"):
@@ -42,6 +46,7 @@ class TestUserAPI:
             assert response.json() == self.error_response
             assert ErrorMSG(**response.json())
 
+    @pytest.mark.query_budget(statements=2)
     @pytest.mark.asyncio
     async def test_unfollow_user(self, client: AsyncClient):
         if hasattr(self, "expected_response") and hasattr(self, "base_url"):
@@ -53,6 +58,7 @@ class TestUserAPI:
             assert response.json() == self.expected_response
             assert MSG(**response.json())
 
+    @pytest.mark.query_budget(statements=2)
     @pytest.mark.asyncio
     async def test_unfollow_user_that_is_not_followed(
         self, client: AsyncClient
@@ -67,6 +73,7 @@ class TestUserAPI:
             assert response.json() == self.error_response
             assert ErrorMSG(**response.json())
 
+    @pytest.mark.query_budget(statements=3)
     @pytest.mark.asyncio
     async def test_get_user_info(self, client: AsyncClient):
         if hasattr(self, "base_url"):
@@ -75,6 +82,7 @@ class TestUserAPI:
             assert response.status_code == 200
             assert GetUser(**response.json())
 
+    @pytest.mark.query_budget(statements=3)
     @pytest.mark.asyncio
     async def test_get_me_info(self, client: AsyncClient):
         if hasattr(self, "base_url"):
@@ -83,6 +91,7 @@ class TestUserAPI:
             assert response.status_code == 200
             assert GetUser(**response.json())
 
+    @pytest.mark.query_budget(statements=1)
     @pytest.mark.asyncio
     @pytest.mark.parametrize("unauthorized", ["/users/me"])
     async def test_get_wrong_auth(
@@ -95,6 +104,7 @@ class TestUserAPI:
         assert response.json() == self.error_response
         assert ErrorMSG(**response.json())
 
+    @pytest.mark.query_budget(statements=1)
     @pytest.mark.asyncio
     async def test_post_wrong_auth(self, invalid_client: AsyncClient):
         if hasattr(self, "base_url"):
@@ -103,4 +113,143 @@ class TestUserAPI:
             self.error_response["error_type"] = "Unauthorized"
             assert response.status_code == 401
             assert response.json() == self.error_response
-            assert ErrorMSG(**response.json())
\ No newline at end of file
+            assert ErrorMSG(**response.json())
+
+class TestUserFollowLists:
+    @pytest.mark.query_budget(statements=3)
+    @pytest.mark.asyncio
+    async def test_profile_counts(self, client: AsyncClient):
+        assert (await client.post("/users/5/follow")).status_code == 200
+
+        profile = GetUser(**(await client.get("/users/5")).json())
+        me = GetUser(**(await client.get("/users/me")).json())
+        assert profile.user.followers_count == 1
+        assert me.user.following_count == 3
+
+    @pytest.mark.query_budget(statements=3)
+    @pytest.mark.asyncio
+    async def test_profile_is_following(self, client: AsyncClient):
+        before = GetUser(**(await client.get("/users/5")).json())
+        assert before.user.is_following is False
+
+        assert (await client.post("/users/5/follow")).status_code == 200
+        after = GetUser(**(await client.get("/users/5")).json())
+        assert after.user.is_following is True
+        assert after.user.followers_count == 1
+
+    @pytest.mark.asyncio
+    async def test_profile_keeps_legacy_lists(self, client: AsyncClient, monkeypatch):
+        assert (await client.post("/users/5/follow")).status_code == 200
+
+        me = GetUser(**(await client.get("/users/me")).json())
+        assert [user.id for user in me.user.following] == [2, 3, 5]
+        assert me.user.followers == []
+
+        # Список ограничен, но подписанный текущий пользователь в нём есть
+        monkeypatch.setattr(settings, "PROFILE_FOLLOW_PREVIEW", 0)
+        profile = GetUser(**(await client.get("/users/5")).json())
+        assert [(user.id, user.name) for user in profile.user.followers] == [
+            (1, "Test")
+        ]
+        assert profile.user.following == []
+
+    @pytest.mark.asyncio
+    async def test_repeated_follow_is_idempotent(self, client: AsyncClient):
+        assert (await client.post("/users/5/follow")).status_code == 200
+        assert (await client.post("/users/5/follow")).status_code == 200
+
+        profile = GetUser(**(await client.get("/users/5")).json())
+        assert profile.user.followers_count == 1
+
+    @pytest.mark.query_budget(statements=2)
+    @pytest.mark.asyncio
+    async def test_follow_lists_keyset(self, client: AsyncClient):
+        for user_id in (4, 5):
+            assert (await client.post(f"/users/{user_id}/follow")).status_code == 200
+
+        first = await client.get("/users/1/following", params={"limit": 2})
+        assert first.status_code == 200
+        first_page = GetFollows(**first.json())
+        assert [user.id for user in first_page.users] == [2, 3]
+        assert first_page.next_cursor is not None
+
+        second = await client.get(
+            "/users/1/following",
+            params={"limit": 2, "cursor": first_page.next_cursor},
+        )
+        second_page = GetFollows(**second.json())
+        assert [user.id for user in second_page.users] == [4, 5]
+        assert second_page.next_cursor is None
+
+        followers = GetFollows(**(await client.get("/users/5/followers")).json())
+        assert [user.id for user in followers.users] == [1]
+
+    @pytest.mark.query_budget(statements=1)
+    @pytest.mark.asyncio
+    async def test_follow_lists_unknown_user(self, client: AsyncClient):
+        response = await client.get("/users/10000/followers")
+        assert response.status_code == 404
+        assert ErrorMSG(**response.json())
+
+
+class TestUserBatch:
+    @pytest.mark.query_budget(statements=3)
+    @pytest.mark.asyncio
+    async def test_follow_batch(self, client: AsyncClient):
+        response = await client.post(
+            "/users/follow:batch", json={"ids": [4, 5, 1, 10000, 5]}
+        )
+        assert response.status_code == 200
+        result = BatchResult(**response.json())
+        assert result.applied == [4, 5]
+        assert result.not_found == [10000]
+
+        me = GetUser(**(await client.get("/users/me")).json())
+        profile = GetUser(**(await client.get("/users/5")).json())
+        assert me.user.following_count == 4
+        assert profile.user.followers_count == 1
+
+    @pytest.mark.asyncio
+    async def test_follow_batch_is_idempotent(self, client: AsyncClient):
+        assert (await client.post("/users/5/follow")).status_code == 200
+        response = await client.post("/users/follow:batch", json={"ids": [4, 5]})
+        assert BatchResult(**response.json()).applied == [4]
+
+    @pytest.mark.asyncio
+    async def test_follow_batch_empty(self, client: AsyncClient):
+        response = await client.post("/users/follow:batch", json={"ids": []})
+        assert response.status_code == 400
+
+    @pytest.mark.query_budget(statements=1)
+    @pytest.mark.asyncio
+    async def test_get_users_by_ids(self, client: AsyncClient):
+        response = await client.get("/users", params={"ids": "3,1,10000"})
+        assert response.status_code == 200
+        users = GetUsers(**response.json()).users
+        assert [user.id for user in users] == [3, 1]
+
+    @pytest.mark.asyncio
+    async def test_get_users_invalid_ids(self, client: AsyncClient):
+        response = await client.get("/users", params={"ids": "1,abc"})
+        assert response.status_code == 400
+
+
+class TestProfileETag:
+    @pytest.mark.asyncio
+    async def test_not_modified_until_follow(self, client: AsyncClient):
+        response = await client.get("/users/5")
+        etag = response.headers["etag"]
+
+        repeated = await client.get("/users/5", headers={"If-None-Match": etag})
+        assert repeated.status_code == 304
+
+        assert (await client.post("/users/5/follow")).status_code == 200
+        changed = await client.get("/users/5", headers={"If-None-Match": etag})
+        assert changed.status_code == 200
+        assert GetUser(**changed.json()).user.followers_count == 1
+
+    @pytest.mark.asyncio
+    async def test_me_not_modified(self, client: AsyncClient):
+        etag = (await client.get("/users/me")).headers["etag"]
+        repeated = await client.get("/users/me", headers={"If-None-Match": etag})
+        assert repeated.status_code == 304